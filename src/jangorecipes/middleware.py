@@ -0,0 +1,214 @@
+"""
+Project-wide middleware.
+"""
+import json
+import logging
+import os
+import re
+import signal
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+timing_logger = logging.getLogger('jangorecipes.timing')
+
+
+def current_rss_bytes():
+    """Resident set size of this process in bytes (current, not peak)"""
+    try:
+        with open('/proc/self/statm') as statm:
+            resident_pages = int(statm.read().split()[1])
+        return resident_pages * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        # No /proc (macOS, Windows): fall back to the peak RSS
+        import resource
+        import sys
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class MemoryWatchdogMiddleware:
+    """
+    Recycle the worker process once its memory use passes WORKER_MAX_RSS_MB.
+
+    Every WORKER_RSS_CHECK_INTERVAL requests the worker checks its RSS. When
+    it is over the limit the worker sends itself SIGTERM, which gunicorn
+    treats as a graceful shutdown: the current response is still delivered
+    and the arbiter starts a fresh worker. Leave WORKER_MAX_RSS_MB as None
+    to disable the watchdog (for example under runserver).
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        max_rss_mb = getattr(settings, 'WORKER_MAX_RSS_MB', None)
+        if not max_rss_mb:
+            raise MiddlewareNotUsed
+        self.max_rss = max_rss_mb * 1024 * 1024
+        self.interval = getattr(settings, 'WORKER_RSS_CHECK_INTERVAL', 50)
+        self.requests = 0
+        self.recycling = False
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        self.requests += 1
+        if not self.recycling and self.requests % self.interval == 0:
+            rss = current_rss_bytes()
+            if rss > self.max_rss:
+                self.recycling = True
+                logger.warning(
+                    'Worker %s uses %.0f MB (limit %.0f MB) after %s requests, recycling',
+                    os.getpid(), rss / 2**20, self.max_rss / 2**20, self.requests,
+                )
+                os.kill(os.getpid(), signal.SIGTERM)
+        return response
+
+
+# ============================================
+# REQUEST TIMING
+# ============================================
+
+_current_timings = ContextVar('request_timings', default=None)
+
+# "IN (%s, %s, %s)" and "IN (%s, %s)" are the same query shape
+_PLACEHOLDER_RUN = re.compile(r'%s(?:\s*,\s*%s)+')
+
+
+def sql_shape(sql):
+    """The SQL of a query with runs of placeholders collapsed"""
+    return _PLACEHOLDER_RUN.sub('%s, ...', sql)
+
+
+class RequestTimings:
+    """Measurements collected while one request is handled"""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.shapes = Counter()
+        self.sections = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        # Database execute wrapper, see connection.execute_wrapper()
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_seconds += time.perf_counter() - start
+            self.queries += 1
+            self.shapes[sql] += 1
+
+    def add(self, name, seconds):
+        self.sections[name] += seconds
+
+    def repeated_queries(self, threshold):
+        """(shape, count) of every query shape run at least `threshold` times"""
+        repeated = Counter()
+        for sql, count in self.shapes.items():
+            repeated[sql_shape(sql)] += count
+        return [(shape, count) for shape, count in repeated.most_common() if count >= threshold]
+
+
+@contextmanager
+def timing(name):
+    """
+    Add the time spent in the block to the current request's `name` entry
+    of the Server-Timing header. Does nothing outside a request.
+    """
+    timings = _current_timings.get()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if timings is not None:
+            timings.add(name, time.perf_counter() - start)
+
+
+class RequestTimingMiddleware:
+    """
+    Measure every request and report it in a Server-Timing header: total
+    time, SQL query count and time, template rendering and any sections
+    timed with timing() (e.g. chart rendering).
+
+    Requests slower than REQUEST_TIMING_SLOW_MS, running more than
+    REQUEST_TIMING_MAX_QUERIES queries, or running one query shape at least
+    REQUEST_TIMING_REPEATED_QUERIES times (an N+1 loop) are logged as one
+    JSON line on the 'jangorecipes.timing' logger.
+
+    Only counters and timestamps are kept per query, so it is cheap enough to
+    leave on in production. Set REQUEST_TIMING = False to disable it.
+    Streaming response bodies are produced after the middleware returns and
+    are not included.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if not getattr(settings, 'REQUEST_TIMING', True):
+            raise MiddlewareNotUsed
+        self.slow_ms = getattr(settings, 'REQUEST_TIMING_SLOW_MS', 500)
+        self.max_queries = getattr(settings, 'REQUEST_TIMING_MAX_QUERIES', 50)
+        self.repeated_threshold = getattr(settings, 'REQUEST_TIMING_REPEATED_QUERIES', 10)
+
+    def __call__(self, request):
+        timings = RequestTimings()
+        token = _current_timings.set(timings)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timings))
+                response = self.get_response(request)
+        finally:
+            _current_timings.reset(token)
+        total = time.perf_counter() - start
+        response['Server-Timing'] = self.server_timing(timings, total)
+        self.report(request, response, timings, total)
+        return response
+
+    def process_template_response(self, request, response):
+        # Called just before a TemplateResponse is rendered
+        timings = _current_timings.get()
+        if timings is not None:
+            start = time.perf_counter()
+            response.add_post_render_callback(lambda _: timings.add('tpl', time.perf_counter() - start))
+        return response
+
+    @staticmethod
+    def server_timing(timings, total):
+        metrics = [
+            f'total;dur={total * 1000:.1f}',
+            f'db;dur={timings.db_seconds * 1000:.1f};desc="{timings.queries} queries"',
+        ]
+        for name, seconds in sorted(timings.sections.items()):
+            metrics.append(f'{name};dur={seconds * 1000:.1f}')
+        return ', '.join(metrics)
+
+    def report(self, request, response, timings, total):
+        reasons = []
+        if total * 1000 > self.slow_ms:
+            reasons.append('slow')
+        if timings.queries > self.max_queries:
+            reasons.append('queries')
+        repeated = timings.repeated_queries(self.repeated_threshold)
+        if repeated:
+            reasons.append('repeated_queries')
+        if not reasons:
+            return
+        timing_logger.warning(json.dumps({
+            'event': 'request_timing',
+            'reasons': reasons,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 1),
+            'db_ms': round(timings.db_seconds * 1000, 1),
+            'queries': timings.queries,
+            'sections_ms': {name: round(seconds * 1000, 1) for name, seconds in timings.sections.items()},
+            'repeated_queries': [{'sql': shape[:300], 'count': count} for shape, count in repeated],
+        }))
@@ -46,6 +46,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'jangorecipes.middleware.RequestTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -54,8 +55,23 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'jangorecipes.middleware.MemoryWatchdogMiddleware',
 ]
 
+# Per-request instrumentation (jangorecipes.middleware.RequestTimingMiddleware)
+# Every response gets a Server-Timing header; requests over one of these
+# limits are logged as JSON on the 'jangorecipes.timing' logger.
+# REQUEST_TIMING_REPEATED_QUERIES flags N+1 loops: the same SQL run that often.
+REQUEST_TIMING = True
+REQUEST_TIMING_SLOW_MS = 500
+REQUEST_TIMING_MAX_QUERIES = 50
+REQUEST_TIMING_REPEATED_QUERIES = 10
+
+# Worker memory watchdog (jangorecipes.middleware.MemoryWatchdogMiddleware)
+# Recycle a worker once its RSS passes this many MB; None disables the check
+WORKER_MAX_RSS_MB = None
+WORKER_RSS_CHECK_INTERVAL = 50
+
 ROOT_URLCONF = 'jangorecipes.urls'
 
 TEMPLATES = [
@@ -89,6 +105,11 @@ DATABASES = {
 #AUTH
 LOGIN_URL='/login/'
 
+# Recipe search
+# Dotted path to a recipes.search.SearchBackend subclass. Leave as None to use
+# the SQLite FTS5 index on SQLite and plain substring matching elsewhere.
+RECIPE_SEARCH_BACKEND = None
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -132,6 +153,67 @@ STATIC_ROOT = os.path.join(BASE_DIR, "staticfiles")
 MEDIA_URL = '/media/'
 MEDIA_ROOT= BASE_DIR / 'media'
 
+# Widths (px) of the resized WebP/JPEG copies made of every recipe photo,
+# used in srcset (see recipes/thumbnails.py)
+RECIPE_IMAGE_WIDTHS = (320, 640, 1024)
+
+# Cache for rendered Home grids and recipe cards (see recipes/page_cache.py).
+# They are keyed by the catalog version, so each worker can keep its own
+# copy in LocMemCache. The version itself lives in the CATALOG_VERSION_CACHE
+# cache, which every worker must share so that a change made in one of them
+# invalidates the pages of all of them; `manage.py check` fails if it is a
+# per-process backend. Redis or Memcached work for both.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'jangorecipes',
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+    'catalog': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache' / 'catalog',
+    },
+}
+CATALOG_VERSION_CACHE = 'catalog'
+# Seconds a cached grid or card is kept (changes invalidate them sooner)
+HOME_CACHE_TIMEOUT = 300
+
+# Seconds before a worker rebuilds its "cook with what I have" index to pick
+# up changes made by other workers (see recipes/pantry.py); None never does
+PANTRY_INDEX_MAX_AGE = 600
+
+# The same for the search box suggestions index (see recipes/typeahead.py)
+TYPEAHEAD_INDEX_MAX_AGE = 600
+
+# Rendered ingredient charts: in-process LRU budget and on-disk cache directory
+CHART_CACHE_MEMORY_BYTES = 16 * 1024 * 1024
+CHART_CACHE_DIR = MEDIA_ROOT / 'chart_cache'
+
+# Where ingredient charts are drawn: 'client' sends the data as JSON and the
+# browser draws it, 'server' renders PNGs with matplotlib (also the fallback
+# for browsers without JavaScript)
+CHART_RENDERING = 'client'
+
+# Chart rendering pool: concurrent renders, renders allowed to wait, seconds a
+# request waits for its chart, and 'thread' or 'process' workers
+CHART_RENDER_WORKERS = 2
+CHART_RENDER_QUEUE = 8
+CHART_RENDER_TIMEOUT = 5.0
+CHART_RENDER_EXECUTOR = 'thread'
+
+# Maximum time django.setup() plus URL resolution may spend importing the
+# project's own modules and the libraries only they import (checked by
+# `manage.py check_import_time` and the test suite). About 25 ms today;
+# interpreter and Django startup are not counted, as they vary by machine
+IMPORT_TIME_BUDGET_MS = 100
+
+# `manage.py audit_query_plans` fails when a hot query reads every row of a
+# table with at least this many rows
+QUERY_PLAN_MIN_ROWS = 1000
+
+# Runs the tests with the on-disk caches in a temporary directory
+TEST_RUNNER = 'jangorecipes.test_runner.TestRunner'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
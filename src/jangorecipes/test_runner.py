@@ -0,0 +1,57 @@
+"""
+Test runner that keeps the test suite away from the developer's on-disk
+caches.
+"""
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.test.runner import DiscoverRunner
+
+
+class TestRunner(DiscoverRunner):
+    """
+    DiscoverRunner that points the on-disk caches at a temporary directory
+    for the whole run. Test recipes get the same ids as real ones, and the
+    signals drop (or on a full refresh, clear) their cached charts, so
+    without this a test run deletes the charts under MEDIA_ROOT. Likewise
+    the tests bump the catalog version, which must not reach the version
+    cache of a development server.
+    """
+
+    def test_settings(self, directory):
+        return {
+            'CHART_CACHE_DIR': f'{directory}/chart_cache',
+            # Still a FileBasedCache, so the recipes.E002 check passes
+            'CACHES': {
+                **settings.CACHES,
+                'catalog': {
+                    'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                    'LOCATION': f'{directory}/catalog',
+                },
+            },
+        }
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.cache_directory = tempfile.mkdtemp(prefix='jangorecipes-tests-')
+        # Set directly, as setup_test_environment() does for EMAIL_BACKEND:
+        # override_settings() would hide SETTINGS_MODULE, which
+        # check_import_time passes on to its subprocess
+        self.saved_settings = {}
+        for name, value in self.test_settings(self.cache_directory).items():
+            self.saved_settings[name] = getattr(settings, name)
+            self._change_setting(name, value)
+
+    def teardown_test_environment(self, **kwargs):
+        for name, value in self.saved_settings.items():
+            self._change_setting(name, value)
+        shutil.rmtree(self.cache_directory, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
+
+    @staticmethod
+    def _change_setting(name, value):
+        setattr(settings, name, value)
+        # Let the chart cache and cache handlers drop what they built from the old value
+        setting_changed.send(sender=settings._wrapped.__class__, setting=name, value=value, enter=True)
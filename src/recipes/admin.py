@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Recipe, Ingredient, RecipeIngredient
+from .models import DIFFICULTY_LEVELS, Recipe, Ingredient, RecipeIngredient
 
 # Register your models here.
 class RecipeIngredientInline(admin.TabularInline):
@@ -7,9 +7,35 @@ class RecipeIngredientInline(admin.TabularInline):
     extra = 1
     fields = ['ingredient', 'quantity']
 
+class DifficultyFilter(admin.SimpleListFilter):
+    # The levels are fixed, so listing them needs no DISTINCT query
+    title = 'difficulty'
+    parameter_name = 'difficulty_level'
+
+    def lookups(self, request, model_admin):
+        return [(level, level) for level in DIFFICULTY_LEVELS]
+
+    def queryset(self, request, queryset):
+        if self.value() in DIFFICULTY_LEVELS:
+            return queryset.filter(difficulty_level=self.value())
+        return queryset
+
 class RecipeAdmin(admin.ModelAdmin):
     inlines = [RecipeIngredientInline]
     list_display = ['name', 'cooking_time', 'difficulty', 'user']
+    list_select_related = ['user']
+    list_filter = [DifficultyFilter]
+
+    # difficulty_level is a database column generated from cooking_time and
+    # the stored ingredient_count, so sorting and filtering on it is indexed
+    @admin.display(description='Difficulty', ordering='difficulty_level')
+    def difficulty(self, obj):
+        return obj.difficulty_level
+
+class IngredientAdmin(admin.ModelAdmin):
+    list_display = ['name', 'supplier', 'calories', 'price']
+    list_filter = ['supplier']
+    ordering = ['name', 'supplier']
 
 admin.site.register(Recipe, RecipeAdmin)
-admin.site.register(Ingredient)
+admin.site.register(Ingredient, IngredientAdmin)
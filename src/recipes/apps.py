@@ -1,6 +1,23 @@
 from django.apps import AppConfig
+from django.core import checks
+from django.db.models.signals import post_migrate
+
+
+def install_search_index(sender, **kwargs):
+    """Create the search index after migrate and fill it the first time"""
+    from .search import get_backend
+    backend = get_backend()
+    if backend.install():
+        backend.rebuild()
 
 
 class RecipesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'recipes'
+
+    def ready(self):
+        # Register signal handlers that keep denormalized data current
+        from . import signals  # noqa: F401
+        post_migrate.connect(install_search_index, sender=self)
+        from .page_cache import check_version_cache
+        checks.register(check_version_cache, checks.Tags.caches)
@@ -0,0 +1,340 @@
+"""
+Bulk catalog import and export in CSV or JSONL.
+
+CSV has one row per ingredient link, with the recipe columns repeated on
+each row (a recipe without ingredients is one row with empty ingredient
+columns). Rows of one recipe must be adjacent; they are grouped by
+recipe_id, or by recipe_name when there is no recipe_id column.
+
+JSONL has one recipe per line:
+
+    {"name": "Bread", "cooking_time": 60, "description": "...",
+     "instructions": "...", "ingredients": [
+        {"name": "Flour", "supplier": "Mill", "calories": 364,
+         "price": "1.20", "quantity": "500 g"}]}
+
+Files are read as a stream and written in batches, so memory use depends on
+the batch size and the number of distinct ingredients, not the file size.
+Exports use the same layouts (plus the owner and the parsed amount and unit),
+so an export can be imported again.
+"""
+import csv
+import gzip
+import io
+import json
+import sys
+import time
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.db.models import Prefetch
+
+from .models import Ingredient, Recipe, RecipeIngredient
+from .quantities import parse_quantity_batch
+from .signals import refresh_recipes
+
+CSV_COLUMNS = (
+    'recipe_id', 'recipe_name', 'cooking_time', 'description', 'instructions',
+    'ingredient_name', 'supplier', 'calories', 'price', 'quantity',
+)
+EXPORT_COLUMNS = CSV_COLUMNS + ('amount', 'unit', 'user')
+FORMATS = ('csv', 'jsonl')
+CONTENT_TYPES = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+
+
+class ImportRecordError(ValueError):
+    """A record that cannot be imported; the import skips it and goes on"""
+
+
+def open_catalog(path, mode='r'):
+    """Open a catalog file as text ('-' is stdin/stdout, .gz is decompressed)"""
+    if path == '-':
+        return io.TextIOWrapper((sys.stdin if 'r' in mode else sys.stdout).buffer, encoding='utf-8', newline='')
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8', newline='')
+    return open(path, mode, encoding='utf-8', newline='')
+
+
+def guess_format(path):
+    name = path[:-3] if path.endswith('.gz') else path
+    for fmt in FORMATS:
+        if name.endswith(f'.{fmt}'):
+            return fmt
+    return None
+
+
+def read_csv(lines):
+    """Yield (line number, recipe dict) for each group of CSV rows"""
+    reader = csv.DictReader(lines)
+    missing = {'recipe_name'} - set(reader.fieldnames or ())
+    if missing:
+        raise ImportRecordError(f'CSV header is missing: {", ".join(sorted(missing))}')
+    group_column = 'recipe_id' if 'recipe_id' in reader.fieldnames else 'recipe_name'
+    recipe = key = None
+    line = 1
+    for row in reader:
+        if row[group_column] != key or recipe is None:
+            if recipe is not None:
+                yield line, recipe
+            key, line = row[group_column], reader.line_num
+            recipe = {
+                'name': row.get('recipe_name'),
+                'cooking_time': row.get('cooking_time'),
+                'description': row.get('description'),
+                'instructions': row.get('instructions'),
+                'ingredients': [],
+            }
+        if row.get('ingredient_name'):
+            recipe['ingredients'].append({
+                'name': row['ingredient_name'],
+                'supplier': row.get('supplier'),
+                'calories': row.get('calories'),
+                'price': row.get('price'),
+                'quantity': row.get('quantity'),
+            })
+    if recipe is not None:
+        yield line, recipe
+
+
+def read_jsonl(lines):
+    """Yield (line number, recipe dict) for each non-empty line"""
+    for number, text in enumerate(lines, 1):
+        if not text.strip():
+            continue
+        try:
+            record = json.loads(text)
+        except ValueError as error:
+            yield number, ImportRecordError(f'invalid JSON: {error}')
+            continue
+        yield number, record
+
+
+READERS = {'csv': read_csv, 'jsonl': read_jsonl}
+
+
+def _text(value, field, required=False, max_length=None):
+    value = '' if value is None else str(value).strip()
+    if required and not value:
+        raise ImportRecordError(f'{field} is required')
+    if max_length and len(value) > max_length:
+        raise ImportRecordError(f'{field} is longer than {max_length} characters')
+    return value
+
+
+def _int(value, field, default=None):
+    if value in (None, '') and default is not None:
+        return default
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ImportRecordError(f'{field} must be a whole number, not {value!r}')
+
+
+def _price(value):
+    try:
+        price = Decimal(str(value))
+        if not price.is_finite():
+            raise ImportRecordError(f'price must be a number, not {value!r}')
+        price = price.quantize(Decimal('0.01'))
+    except (InvalidOperation, ValueError):
+        raise ImportRecordError(f'price must be a number, not {value!r}')
+    if price < 0:
+        raise ImportRecordError(f'price {price} is negative')
+    if price >= 1000:
+        raise ImportRecordError(f'price {price} does not fit the price column')
+    return price
+
+
+class CatalogImporter:
+    """
+    Import recipe dicts in batches. Ingredients are matched on (name,
+    supplier): existing ones are reused unchanged, new ones are created once.
+    Each batch is written in its own transaction with bulk_create, then the
+    derived data of its recipes (ingredient_count, summaries, search index)
+    is refreshed.
+    """
+
+    def __init__(self, user, batch_size=1000):
+        self.user = user
+        self.batch_size = batch_size
+        self.ingredient_ids = {
+            (name, supplier): pk
+            for pk, name, supplier in Ingredient.objects.values_list('pk', 'name', 'supplier').iterator()
+        }
+        self.pending = []
+        self.pending_links = 0
+        self.recipes = 0
+        self.links = 0
+        self.new_ingredients = 0
+        self.duplicate_links = 0
+
+    def clean(self, record):
+        """Validate one recipe dict and return (Recipe, [(ingredient key, fields, quantity)])"""
+        if isinstance(record, Exception):
+            raise record
+        if not isinstance(record, dict):
+            raise ImportRecordError('a recipe must be an object')
+        recipe = Recipe(
+            name=_text(record.get('name'), 'name', required=True, max_length=200),
+            user=self.user,
+            cooking_time=_int(record.get('cooking_time'), 'cooking_time', default=0),
+            description=_text(record.get('description'), 'description'),
+            instructions=_text(record.get('instructions'), 'instructions'),
+        )
+        links, seen = [], set()
+        for item in record.get('ingredients') or ():
+            if not isinstance(item, dict):
+                raise ImportRecordError('an ingredient must be an object')
+            key = (
+                _text(item.get('name'), 'ingredient name', required=True, max_length=255),
+                _text(item.get('supplier'), 'supplier', max_length=255),
+            )
+            if key in seen:
+                # A recipe lists each ingredient once (unique_together)
+                self.duplicate_links += 1
+                continue
+            seen.add(key)
+            fields = {'calories': _int(item.get('calories'), 'calories', default=0), 'price': _price(item.get('price') or 0)}
+            links.append((key, fields, _text(item.get('quantity'), 'quantity', max_length=100)))
+        return recipe, links
+
+    def add(self, record):
+        """Queue one recipe dict; raises ImportRecordError if it is invalid"""
+        recipe, links = self.clean(record)
+        self.pending.append((recipe, links))
+        self.pending_links += len(links)
+        if len(self.pending) >= self.batch_size or self.pending_links >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        with transaction.atomic():
+            new = {}
+            for _, links in self.pending:
+                for key, fields, _ in links:
+                    if key not in self.ingredient_ids and key not in new:
+                        new[key] = Ingredient(name=key[0], supplier=key[1], **fields)
+            for ingredient in Ingredient.objects.bulk_create(new.values(), batch_size=self.batch_size):
+                self.ingredient_ids[(ingredient.name, ingredient.supplier)] = ingredient.pk
+
+            recipes = Recipe.objects.bulk_create([recipe for recipe, _ in self.pending], batch_size=self.batch_size)
+            quantities = [quantity for _, links in self.pending for _, _, quantity in links]
+            amounts, units = parse_quantity_batch(quantities)
+            parsed = iter(zip(amounts, units))
+            link_objects = []
+            for recipe, (_, links) in zip(recipes, self.pending):
+                for key, _, quantity in links:
+                    amount, unit = next(parsed)
+                    link_objects.append(RecipeIngredient(
+                        recipe=recipe, ingredient_id=self.ingredient_ids[key],
+                        quantity=quantity, amount=amount, unit=unit,
+                    ))
+            RecipeIngredient.objects.bulk_create(link_objects, batch_size=self.batch_size)
+            # bulk_create skips the signal handlers
+            refresh_recipes([recipe.pk for recipe in recipes])
+
+        self.recipes += len(recipes)
+        self.links += len(link_objects)
+        self.new_ingredients += len(new)
+        self.pending = []
+        self.pending_links = 0
+
+
+def import_catalog(lines, fmt, user, batch_size=1000, on_error=None, on_progress=None, progress_every=100000):
+    """
+    Import a catalog from an iterable of text lines. on_error(line, message)
+    is called for skipped records; on_progress(importer, seconds) every
+    `progress_every` links. Returns the importer, whose counters hold the
+    totals.
+    """
+    importer = CatalogImporter(user, batch_size=batch_size)
+    start = time.perf_counter()
+    next_report = progress_every
+    for line, record in READERS[fmt](lines):
+        try:
+            importer.add(record)
+        except ImportRecordError as error:
+            if on_error:
+                on_error(line, str(error))
+        if on_progress and importer.links >= next_report:
+            on_progress(importer, time.perf_counter() - start)
+            next_report += progress_every
+    importer.flush()
+    return importer
+
+
+# ============================================
+# EXPORT
+# ============================================
+
+def catalog_recipes(chunk_size=500):
+    """
+    Every recipe with its owner and ingredient links, read `chunk_size`
+    recipes at a time: one query streams the recipes and each chunk
+    prefetches its links in one more query.
+    """
+    links = RecipeIngredient.objects.select_related('ingredient').order_by('pk')
+    return (
+        Recipe.objects.select_related('user')
+        .prefetch_related(Prefetch('recipe_ingredients', queryset=links))
+        .order_by('pk')
+        .iterator(chunk_size=chunk_size)
+    )
+
+
+class _Line:
+    """File-like object that hands back what csv.writer writes"""
+
+    def write(self, value):
+        return value
+
+
+def export_csv(recipes):
+    """Yield the CSV export line by line, starting with the header"""
+    writer = csv.writer(_Line())
+    yield writer.writerow(EXPORT_COLUMNS)
+    for recipe in recipes:
+        head = [recipe.pk, recipe.name, recipe.cooking_time, recipe.description, recipe.instructions]
+        links = recipe.recipe_ingredients.all()
+        if not links:
+            yield writer.writerow(head + [''] * 7 + [recipe.user.username])
+        for link in links:
+            ingredient = link.ingredient
+            yield writer.writerow(head + [
+                ingredient.name, ingredient.supplier, ingredient.calories, ingredient.price,
+                link.quantity, '' if link.amount is None else link.amount, link.unit, recipe.user.username,
+            ])
+
+
+def export_jsonl(recipes):
+    """Yield the JSONL export, one recipe per line"""
+    for recipe in recipes:
+        yield json.dumps({
+            'id': recipe.pk,
+            'name': recipe.name,
+            'user': recipe.user.username,
+            'cooking_time': recipe.cooking_time,
+            'description': recipe.description,
+            'instructions': recipe.instructions,
+            'ingredients': [
+                {
+                    'name': link.ingredient.name,
+                    'supplier': link.ingredient.supplier,
+                    'calories': link.ingredient.calories,
+                    'price': str(link.ingredient.price),
+                    'quantity': link.quantity,
+                    'amount': link.amount,
+                    'unit': link.unit,
+                }
+                for link in recipe.recipe_ingredients.all()
+            ],
+        }) + '\n'
+
+
+WRITERS = {'csv': export_csv, 'jsonl': export_jsonl}
+
+
+def export_catalog(fmt, chunk_size=500):
+    """Lazily yield the whole catalog as text chunks in the given format"""
+    return WRITERS[fmt](catalog_recipes(chunk_size))
@@ -0,0 +1,174 @@
+"""
+Two-tier cache for rendered ingredient charts.
+
+Charts are stored as image bytes under a key made of the recipe id, the
+chart type, the image format and a hash of the ingredient rows the chart was
+drawn from, so a chart is only redrawn when its data changes. Lookups try an
+in-process LRU first, then files under CHART_CACHE_DIR; only a miss on both
+reaches matplotlib.
+recipes.signals drops a recipe's entries whenever its ingredients change.
+"""
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+DEFAULT_MEMORY_BYTES = 16 * 1024 * 1024
+
+
+def chart_digest(chart_type, rows, fmt='png'):
+    """
+    Hash of everything a chart image depends on.
+    `rows` is the ingredient data the chart is drawn from, as a list of
+    dicts or tuples; any change to it produces a different digest.
+    """
+    return hashlib.sha256(repr((chart_type, fmt, rows)).encode('utf-8')).hexdigest()[:32]
+
+
+def chart_key(recipe_id, chart_type, rows, fmt='png'):
+    """Build the cache key for one chart image"""
+    return f'{recipe_id}-{chart_digest(chart_type, rows, fmt)}.{fmt}'
+
+
+class ChartCache:
+    """
+    LRU memory tier with a byte budget in front of a directory of image files.
+    Files are grouped in one directory per recipe so invalidation is a
+    single rmtree. Safe to share between threads.
+    """
+
+    def __init__(self, memory_bytes=DEFAULT_MEMORY_BYTES, directory=None):
+        self.memory_bytes = memory_bytes
+        self.directory = Path(directory) if directory else None
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _path(self, key):
+        recipe_id = key.split('-', 1)[0]
+        return self.directory / recipe_id / key
+
+    def _remember(self, key, value):
+        # Caller holds the lock
+        if len(value) > self.memory_bytes:
+            return
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._size -= len(previous)
+        self._entries[key] = value
+        self._size += len(value)
+        while self._size > self.memory_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= len(evicted)
+            self.evictions += 1
+
+    def get(self, key):
+        """Return the cached image bytes for `key`, or None"""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self.hits_memory += 1
+                return value
+        if self.directory is not None:
+            try:
+                value = self._path(key).read_bytes()
+            except OSError:
+                value = None
+            if value is not None:
+                with self._lock:
+                    self._remember(key, value)
+                    self.hits_disk += 1
+                return value
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key, value):
+        with self._lock:
+            self._remember(key, value)
+        if self.directory is not None:
+            path = self._path(key)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Write to a temporary file first so readers never see half an image
+            fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as tmp:
+                tmp.write(value)
+            os.replace(tmp_path, path)
+
+    def get_or_render(self, key, render):
+        """Return the cached chart for `key`, calling render() to fill a miss"""
+        value = self.get(key)
+        if value is None:
+            value = render()
+            if value:
+                self.set(key, value)
+        return value
+
+    def invalidate_recipes(self, recipe_ids):
+        """Drop every cached chart of the given recipes from both tiers"""
+        prefixes = tuple(f'{recipe_id}-' for recipe_id in recipe_ids)
+        if not prefixes:
+            return
+        with self._lock:
+            for key in [key for key in self._entries if key.startswith(prefixes)]:
+                self._size -= len(self._entries.pop(key))
+        if self.directory is not None:
+            for recipe_id in recipe_ids:
+                shutil.rmtree(self.directory / str(recipe_id), ignore_errors=True)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+        if self.directory is not None:
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits_memory + self.hits_disk + self.misses
+            return {
+                'hits_memory': self.hits_memory,
+                'hits_disk': self.hits_disk,
+                'misses': self.misses,
+                'hit_ratio': (self.hits_memory + self.hits_disk) / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'memory_entries': len(self._entries),
+                'memory_bytes': self._size,
+                'memory_budget': self.memory_bytes,
+            }
+
+
+_cache = None
+
+
+def get_chart_cache():
+    """Return the process-wide chart cache configured from settings"""
+    global _cache
+    if _cache is None:
+        directory = getattr(settings, 'CHART_CACHE_DIR', None)
+        if directory is None:
+            directory = Path(settings.MEDIA_ROOT) / 'chart_cache'
+        _cache = ChartCache(
+            memory_bytes=getattr(settings, 'CHART_CACHE_MEMORY_BYTES', DEFAULT_MEMORY_BYTES),
+            directory=directory,
+        )
+    return _cache
+
+
+@receiver(setting_changed)
+def reset_chart_cache(setting, **kwargs):
+    global _cache
+    if setting in ('CHART_CACHE_DIR', 'CHART_CACHE_MEMORY_BYTES', 'MEDIA_ROOT'):
+        _cache = None
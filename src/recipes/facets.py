@@ -0,0 +1,164 @@
+"""
+Facets for narrowing the Home grid by difficulty, cooking time and number
+of ingredients.
+
+Each facet filters one indexed column of Recipe (difficulty_level is
+generated by the database from the same rules as Recipe.difficulty) and
+each of its options is a value or a range of that column. Options of one
+facet are alternatives and facets combine: ?difficulty=Easy&difficulty=Medium
+&time=under-15 is (Easy or Medium) and under 15 minutes.
+
+The count shown next to an option is the number of recipes the page would
+have if that option were added to the selection, so each facet is counted
+with the other facets' filters applied but not its own. Every count comes
+from one aggregate query that groups the recipes by cooking time and
+number of ingredients, reading nothing but an index on those two columns
+(difficulty follows from them, see models.difficulty_of). The few hundred
+groups are then counted for any selection in Python, so one query result
+serves all selections.
+"""
+from collections import namedtuple
+
+from django.db.models import Count, Q
+from django.utils.http import urlencode
+
+from .models import DIFFICULTY_LEVELS, FEW_INGREDIENTS, QUICK_COOKING_TIME, difficulty_of
+
+
+class FacetOption:
+    """A value of the facet's column, or the range low <= value < high"""
+
+    def __init__(self, key, label, value=None, low=None, high=None):
+        self.key = key
+        self.label = label
+        self.value = value
+        self.low = low
+        self.high = high
+
+    def filter(self, field):
+        if self.value is not None:
+            return Q(**{field: self.value})
+        condition = Q()
+        if self.low is not None:
+            condition &= Q(**{f'{field}__gte': self.low})
+        if self.high is not None:
+            condition &= Q(**{f'{field}__lt': self.high})
+        return condition
+
+    def matches(self, value):
+        if self.value is not None:
+            return value == self.value
+        return (self.low is None or value >= self.low) and (self.high is None or value < self.high)
+
+
+Facet = namedtuple('Facet', ['name', 'label', 'field', 'options'])
+
+FACETS = (
+    Facet('difficulty', 'Difficulty', 'difficulty_level', tuple(
+        FacetOption(level, level, value=level) for level in DIFFICULTY_LEVELS
+    )),
+    Facet('time', 'Cooking time', 'cooking_time', (
+        FacetOption('under-15', 'Under 15 min', high=15),
+        FacetOption('15-30', '15 to 30 min', low=15, high=QUICK_COOKING_TIME),
+        FacetOption('30-60', '30 to 60 min', low=QUICK_COOKING_TIME, high=60),
+        FacetOption('over-60', 'Over an hour', low=60),
+    )),
+    Facet('ingredients', 'Ingredients', 'ingredient_count', (
+        FacetOption('few', f'Up to {FEW_INGREDIENTS}', high=FEW_INGREDIENTS + 1),
+        FacetOption('some', f'{FEW_INGREDIENTS + 1} to 10', low=FEW_INGREDIENTS + 1, high=11),
+        FacetOption('many', 'More than 10', low=11),
+    )),
+)
+
+
+def parse_facets(params):
+    """
+    The selected options in a QueryDict, as {facet name: (option keys)} in
+    the order FACETS lists them; unknown values are ignored
+    """
+    selected = {}
+    for facet in FACETS:
+        values = set(params.getlist(facet.name))
+        keys = tuple(option.key for option in facet.options if option.key in values)
+        if keys:
+            selected[facet.name] = keys
+    return selected
+
+
+def facet_querystring(selected):
+    """The query string of a selection, the same for equal selections"""
+    return urlencode([(name, key) for name, keys in selected.items() for key in keys])
+
+
+def facet_filter(selected):
+    """Q object for a selection"""
+    condition = Q()
+    for facet in FACETS:
+        if facet.name in selected:
+            alternatives = Q()
+            for option in facet.options:
+                if option.key in selected[facet.name]:
+                    alternatives |= option.filter(facet.field)
+            condition &= alternatives
+    return condition
+
+
+def facet_groups(queryset):
+    """
+    [(difficulty, cooking_time, ingredient_count, number of recipes)]
+    over `queryset`: the only query facet_counts() needs, and the same for
+    every selection, so it can be cached
+    """
+    # SQLite cannot read the generated difficulty_level from an index alone
+    rows = queryset.order_by().values_list('cooking_time', 'ingredient_count').annotate(recipes=Count('*'))
+    return [
+        (difficulty_of(cooking_time, ingredient_count), cooking_time, ingredient_count, recipes)
+        for cooking_time, ingredient_count, recipes in rows
+    ]
+
+
+def facet_counts(groups, selected):
+    """
+    Count every option from facet_groups() for a selection. Returns (number
+    of recipes matching the whole selection, [{'name', 'label', 'options':
+    [{'key', 'label', 'count', 'selected'}]}]) for the template.
+    """
+    chosen = [
+        [option for option in facet.options if option.key in selected[facet.name]] if facet.name in selected else None
+        for facet in FACETS
+    ]
+    total = 0
+    counts = [[0] * len(facet.options) for facet in FACETS]
+    for *values, recipes in groups:
+        # Which facets' selections this group fails
+        failing = [
+            number for number, (options, value) in enumerate(zip(chosen, values))
+            if options is not None and not any(option.matches(value) for option in options)
+        ]
+        if not failing:
+            total += recipes
+        if len(failing) > 1:
+            continue
+        for number, (facet, value) in enumerate(zip(FACETS, values)):
+            if failing and failing[0] != number:
+                continue
+            for position, option in enumerate(facet.options):
+                if option.matches(value):
+                    counts[number][position] += recipes
+    groups = [
+        {
+            'name': facet.name,
+            'label': facet.label,
+            'options': [
+                {
+                    'key': option.key,
+                    'label': option.label,
+                    'count': count,
+                    'selected': option.key in selected.get(facet.name, ()),
+                }
+                for option, count in zip(facet.options, facet_count)
+            ],
+        }
+        for facet, facet_count in zip(FACETS, counts)
+    ]
+    return total, groups
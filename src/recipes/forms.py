@@ -8,8 +8,23 @@ CHART_CHOICES = (
     ('#3','Ingredients Quantity Distribution'),
 )
 
+#URL names of the chart types, as in /recipe/<id>/chart/prices.png
+CHART_SLUGS = {
+    '#1': 'prices',
+    '#2': 'calories',
+    '#3': 'quantities',
+}
+
 class RecipeSearchForm(forms.Form): 
-   recipe_name = forms.CharField(max_length=120)
+   #Suggestions come from recipes:suggest, filled in by home.js
+   recipe_name = forms.CharField(
+      max_length=120,
+      widget=forms.TextInput(attrs={'list': 'recipe-suggestions', 'autocomplete': 'off'}),
+   )
+
+class PantryForm(forms.Form):
+   #Free text, split on commas, semicolons and new lines (see recipes.pantry)
+   have = forms.CharField(max_length=500, label='Ingredients you have')
 
 class ChartForm(forms.Form): 
    chart_type = forms.ChoiceField(choices=CHART_CHOICES)
\ No newline at end of file
@@ -0,0 +1,166 @@
+"""
+Typo-tolerant search.
+
+Every word used in a recipe or ingredient name is split into trigrams
+(padded like PostgreSQL's pg_trgm: "pie" -> "  p", " pi", "pie", "ie ") and
+stored in the SearchTrigram side table, one row per (trigram, word). The
+table grows with the vocabulary, not with the number of recipes. Saving a
+name adds its new words; words no names use any more are only dropped when
+the table is rebuilt (rebuild_search_index, refresh_recipes()), as finding
+them would mean scanning every name. A stale word can at worst be offered
+as a correction that finds nothing, which search_with_corrections ignores.
+
+When a search finds nothing, each word of the query that does not start a
+known word is looked up by its trigrams: the words sharing the most
+trigrams come back from the (trigram, word) index as candidates, are
+re-ranked by similarity (shared trigrams over all trigrams of the two
+words) and the best one above SIMILARITY_THRESHOLD replaces the typed word.
+The corrected query then goes through the normal search backend, so results
+are ranked and highlighted as usual: "spagetti" finds the "Spaghetti"
+recipes, "lasagne" the "Lasagna" ones.
+"""
+from math import ceil
+
+from django.db.models import Count
+
+from .models import Ingredient, Recipe, RecipeIngredient, SearchTrigram
+from .search import DEFAULT_LIMIT, normalize_query, search_recipes, search_terms
+
+# Shorter words share too few trigrams to compare (and prefix search
+# already finds them)
+MIN_WORD_LENGTH = 3
+MAX_WORD_LENGTH = SearchTrigram._meta.get_field('word').max_length
+SIMILARITY_THRESHOLD = 0.3
+# Candidates fetched per word before re-ranking
+CANDIDATES = 20
+
+
+def trigrams(word):
+    padded = f'  {word} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def similarity(a, b):
+    """Shared trigrams over all trigrams of the two words (0 to 1)"""
+    a, b = trigrams(a), trigrams(b)
+    return len(a & b) / len(a | b)
+
+
+def words_of(texts):
+    """The distinct lowercase words of some names that the table holds"""
+    words = set()
+    for text in texts:
+        for word in search_terms(text):
+            if MIN_WORD_LENGTH <= len(word) <= MAX_WORD_LENGTH and not word.isdigit():
+                words.add(word.lower())
+    return words
+
+
+# ============================================
+# MAINTENANCE
+# ============================================
+
+def add_words(words):
+    """Store the trigrams of the given words that are not in the table yet"""
+    words = list(words)
+    for start in range(0, len(words), 500):
+        chunk = words[start:start + 500]
+        known = set(SearchTrigram.objects.filter(word__in=chunk).values_list('word', flat=True).distinct())
+        SearchTrigram.objects.bulk_create(
+            [SearchTrigram(trigram=trigram, word=word) for word in chunk if word not in known for trigram in trigrams(word)],
+            batch_size=1000,
+            ignore_conflicts=True,
+        )
+
+
+def index_name_words(name):
+    """Add the words of a saved recipe or ingredient name"""
+    add_words(words_of([name or '']))
+
+
+def index_recipe_words(recipe_ids):
+    """Add the words of some recipes' names and of their ingredients' names"""
+    recipe_ids = list(recipe_ids)
+    names = []
+    for start in range(0, len(recipe_ids), 500):
+        chunk = recipe_ids[start:start + 500]
+        names.extend(Recipe.objects.filter(pk__in=chunk).values_list('name', flat=True))
+        names.extend(
+            RecipeIngredient.objects.filter(recipe_id__in=chunk)
+            .values_list('ingredient__name', flat=True).distinct()
+        )
+    add_words(words_of(names))
+
+
+def rebuild_search_words():
+    """Refill the table from every recipe and ingredient name; returns the word count"""
+    names = Recipe.objects.values_list('name', flat=True).iterator(chunk_size=10000)
+    words = words_of(names) | words_of(Ingredient.objects.values_list('name', flat=True).iterator(chunk_size=10000))
+    SearchTrigram.objects.all().delete()
+    SearchTrigram.objects.bulk_create(
+        (SearchTrigram(trigram=trigram, word=word) for word in words for trigram in trigrams(word)),
+        batch_size=1000,
+    )
+    return len(words)
+
+
+# ============================================
+# LOOKUPS
+# ============================================
+
+def is_known(term):
+    """Whether some stored word starts with `term`"""
+    return SearchTrigram.objects.filter(word__gte=term, word__lt=term + '\uffff').exists()
+
+
+def similar_words(term, limit=5, threshold=SIMILARITY_THRESHOLD):
+    """
+    (word, similarity) of the stored words most similar to `term`, best
+    first, leaving out those below `threshold`
+    """
+    term = term.lower()
+    grams = trigrams(term)
+    # A word can only reach the threshold if it shares this many trigrams
+    min_shared = max(1, ceil(threshold * len(grams)))
+    candidates = (
+        SearchTrigram.objects.filter(trigram__in=grams)
+        .values('word')
+        .annotate(shared=Count('*'))
+        .filter(shared__gte=min_shared)
+        .order_by('-shared', 'word')
+        .values_list('word', flat=True)[:CANDIDATES]
+    )
+    scored = [(word, similarity(term, word)) for word in candidates]
+    scored.sort(key=lambda item: (-item[1], abs(len(item[0]) - len(term)), item[0]))
+    return [(word, score) for word, score in scored if score >= threshold][:limit]
+
+
+def correct_query(query):
+    """
+    `query` normalized, with each unknown word replaced by the most similar
+    known word; None when there is nothing to correct
+    """
+    terms = normalize_query(query).split()
+    corrected = []
+    for term in terms:
+        if len(term) >= MIN_WORD_LENGTH and not term.isdigit() and not is_known(term):
+            matches = similar_words(term, limit=1)
+            if matches:
+                term = matches[0][0]
+        corrected.append(term)
+    return ' '.join(corrected) if corrected != terms else None
+
+
+def search_with_corrections(query, limit=DEFAULT_LIMIT):
+    """
+    Search for `query`; when nothing matches, search again with misspelt
+    words corrected. Returns (hits, corrected query or None).
+    """
+    hits = search_recipes(query, limit=limit)
+    if hits:
+        return hits, None
+    corrected = correct_query(query)
+    if corrected is None:
+        return hits, None
+    hits = search_recipes(corrected, limit=limit)
+    return hits, corrected if hits else None
@@ -0,0 +1,127 @@
+import re
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from recipes.models import Recipe
+
+# Plan lines that read every row of a table: "SCAN recipes_recipe", "SCAN U0"
+# or "SCAN t USING INDEX i" (the whole index, then each row). Scans of a
+# covering index, which never touch the rows, virtual tables and subqueries
+# are not matched.
+_SCAN_RE = re.compile(r'^SCAN (\w+)(?: USING INDEX \w+)?$')
+# Sorts of every row found; "USE TEMP B-TREE FOR RIGHT PART OF ORDER BY" only
+# orders rows that tie on the leading, indexed terms
+_FULL_SORTS = {'USE TEMP B-TREE FOR ORDER BY', 'USE TEMP B-TREE FOR GROUP BY', 'USE TEMP B-TREE FOR DISTINCT'}
+# Table aliases Django uses in subqueries and joins: FROM "recipes_recipe" U0
+_ALIAS_RE = re.compile(r'(?:FROM|JOIN)\s+"(\w+)"(?:\s+(?:AS\s+)?"?([A-Z]\d+)\b"?)?')
+
+
+def full_scans(sql, plan):
+    """
+    Tables that an EXPLAIN QUERY PLAN result reads in full. A scan is not
+    counted when the statement has a LIMIT and does not sort all rows:
+    rows then come in the scanned order and reading stops at the limit
+    (the first Home page reads 13 recipes this way).
+    """
+    details = [row[-1] for row in plan]
+    if ' LIMIT ' in sql and not _FULL_SORTS.intersection(details):
+        return []
+    aliases = {}
+    for table, alias in _ALIAS_RE.findall(sql):
+        aliases[alias or table] = table
+    tables = []
+    for detail in details:
+        match = _SCAN_RE.match(detail)
+        if match:
+            tables.append(aliases.get(match.group(1), match.group(1)))
+    return tables
+
+
+class Command(BaseCommand):
+    help = (
+        'Request the hot pages (Home, search, recipe details, admin changelists) '
+        'through the test client, run EXPLAIN QUERY PLAN on every SELECT they issue '
+        'and fail when one reads a whole table holding more than --min-rows rows'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-rows', type=int,
+            default=getattr(settings, 'QUERY_PLAN_MIN_ROWS', 1000),
+            help='Full scans of tables with fewer rows are allowed',
+        )
+        parser.add_argument('--query', default='chicken', help='Search term for the search pages')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('EXPLAIN QUERY PLAN is only available on SQLite')
+        recipe = Recipe.objects.order_by('-ingredient_count', 'pk').first()
+        if recipe is None:
+            raise CommandError('No recipes to request; run seed_catalog first')
+        recipe_ids = Recipe.objects.order_by('pk').values_list('pk', flat=True)
+        deep_cursor = recipe_ids[recipe_ids.count() * 9 // 10]
+        pages = {
+            'home': ('/', {}),
+            'home_deep': ('/', {'after': deep_cursor}),
+            'home_sorted': ('/', {'sort': '-cost'}),
+            'home_facets': ('/', {'difficulty': 'Easy', 'time': 'under-15'}),
+            'search': ('/', {'recipe_name': options['query']}),
+            'search_misspelt': ('/', {'recipe_name': options['query'][:-1] + 'x' + options['query'][-1:]}),
+            'detail': (recipe.get_absolute_url(), {}),
+            'admin_recipes': (reverse('admin:recipes_recipe_changelist'), {}),
+            'admin_recipes_sorted': (reverse('admin:recipes_recipe_changelist'), {'o': '1'}),
+            'admin_recipes_filtered': (reverse('admin:recipes_recipe_changelist'), {'difficulty_level': 'Easy'}),
+            'admin_ingredients': (reverse('admin:recipes_ingredient_changelist'), {}),
+        }
+
+        statements = []
+
+        def capture(execute, sql, params, many, context):
+            if sql.lstrip().upper().startswith('SELECT'):
+                statements.append((sql, params))
+            return execute(sql, params, many, context)
+
+        problems = []
+        row_counts = {}
+        # Nothing is cached, so every page runs all of its queries; the
+        # audit user is rolled back at the end
+        with transaction.atomic(), override_settings(
+            CACHES={**settings.CACHES, 'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+        ):
+            user = User.objects.create_superuser('query-plan-audit', password=None)
+            client = Client(HTTP_HOST='localhost')
+            client.force_login(user)
+            for name, (path, params) in pages.items():
+                statements.clear()
+                with connection.execute_wrapper(capture):
+                    response = client.get(path, params)
+                if response.status_code != 200:
+                    problems.append(f'{name}: {path} answered {response.status_code}')
+                    continue
+                found = []
+                for sql, params in list(statements):
+                    with connection.cursor() as cursor:
+                        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+                        plan = cursor.fetchall()
+                    for table in full_scans(sql, plan):
+                        if table not in row_counts:
+                            with connection.cursor() as cursor:
+                                cursor.execute(f'SELECT count(*) FROM "{table}"')
+                                row_counts[table] = cursor.fetchone()[0]
+                        if row_counts[table] >= options['min_rows']:
+                            found.append(table)
+                            problems.append(f'{name}: full scan of {table} ({row_counts[table]} rows) in {sql[:200]}')
+                    if options['verbosity'] >= 2:
+                        self.stdout.write(f'    {sql}\n      ' + '\n      '.join(row[-1] for row in plan))
+                status = self.style.ERROR(f'full scan of {", ".join(sorted(set(found)))}') if found else 'ok'
+                self.stdout.write(f'{name:24} {len(statements):3} queries  {status}')
+            transaction.set_rollback(True)
+
+        if problems:
+            raise CommandError('\n'.join(problems))
+        self.stdout.write(self.style.SUCCESS(f'No full scans of tables with {options["min_rows"]} rows or more'))
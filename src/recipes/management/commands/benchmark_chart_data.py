@@ -0,0 +1,50 @@
+import timeit
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from recipes.utils import CHART_FIELDS, ChartData
+
+
+def synthetic_rows(size):
+    """values_list-style rows shaped like real RecipeIngredient data"""
+    return [
+        (f'Ingredient {i}', 50 + i % 400, Decimal(f'{1 + i % 20}.{i % 100:02d}'), (1 + i % 3) / (2 + i % 2))
+        for i in range(size)
+    ]
+
+
+def dataframe_path(rows):
+    # What Details used to do: values() dicts -> DataFrame -> columns
+    from pandas import DataFrame
+    frame = DataFrame([dict(zip(CHART_FIELDS, row)) for row in rows])
+    return (frame['ingredient__name'].values, frame['ingredient__price'], frame['amount'])
+
+
+def columnar_path(rows):
+    data = ChartData.from_rows(rows)
+    return (data['ingredient__name'], data['ingredient__price'], data['amount'])
+
+
+class Command(BaseCommand):
+    help = 'Compare building chart data with pandas DataFrame and with ChartData'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[5, 50, 500])
+        parser.add_argument('--repeat', type=int, default=5, help='Timing rounds; the best one is reported')
+
+    def handle(self, *args, **options):
+        # Import both libraries up front so import time is not measured
+        dataframe_path(synthetic_rows(1))
+        columnar_path(synthetic_rows(1))
+
+        self.stdout.write(f'{"rows":>6} {"DataFrame us":>14} {"ChartData us":>14} {"speedup":>8}')
+        for size in options['sizes']:
+            rows = synthetic_rows(size)
+            timings = []
+            for path in (dataframe_path, columnar_path):
+                timer = timeit.Timer(lambda: path(rows))
+                number, _ = timer.autorange()
+                best = min(timer.repeat(repeat=options['repeat'], number=number))
+                timings.append(best / number * 1e6)
+            self.stdout.write(f'{size:>6} {timings[0]:>14.1f} {timings[1]:>14.1f} {timings[0] / timings[1]:>7.1f}x')
@@ -0,0 +1,92 @@
+import json
+import shutil
+import tempfile
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+from recipes.fuzzy import correct_query, search_with_corrections
+from recipes.management.commands.benchmark_views import percentile
+from recipes.models import Recipe, SearchTrigram
+from recipes.search import search_recipes
+
+# Misspellings of words in the synthetic catalog (see seed_catalog), plus
+# one that has nothing close to it
+QUERIES = ('risoto', 'spicey curri', 'chiken', 'noodels', 'cassarole', 'spagetti')
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed synthetic catalogs of increasing size and time typo-tolerant search '
+        'on each, printing the latency curve as JSON. Runs in a transaction that '
+        'is rolled back, so the database is left as it was.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000], help='Recipe counts to seed')
+        parser.add_argument('--iterations', type=int, default=30)
+        parser.add_argument('--queries', nargs='+', default=list(QUERIES))
+        parser.add_argument('--output', help='Write the JSON to this file instead of stdout')
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError('--iterations must be at least 1')
+        curve = []
+        # Seeding clears the chart cache, which is files on disk and would
+        # not be rolled back: point it at a throwaway directory
+        cache_dir = tempfile.mkdtemp()
+        try:
+            with override_settings(CHART_CACHE_DIR=cache_dir), transaction.atomic():
+                for size in sorted(options['sizes']):
+                    self.stderr.write(f'Seeding {size} recipes...')
+                    call_command('seed_catalog', recipes=size, clear=True, stdout=self.stderr)
+                    curve.append(self.measure_size(options['queries'], options['iterations']))
+                transaction.set_rollback(True)
+        finally:
+            shutil.rmtree(cache_dir, ignore_errors=True)
+
+        report = json.dumps({'meta': {'iterations': options['iterations'], 'database': connection.vendor}, 'curve': curve}, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                output.write(report + '\n')
+            self.stderr.write(f'Wrote {options["output"]}')
+        else:
+            self.stdout.write(report)
+
+    def measure_size(self, queries, iterations):
+        results = {}
+        for query in queries:
+            results[query] = {
+                # The exact search that comes back empty, the trigram
+                # lookup, and the two together with the corrected search
+                'exact': self.measure(lambda: search_recipes(query), iterations),
+                'correct': self.measure(lambda: correct_query(query), iterations),
+                'total': self.measure(lambda: search_with_corrections(query), iterations),
+                'corrected_query': search_with_corrections(query)[1],
+            }
+        return {
+            'recipes': Recipe.objects.count(),
+            'words': SearchTrigram.objects.values('word').distinct().count(),
+            'trigram_rows': SearchTrigram.objects.count(),
+            'results': results,
+        }
+
+    @staticmethod
+    def measure(call, iterations):
+        call()
+        timings, queries = [], []
+        for _ in range(iterations):
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                call()
+                timings.append((time.perf_counter() - start) * 1000)
+            queries.append(len(captured))
+        return {
+            'p50_ms': round(percentile(timings, 50), 3),
+            'p95_ms': round(percentile(timings, 95), 3),
+            'queries': max(queries),
+        }
@@ -0,0 +1,139 @@
+import json
+import math
+import platform
+import shutil
+import tempfile
+import time
+
+import django
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from recipes.chart_cache import get_chart_cache
+from recipes.models import Recipe, RecipeIngredient
+from recipes.management.commands.seed_catalog import USERNAME_PREFIX
+
+TARGETS = ('home', 'home_deep', 'home_sorted', 'search', 'pantry', 'detail', 'detail_chart', 'chart_data', 'chart_image')
+
+
+def percentile(samples, p):
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+class Command(BaseCommand):
+    help = (
+        'Time the main views through the Django test client and print p50/p95/p99 '
+        'latency and query counts as JSON (seed data first with seed_catalog)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=30)
+        parser.add_argument('--warmup', type=int, default=3, help='Untimed requests before each target')
+        parser.add_argument('--targets', nargs='+', choices=TARGETS, default=list(TARGETS))
+        parser.add_argument('--query', default='chicken', help='Search term for the search target')
+        parser.add_argument('--pantry', default='flour, egg, milk, butter', help='Ingredients for the pantry target')
+        parser.add_argument('--username', help='User to log in as (default: the first synthetic user)')
+        parser.add_argument('--label', default='', help='Free text stored in the output, e.g. a commit id')
+        parser.add_argument('--output', help='Write the JSON to this file instead of stdout')
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1:
+            raise CommandError('--iterations must be at least 1')
+        user = self.get_user(options['username'])
+        recipe = Recipe.objects.order_by('-ingredient_count', 'pk').first()
+        if recipe is None:
+            raise CommandError('No recipes to benchmark; run seed_catalog first')
+        recipe_ids = Recipe.objects.order_by('pk').values_list('pk', flat=True)
+        deep_cursor = recipe_ids[recipe_ids.count() * 9 // 10]
+
+        client = Client(HTTP_HOST='localhost')
+        client.force_login(user)
+
+        def chart_image():
+            # Cold cache every time, so this measures the render itself
+            get_chart_cache().clear()
+            return client.get(f'/recipe/{recipe.pk}/chart/prices.png')
+
+        requests = {
+            'home': lambda: client.get('/'),
+            'home_deep': lambda: client.get('/', {'after': deep_cursor}),
+            'home_sorted': lambda: client.get('/', {'sort': '-cost'}),
+            'search': lambda: client.get('/', {'recipe_name': options['query']}),
+            'pantry': lambda: client.get('/pantry', {'have': options['pantry']}),
+            'detail': lambda: client.get(recipe.get_absolute_url()),
+            'detail_chart': lambda: client.post(recipe.get_absolute_url(), {'chart_type': '#1'}),
+            'chart_data': lambda: client.get(f'/recipe/{recipe.pk}/chart.json'),
+            'chart_image': chart_image,
+        }
+
+        # Keep the benchmark's chart renders out of the real chart cache
+        cache_dir = tempfile.mkdtemp()
+        try:
+            with override_settings(CHART_CACHE_DIR=cache_dir):
+                results = {
+                    target: self.measure(requests[target], options['iterations'], options['warmup'])
+                    for target in options['targets']
+                }
+        finally:
+            shutil.rmtree(cache_dir, ignore_errors=True)
+
+        report = json.dumps({
+            'meta': {
+                'label': options['label'],
+                'recipes': len(recipe_ids),
+                'ingredient_links': RecipeIngredient.objects.count(),
+                'detail_recipe_links': recipe.ingredient_count,
+                'iterations': options['iterations'],
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+            },
+            'results': results,
+        }, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                output.write(report + '\n')
+            self.stderr.write(f'Wrote {options["output"]}')
+        else:
+            self.stdout.write(report)
+
+    @staticmethod
+    def get_user(username):
+        if username:
+            user = User.objects.filter(username=username).first()
+        else:
+            user = (
+                User.objects.filter(username__startswith=USERNAME_PREFIX).order_by('pk').first()
+                or User.objects.order_by('pk').first()
+            )
+        if user is None:
+            raise CommandError('No user to log in as')
+        return user
+
+    @staticmethod
+    def measure(request, iterations, warmup):
+        for _ in range(warmup):
+            request()
+        timings, queries, statuses = [], [], set()
+        for _ in range(iterations):
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                response = request()
+                timings.append((time.perf_counter() - start) * 1000)
+            queries.append(len(captured))
+            statuses.add(response.status_code)
+        return {
+            'p50_ms': round(percentile(timings, 50), 2),
+            'p95_ms': round(percentile(timings, 95), 2),
+            'p99_ms': round(percentile(timings, 99), 2),
+            'mean_ms': round(sum(timings) / len(timings), 2),
+            'min_ms': round(min(timings), 2),
+            'max_ms': round(max(timings), 2),
+            'queries': max(queries),
+            'status': sorted(statuses),
+        }
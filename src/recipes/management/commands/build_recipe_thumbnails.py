@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes.models import Recipe
+from recipes.page_cache import bump_catalog_version
+from recipes.thumbnails import safe_build_variants
+
+
+class Command(BaseCommand):
+    help = 'Create the resized WebP/JPEG variants and placeholders of existing recipe photos'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Rebuild variants even for recipes that already have them',
+        )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        built = skipped = 0
+        # Many recipes share a photo (e.g. the default picture): process each file once
+        by_source = {}
+        recipes = Recipe.objects.only('id', 'pic', 'pic_variants').order_by('pk')
+        for recipe in recipes.iterator(chunk_size=200):
+            if not recipe.pic:
+                continue
+            up_to_date = recipe.pic_variants.get('source') == recipe.pic.name and recipe.pic_variants.get('jpeg')
+            if up_to_date and not options['force']:
+                skipped += 1
+                continue
+            if recipe.pic.name not in by_source:
+                by_source[recipe.pic.name] = safe_build_variants(recipe.pic)
+            Recipe.objects.filter(pk=recipe.pk).update(pic_variants=by_source[recipe.pic.name])
+            built += 1
+        if built:
+            # update() skips the signals; cached cards still point at the old images
+            bump_catalog_version()
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f'Built variants for {built} recipes ({len(by_source)} images), '
+            f'{skipped} already up to date, in {elapsed:.2f}s'
+        ))
@@ -0,0 +1,111 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Heavy libraries that must only be imported by the code paths that use them
+LAZY_MODULES = ('numpy', 'pandas', 'matplotlib')
+
+# Runs in a fresh interpreter so nothing is imported yet
+STARTUP_SCRIPT = """
+import sys
+import django
+django.setup()
+from django.urls import resolve
+for path in sys.argv[1:]:
+    resolve(path)
+"""
+
+
+def parse_importtime(stderr):
+    """
+    Parse `python -X importtime` output into (module, self_us, cumulative_us,
+    depth) tuples. Depth 0 are the imports made directly by the script.
+    """
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        depth = (len(name) - len(name.lstrip(' ')) - 1) // 2
+        imports.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return imports
+
+
+def project_packages():
+    """Top-level packages of this project (recipes, jangorecipes, ...)"""
+    return {path.parent.name for path in Path(settings.BASE_DIR).glob('*/__init__.py')}
+
+
+def project_import_us(imports, packages):
+    """
+    Microseconds spent importing the project's modules, including the
+    libraries they are the first to import. What the interpreter and Django
+    import on their own is left out, so the figure follows the project's
+    code rather than how fast the machine starts Python.
+    """
+    total = 0
+    # Depth of the project module whose subtree is being walked, if any
+    inside = None
+    # importtime lists a module after its imports; reversed, parents come first
+    for name, _, cumulative_us, depth in reversed(imports):
+        if inside is not None and depth <= inside:
+            inside = None
+        if inside is None and name.split('.')[0] in packages:
+            total += cumulative_us
+            inside = depth
+    return total
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure the import cost of django.setup() plus URL resolution with '
+        '`python -X importtime` and fail when the project\'s share of it is '
+        'over budget or it loads libraries that should be imported lazily'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--budget-ms', type=float,
+            default=getattr(settings, 'IMPORT_TIME_BUDGET_MS', 100),
+            help='Maximum import time of the project\'s own modules in milliseconds',
+        )
+        parser.add_argument(
+            '--path', action='append', dest='paths',
+            help='URL path to resolve after setup (repeatable)',
+        )
+        parser.add_argument('--top', type=int, default=10, help='Number of slowest imports to list')
+
+    def handle(self, *args, **options):
+        paths = options['paths'] or ['/', '/recipe/1', '/login/', '/admin/']
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings.SETTINGS_MODULE)
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', STARTUP_SCRIPT, *paths],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+        )
+        if result.returncode:
+            raise CommandError(f'Startup script failed:\n{result.stderr[-2000:]}')
+
+        imports = parse_importtime(result.stderr)
+        total_ms = sum(cumulative for _, _, cumulative, depth in imports if depth == 0) / 1000
+        project_ms = project_import_us(imports, project_packages()) / 1000
+        loaded = {name for name, _, _, _ in imports}
+
+        self.stdout.write(f'Total import time: {total_ms:.1f} ms')
+        self.stdout.write(f'Project modules: {project_ms:.1f} ms (budget {options["budget_ms"]:.0f} ms)')
+        self.stdout.write('Slowest imports (self time):')
+        for name, self_us, cumulative_us, _ in sorted(imports, key=lambda i: -i[1])[:options['top']]:
+            self.stdout.write(f'  {self_us / 1000:8.1f} ms  {cumulative_us / 1000:8.1f} ms cumulative  {name}')
+
+        problems = []
+        if project_ms > options['budget_ms']:
+            problems.append(f'project import time {project_ms:.1f} ms is over the {options["budget_ms"]:.0f} ms budget')
+        eager = sorted(module for module in LAZY_MODULES if module in loaded)
+        if eager:
+            problems.append(f'imported at startup but should be lazy: {", ".join(eager)}')
+        if problems:
+            raise CommandError('; '.join(problems))
+        self.stdout.write(self.style.SUCCESS('Import time OK'))
@@ -0,0 +1,67 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.catalog_io import FORMATS, ImportRecordError, guess_format, import_catalog, open_catalog
+
+
+class Command(BaseCommand):
+    help = (
+        'Stream recipes with their ingredients from a CSV or JSONL file (optionally '
+        'gzipped, "-" for stdin) into the database in batches. See recipes/catalog_io.py '
+        'for the file layout.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=FORMATS, help='Default: from the file extension')
+        parser.add_argument('--user', required=True, help='Username that will own the imported recipes')
+        parser.add_argument('--batch-size', type=int, default=2000, help='Recipes or links per transaction')
+        parser.add_argument('--max-errors', type=int, default=100, help='Give up after this many invalid records')
+        parser.add_argument('--progress', type=int, default=100000, help='Report progress every N links')
+
+    def handle(self, *args, **options):
+        fmt = options['format'] or guess_format(options['path'])
+        if fmt is None:
+            raise CommandError('Cannot tell the format from the file name; pass --format')
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f'No user named {options["user"]!r}')
+
+        errors = 0
+
+        def on_error(line, message):
+            nonlocal errors
+            errors += 1
+            self.stderr.write(f'line {line}: {message}, skipped')
+            if errors >= options['max_errors']:
+                raise CommandError(f'Stopped after {errors} invalid records')
+
+        def on_progress(importer, seconds):
+            self.stdout.write(f'  {importer.links} links, {importer.links / seconds:,.0f} links/s')
+
+        start = time.perf_counter()
+        try:
+            with open_catalog(options['path']) as lines:
+                importer = import_catalog(
+                    lines, fmt, user,
+                    batch_size=options['batch_size'],
+                    on_error=on_error,
+                    on_progress=on_progress,
+                    progress_every=options['progress'],
+                )
+        except (OSError, ImportRecordError) as error:
+            raise CommandError(str(error))
+        elapsed = time.perf_counter() - start
+        rows = importer.recipes + importer.links
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {importer.recipes} recipes and {importer.links} ingredient links '
+            f'({importer.new_ingredients} new ingredients) in {elapsed:.2f}s, '
+            f'{rows / elapsed if elapsed else 0:,.0f} rows/s'
+        ))
+        if errors or importer.duplicate_links:
+            self.stdout.write(
+                f'Skipped {errors} invalid records and {importer.duplicate_links} repeated ingredients'
+            )
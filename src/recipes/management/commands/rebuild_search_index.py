@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes.fuzzy import rebuild_search_words
+from recipes.page_cache import bump_catalog_version
+from recipes.search import get_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the recipe full-text search index and the trigram table behind typo-tolerant search'
+
+    def handle(self, *args, **options):
+        backend = get_backend()
+        start = time.perf_counter()
+        count = backend.rebuild()
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {count} recipes with {type(backend).__name__} in {elapsed:.2f}s'
+        ))
+        start = time.perf_counter()
+        words = rebuild_search_words()
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed trigrams of {words} words in {elapsed:.2f}s'
+        ))
+        # Cached search results came from the old index
+        bump_catalog_version()
@@ -0,0 +1,135 @@
+import random
+import time
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.models import Ingredient, Recipe, RecipeIngredient
+from recipes.quantities import parse_quantity
+from recipes.signals import refresh_recipes, suspend_handlers
+
+# Synthetic rows are recognisable by these, so --clear never touches real data
+USERNAME_PREFIX = 'synthetic-'
+SUPPLIER = 'Synthetic Foods'
+
+ADJECTIVES = (
+    'Classic', 'Spicy', 'Creamy', 'Rustic', 'Quick', 'Smoky', 'Zesty', 'Golden',
+    'Hearty', 'Crispy', 'Sweet', 'Tangy', 'Herbed', 'Roasted', 'Glazed', 'Fresh',
+)
+DISHES = (
+    'Pancakes', 'Curry', 'Risotto', 'Tacos', 'Lasagna', 'Chili', 'Salad', 'Soup',
+    'Muffins', 'Stir Fry', 'Pie', 'Casserole', 'Noodles', 'Flatbread', 'Stew', 'Cookies',
+)
+INGREDIENTS = (
+    'Flour', 'Sugar', 'Butter', 'Egg', 'Milk', 'Salt', 'Garlic', 'Onion', 'Tomato',
+    'Rice', 'Chicken', 'Beans', 'Cheese', 'Basil', 'Pepper', 'Lemon', 'Carrot',
+    'Potato', 'Honey', 'Yogurt', 'Spinach', 'Mushroom', 'Oats', 'Cinnamon',
+)
+VARIETIES = ('', 'Organic ', 'Smoked ', 'Wholegrain ', 'Red ', 'Wild ', 'Aged ', 'Baby ')
+QUANTITIES = (
+    '1 cup', '1/2 cup', '2 cups', '1 1/2 cups', '1 tbsp', '2 tbsp', '1 tsp', '1/2 tsp',
+    '100 g', '250 g', '1 kg', '200 ml', '2-3 cloves', '1 pinch', '3 pieces', '1 can', 'to taste',
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a deterministic synthetic catalog (users, ingredients, recipes and '
+        'ingredient links) with bulk_create, for benchmarks and load tests'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=1000)
+        parser.add_argument('--ingredients', type=int, default=200)
+        parser.add_argument('--users', type=int, default=10)
+        parser.add_argument('--min-links', type=int, default=3, help='Fewest ingredients per recipe')
+        parser.add_argument('--max-links', type=int, default=12, help='Most ingredients per recipe')
+        parser.add_argument('--seed', type=int, default=1, help='Random seed; the same seed gives the same catalog')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--clear', action='store_true', help='Delete previously seeded data first')
+
+    def handle(self, *args, **options):
+        if not 1 <= options['min_links'] <= options['max_links'] <= options['ingredients']:
+            raise CommandError('Need 1 <= --min-links <= --max-links <= --ingredients')
+        rng = random.Random(options['seed'])
+        batch_size = options['batch_size']
+        start = time.perf_counter()
+
+        with transaction.atomic():
+            if options['clear']:
+                self.clear()
+            elif User.objects.filter(username__startswith=USERNAME_PREFIX).exists():
+                raise CommandError('A synthetic catalog already exists; pass --clear to replace it')
+
+            # One hash for all accounts: unusable, log in with force_login()
+            password = make_password(None)
+            users = User.objects.bulk_create(
+                [User(username=f'{USERNAME_PREFIX}{i}', password=password) for i in range(options['users'])],
+                batch_size=batch_size,
+            )
+            ingredients = Ingredient.objects.bulk_create(
+                [self.ingredient(rng, i) for i in range(options['ingredients'])],
+                batch_size=batch_size,
+            )
+            ingredient_ids = [ingredient.pk for ingredient in ingredients]
+            parsed = {text: parse_quantity(text) for text in QUANTITIES}
+
+            links = 0
+            for offset in range(0, options['recipes'], batch_size):
+                count = min(batch_size, options['recipes'] - offset)
+                recipes = Recipe.objects.bulk_create(
+                    [self.recipe(rng, offset + i, rng.choice(users)) for i in range(count)]
+                )
+                batch = []
+                for recipe in recipes:
+                    fan_out = rng.randint(options['min_links'], options['max_links'])
+                    for ingredient_id in rng.sample(ingredient_ids, fan_out):
+                        quantity = rng.choice(QUANTITIES)
+                        amount, unit = parsed[quantity]
+                        batch.append(RecipeIngredient(
+                            recipe=recipe, ingredient_id=ingredient_id,
+                            quantity=quantity, amount=amount, unit=unit,
+                        ))
+                RecipeIngredient.objects.bulk_create(batch, batch_size=batch_size)
+                links += len(batch)
+
+            # bulk_create skips the signal handlers
+            refresh_recipes()
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded {len(users)} users, {len(ingredients)} ingredients, {options["recipes"]} recipes '
+            f'and {links} ingredient links in {elapsed:.2f}s'
+        ))
+
+    def clear(self):
+        with suspend_handlers():
+            Recipe.objects.filter(user__username__startswith=USERNAME_PREFIX).delete()
+            User.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+            Ingredient.objects.filter(supplier=SUPPLIER).delete()
+
+    @staticmethod
+    def ingredient(rng, index):
+        base = INGREDIENTS[index % len(INGREDIENTS)]
+        variety = VARIETIES[index // len(INGREDIENTS) % len(VARIETIES)]
+        return Ingredient(
+            name=f'{variety}{base} #{index}',
+            calories=rng.randint(0, 900),
+            price=Decimal(rng.randint(10, 2500)) / 100,
+            supplier=SUPPLIER,
+        )
+
+    @staticmethod
+    def recipe(rng, index, user):
+        name = f'{rng.choice(ADJECTIVES)} {rng.choice(DISHES)} #{index}'
+        steps = [f'Step {step}: {rng.choice(ADJECTIVES).lower()} preparation.' for step in range(1, rng.randint(3, 8))]
+        return Recipe(
+            name=name,
+            user=user,
+            cooking_time=rng.choice((10, 15, 20, 25, 30, 45, 60, 90, 120)),
+            description=f'A {name.lower()} from the synthetic catalog.',
+            instructions='\n'.join(steps),
+        )
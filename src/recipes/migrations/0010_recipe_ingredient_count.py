@@ -0,0 +1,34 @@
+# Generated by Django 5.2.8 on 2026-10-18 12:00
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_ingredient_count(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    link_count = (
+        RecipeIngredient.objects.filter(recipe=OuterRef('pk'))
+        .order_by()
+        .values('recipe')
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    Recipe.objects.update(ingredient_count=Coalesce(Subquery(link_count), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_remove_ingredient_pic'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='ingredient_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_ingredient_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,134 @@
+# Generated by Django 5.2.8 on 2026-10-18 12:19
+
+import re
+
+from django.db import migrations, models
+
+BATCH_SIZE = 2000
+
+# A frozen copy of recipes.quantities.parse_quantity_batch as it was when
+# this migration was written, so later changes to the parser do not change
+# what the backfill does. Only a leading number is read: "about 2 cups" has
+# no amount.
+VULGAR_FRACTIONS = {
+    '½': '1/2', '⅓': '1/3', '⅔': '2/3', '¼': '1/4', '¾': '3/4',
+    '⅕': '1/5', '⅖': '2/5', '⅗': '3/5', '⅘': '4/5', '⅙': '1/6',
+    '⅚': '5/6', '⅛': '1/8', '⅜': '3/8', '⅝': '5/8', '⅞': '7/8',
+}
+UNIT_ALIASES = {
+    'cup': ('c', 'cup', 'cups'),
+    'tbsp': ('tbsp', 'tbsps', 'tbs', 'tbl', 'tablespoon', 'tablespoons'),
+    'tsp': ('tsp', 'tsps', 'teaspoon', 'teaspoons'),
+    'g': ('g', 'gr', 'gram', 'grams', 'gramme', 'grammes'),
+    'kg': ('kg', 'kgs', 'kilo', 'kilos', 'kilogram', 'kilograms'),
+    'mg': ('mg', 'milligram', 'milligrams'),
+    'ml': ('ml', 'millilitre', 'millilitres', 'milliliter', 'milliliters'),
+    'l': ('l', 'litre', 'litres', 'liter', 'liters'),
+    'oz': ('oz', 'ounce', 'ounces'),
+    'fl oz': ('floz',),
+    'lb': ('lb', 'lbs', 'pound', 'pounds'),
+    'pinch': ('pinch', 'pinches'),
+    'dash': ('dash', 'dashes'),
+    'piece': ('pc', 'pcs', 'piece', 'pieces'),
+    'clove': ('clove', 'cloves'),
+    'slice': ('slice', 'slices'),
+    'can': ('can', 'cans', 'tin', 'tins'),
+    'stick': ('stick', 'sticks'),
+    'bunch': ('bunch', 'bunches'),
+    'package': ('pkg', 'package', 'packages', 'packet', 'packets'),
+    'scoop': ('scoop', 'scoops'),
+}
+CASE_SENSITIVE_UNITS = {'T': 'tbsp', 't': 'tsp'}
+UNIT_LOOKUP = {alias: unit for unit, aliases in UNIT_ALIASES.items() for alias in aliases}
+
+NUMBER = r'\d+\s+\d+/\d+|\d+/\d+|\d*\.\d+|\d+'
+QUANTITY_RE = re.compile(
+    rf'^\s*(?P<low>{NUMBER})'
+    rf'(?:\s*(?:-|–|to)\s*(?P<high>{NUMBER}))?'
+    r'\s*(?P<unit>[^\W\d_]+(?:\s?[^\W\d_]+)?)?'
+)
+OTHER_DIGIT_RE = re.compile(r'(?![0-9])\d')
+NUMBER_PARTS_RE = re.compile(r'^(?:(?P<whole>\d+)\s+)?(?:(?P<num>\d+)/(?P<den>\d+)|(?P<value>\d*\.\d+|\d+))$')
+
+
+def normalize_unit(word):
+    if not word:
+        return ''
+    if word in CASE_SENSITIVE_UNITS:
+        return CASE_SENSITIVE_UNITS[word]
+    return UNIT_LOOKUP.get(word.lower().rstrip('.').replace(' ', ''), '')
+
+
+def parse_unit(words):
+    return normalize_unit(words) or normalize_unit(words.split()[0])
+
+
+def ascii_digit(match):
+    return str(int(match.group()))
+
+
+def number_series(texts):
+    import numpy as np
+    import pandas as pd
+    parts = texts.str.strip().str.extract(NUMBER_PARTS_RE)
+    value = pd.to_numeric(parts['value'], errors='coerce')
+    num = pd.to_numeric(parts['num'], errors='coerce')
+    den = pd.to_numeric(parts['den'], errors='coerce').replace(0, np.nan)
+    whole = pd.to_numeric(parts['whole'], errors='coerce').fillna(0)
+    return value.fillna(whole + num / den)
+
+
+def parse_quantity_batch(texts):
+    import pandas as pd
+    texts = pd.Series(list(texts), dtype=object).fillna('').astype(str)
+    if texts.empty:
+        return [], []
+    for char, fraction in VULGAR_FRACTIONS.items():
+        texts = texts.str.replace(char, f' {fraction}', regex=False)
+    texts = texts.str.replace(OTHER_DIGIT_RE, ascii_digit, regex=True)
+    parts = texts.str.extract(QUANTITY_RE)
+    low = number_series(parts['low'])
+    high = number_series(parts['high'])
+    amount = low.where(parts['high'].isna(), (low + high) / 2)
+    units = parts['unit'].map(parse_unit, na_action='ignore').fillna('')
+    amounts = [None if pd.isna(value) else float(value) for value in amount]
+    return amounts, units.tolist()
+
+
+def backfill_amount_unit(apps, schema_editor):
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    rows = RecipeIngredient.objects.order_by('pk').values_list('pk', 'quantity')
+    last_pk = 0
+    while True:
+        batch = list(rows.filter(pk__gt=last_pk)[:BATCH_SIZE])
+        if not batch:
+            break
+        pks, quantities = zip(*batch)
+        amounts, units = parse_quantity_batch(quantities)
+        updates = [
+            RecipeIngredient(pk=pk, amount=amount, unit=unit)
+            for pk, amount, unit in zip(pks, amounts, units)
+        ]
+        RecipeIngredient.objects.bulk_update(updates, ['amount', 'unit'])
+        last_pk = batch[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_recipe_ingredient_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipeingredient',
+            name='amount',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='recipeingredient',
+            name='unit',
+            field=models.CharField(blank=True, editable=False, max_length=20),
+        ),
+        migrations.RunPython(backfill_amount_unit, migrations.RunPython.noop),
+    ]
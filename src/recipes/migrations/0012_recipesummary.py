@@ -0,0 +1,61 @@
+# Generated by Django 5.2.8 on 2026-10-18 12:21
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_summaries(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    RecipeSummary = apps.get_model('recipes', 'RecipeSummary')
+    priciest = (
+        RecipeIngredient.objects.filter(recipe=OuterRef('pk'))
+        .order_by('-ingredient__price', 'ingredient__name', 'pk')
+        .values('ingredient_id')[:1]
+    )
+    rows = Recipe.objects.order_by().annotate(
+        summary_calories=Coalesce(Sum('recipe_ingredients__ingredient__calories'), Value(0)),
+        summary_cost=Coalesce(
+            Sum('recipe_ingredients__ingredient__price'), Value(Decimal('0.00')),
+            output_field=models.DecimalField(max_digits=10, decimal_places=2),
+        ),
+        summary_count=Count('recipe_ingredients'),
+        summary_priciest=Subquery(priciest),
+    ).values_list('pk', 'summary_calories', 'summary_cost', 'summary_count', 'summary_priciest')
+    RecipeSummary.objects.bulk_create(
+        [
+            RecipeSummary(
+                recipe_id=pk, total_calories=calories, total_cost=cost,
+                ingredient_count=count, priciest_ingredient_id=priciest_id,
+            )
+            for pk, calories, cost, count, priciest_id in rows
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_recipeingredient_amount_unit'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeSummary',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to='recipes.recipe')),
+                ('total_calories', models.IntegerField(default=0)),
+                ('total_cost', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=10)),
+                ('ingredient_count', models.PositiveIntegerField(default=0)),
+                ('priciest_ingredient', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='recipes.ingredient')),
+            ],
+            options={
+                'verbose_name_plural': 'recipe summaries',
+            },
+        ),
+        migrations.RunPython(backfill_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 12:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_recipesummary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='pic_variants',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
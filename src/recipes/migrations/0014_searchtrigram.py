@@ -0,0 +1,46 @@
+# Generated by Django 5.2.8 on 2026-10-18 12:50
+
+import re
+
+from django.db import migrations, models
+
+
+def backfill_trigrams(apps, schema_editor):
+    # Same rules as recipes.fuzzy.words_of() and trigrams()
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    SearchTrigram = apps.get_model('recipes', 'SearchTrigram')
+    words = set()
+    for model in (Recipe, Ingredient):
+        for name in model.objects.values_list('name', flat=True).iterator(chunk_size=10000):
+            for word in re.findall(r'\w+', name):
+                if 3 <= len(word) <= 100 and not word.isdigit():
+                    words.add(word.lower())
+    rows = []
+    for word in words:
+        padded = f'  {word} '
+        for trigram in {padded[i:i + 3] for i in range(len(padded) - 2)}:
+            rows.append(SearchTrigram(trigram=trigram, word=word))
+    SearchTrigram.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_recipe_pic_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchTrigram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trigram', models.CharField(max_length=3)),
+                ('word', models.CharField(db_index=True, max_length=100)),
+            ],
+            options={
+                'unique_together': {('trigram', 'word')},
+            },
+        ),
+        migrations.RunPython(backfill_trigrams, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.8 on 2026-10-18 12:55
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0014_searchtrigram'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='difficulty_level',
+            field=models.GeneratedField(db_persist=True, expression=models.Case(models.When(cooking_time__lt=30, ingredient_count__lte=5, then=models.Value('Easy')), models.When(cooking_time__lt=30, then=models.Value('Medium')), models.When(ingredient_count__lte=5, then=models.Value('Intermediate')), default=models.Value('Hard'), output_field=models.CharField()), output_field=models.CharField(max_length=12)),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['difficulty_level', 'cooking_time', 'ingredient_count'], name='recipe_facets_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['difficulty_level'], name='recipe_difficulty_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['cooking_time'], name='recipe_cooking_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['ingredient_count'], name='recipe_ingredient_count_idx'),
+        ),
+    ]
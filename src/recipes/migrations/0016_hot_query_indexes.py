@@ -0,0 +1,47 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:01
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0015_recipe_difficulty_level'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='recipe',
+            name='recipe_facets_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='recipe',
+            name='recipe_cooking_time_idx',
+        ),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(fields=['name', 'supplier'], name='ingredient_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(fields=['supplier'], name='ingredient_supplier_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['name'], name='recipe_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['cooking_time', 'ingredient_count'], name='recipe_time_ingredients_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipesummary',
+            index=models.Index(fields=['total_calories'], name='summary_calories_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipesummary',
+            index=models.Index(fields=['total_cost'], name='summary_cost_idx'),
+        ),
+    ]
@@ -1,9 +1,104 @@
+from decimal import Decimal
+
 from django.db import models
+from django.db.models import Case, Count, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User
 from django.shortcuts import reverse
 
+from .page_cache import bump_catalog_version
+from .quantities import parse_quantity
+from .thumbnails import picture_context, safe_build_variants
+
 # Create your models here.
 
+# Thresholds shared by Recipe.difficulty and the SQL difficulty column
+QUICK_COOKING_TIME = 30
+FEW_INGREDIENTS = 5
+DIFFICULTY_LEVELS = ('Easy', 'Medium', 'Intermediate', 'Hard')
+
+
+def difficulty_of(cooking_time, ingredient_count):
+    """Difficulty of a recipe from its cooking time and number of ingredients"""
+    if cooking_time < QUICK_COOKING_TIME and ingredient_count <= FEW_INGREDIENTS:
+        return 'Easy'
+    elif cooking_time < QUICK_COOKING_TIME and ingredient_count > FEW_INGREDIENTS:
+        return 'Medium'
+    elif cooking_time >= QUICK_COOKING_TIME and ingredient_count <= FEW_INGREDIENTS:
+        return 'Intermediate'
+    else:
+        return 'Hard'
+
+
+def difficulty_expression():
+    """SQL version of Recipe.difficulty, based on the stored ingredient_count"""
+    return Case(
+        When(cooking_time__lt=QUICK_COOKING_TIME, ingredient_count__lte=FEW_INGREDIENTS, then=Value('Easy')),
+        When(cooking_time__lt=QUICK_COOKING_TIME, then=Value('Medium')),
+        When(ingredient_count__lte=FEW_INGREDIENTS, then=Value('Intermediate')),
+        default=Value('Hard'),
+        output_field=models.CharField(),
+    )
+
+
+class RecipeQuerySet(models.QuerySet):
+    def with_difficulty(self):
+        """Annotate each recipe with its difficulty as `difficulty_label`"""
+        return self.annotate(difficulty_label=F('difficulty_level'))
+
+    def refresh_ingredient_count(self):
+        """
+        Recompute the stored ingredient_count of every recipe in the queryset
+        with a single UPDATE. Use after bulk operations that skip signals
+        (bulk_create, QuerySet.update, raw SQL).
+        """
+        link_count = (
+            RecipeIngredient.objects.filter(recipe=OuterRef('pk'))
+            .order_by()
+            .values('recipe')
+            .annotate(total=Count('pk'))
+            .values('total')
+        )
+        return self.update(ingredient_count=Coalesce(Subquery(link_count), Value(0)))
+
+    def refresh_summaries(self, batch_size=500):
+        """
+        Recompute the RecipeSummary row of every recipe in the queryset.
+        The totals come from a single aggregate query and are written back
+        with batched upserts. Returns the number of summaries written.
+        """
+        priciest = (
+            RecipeIngredient.objects.filter(recipe=OuterRef('pk'))
+            .order_by('-ingredient__price', 'ingredient__name', 'pk')
+            .values('ingredient_id')[:1]
+        )
+        cost_field = RecipeSummary._meta.get_field('total_cost')
+        rows = self.order_by().annotate(
+            summary_calories=Coalesce(Sum('recipe_ingredients__ingredient__calories'), Value(0)),
+            summary_cost=Coalesce(
+                Sum('recipe_ingredients__ingredient__price'), Value(cost_field.default),
+                output_field=cost_field,
+            ),
+            summary_count=Count('recipe_ingredients'),
+            summary_priciest=Subquery(priciest),
+        ).values_list('pk', 'summary_calories', 'summary_cost', 'summary_count', 'summary_priciest')
+        summaries = [
+            RecipeSummary(
+                recipe_id=pk, total_calories=calories, total_cost=cost,
+                ingredient_count=count, priciest_ingredient_id=priciest_id,
+            )
+            for pk, calories, cost, count, priciest_id in rows
+        ]
+        RecipeSummary.objects.bulk_create(
+            summaries,
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=['recipe'],
+            update_fields=['total_calories', 'total_cost', 'ingredient_count', 'priciest_ingredient'],
+        )
+        return len(summaries)
+
+
 class Recipe(models.Model):
     name = models.CharField(max_length=200)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -12,18 +107,63 @@ class Recipe(models.Model):
     ingredients = models.ManyToManyField('Ingredient', through='RecipeIngredient', related_name='recipes')
     instructions = models.TextField()   
     pic = models.ImageField(upload_to='recipe_pics', default='no_picture.jpg')
+    # Resized copies of pic, see recipes.thumbnails
+    pic_variants = models.JSONField(default=dict, blank=True, editable=False)
+    # Denormalized number of RecipeIngredient rows, kept current by recipes.signals
+    ingredient_count = models.PositiveIntegerField(default=0, editable=False)
+    # Recipe.difficulty computed by the database, so it can be filtered,
+    # counted and indexed; the database recomputes it whenever cooking_time
+    # or ingredient_count change
+    difficulty_level = models.GeneratedField(
+        expression=difficulty_expression(),
+        output_field=models.CharField(max_length=12),
+        db_persist=True,
+    )
+
+    objects = RecipeQuerySet.as_manager()
+
+    class Meta:
+        # Checked against the hot queries by `manage.py audit_query_plans`
+        indexes = [
+            # Admin changelist sorted by name
+            models.Index(fields=['name'], name='recipe_name_idx'),
+            # Home facets (see recipes.facets). The single-column indexes keep
+            # the rows matching one value in id order, for keyset pagination;
+            # the facet counts query reads the composite one and nothing else
+            models.Index(fields=['difficulty_level'], name='recipe_difficulty_idx'),
+            models.Index(fields=['cooking_time', 'ingredient_count'], name='recipe_time_ingredients_idx'),
+            models.Index(fields=['ingredient_count'], name='recipe_ingredient_count_idx'),
+        ]
+
     @property
     def difficulty(self):
         """Calculate difficulty based on cooking time and number of ingredients"""
-        ingredient_count = self.ingredients.count()
-        if self.cooking_time < 30 and ingredient_count <= 5:
-            return 'Easy'
-        elif self.cooking_time < 30 and ingredient_count > 5:
-            return 'Medium'
-        elif self.cooking_time >= 30 and ingredient_count <= 5:
-            return 'Intermediate'
-        else:
-            return 'Hard'
+        return difficulty_of(self.cooking_time, self.ingredient_count)
+
+    def save(self, *args, **kwargs):
+        # A newly uploaded photo is only written to storage by super().save()
+        uploaded = bool(self.pic) and not self.pic._committed
+        super().save(*args, **kwargs)
+        if uploaded:
+            self.pic_variants = safe_build_variants(self.pic)
+            Recipe.objects.filter(pk=self.pk).update(pic_variants=self.pic_variants)
+            # post_save bumped the version before the variants existed
+            bump_catalog_version()
+
+    @property
+    def picture(self):
+        """Context for the recipes/picture.html include"""
+        return picture_context(self.pic, self.pic_variants)
+
+    def refresh_ingredient_count(self):
+        """Recount this recipe's ingredients in the database and reload the field"""
+        Recipe.objects.filter(pk=self.pk).refresh_ingredient_count()
+        self.refresh_from_db(fields=['ingredient_count'])
+
+    def refresh_summary(self):
+        """Recompute this recipe's RecipeSummary row"""
+        Recipe.objects.filter(pk=self.pk).refresh_summaries()
+
     def get_absolute_url(self):
         return reverse('recipes:detail', kwargs={'id': self.pk})
     
@@ -35,6 +175,14 @@ class Ingredient(models.Model):
     calories  = models.IntegerField()
     price = models.DecimalField(max_digits=5, decimal_places=2)
     supplier = models.CharField(max_length=255)
+
+    class Meta:
+        # Admin changelist ordered by name (then supplier, as ingredients
+        # are told apart by both) and filtered by supplier
+        indexes = [
+            models.Index(fields=['name', 'supplier'], name='ingredient_name_idx'),
+            models.Index(fields=['supplier'], name='ingredient_supplier_idx'),
+        ]
     
     def get_absolute_url(self):
         return reverse('ingredients:detail', kwargs={'id': self.pk})
@@ -47,9 +195,64 @@ class RecipeIngredient(models.Model):
     recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE, related_name='recipe_ingredients')
     ingredient = models.ForeignKey(Ingredient, on_delete=models.CASCADE, related_name='ingredient_recipes')
     quantity = models.CharField(max_length=100, help_text='e.g., 2 cups, 1 tbsp, 3 pieces')
+    # Parsed from quantity on save (see recipes.quantities); amount is None
+    # when the text has no leading number, e.g. "a pinch"
+    amount = models.FloatField(null=True, blank=True, editable=False)
+    unit = models.CharField(max_length=20, blank=True, editable=False)
 
     class Meta:
         unique_together = ('recipe', 'ingredient')
 
+    def save(self, *args, **kwargs):
+        self.amount, self.unit = parse_quantity(self.quantity)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'quantity' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'amount', 'unit'}
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.ingredient.name} for {self.recipe.name} ({self.quantity})"
+
+class RecipeSummary(models.Model):
+    """
+    Per-recipe totals over its ingredients, stored so listings can show and
+    sort by them without loading any RecipeIngredient rows. Kept current by
+    recipes.signals; rebuild with `manage.py rebuild_recipe_summaries`.
+    Totals add up the calories and price of each ingredient as listed, the
+    same figures shown in the recipe's ingredient table.
+    """
+    recipe = models.OneToOneField(Recipe, on_delete=models.CASCADE, primary_key=True, related_name='summary')
+    total_calories = models.IntegerField(default=0)
+    total_cost = models.DecimalField(max_digits=10, decimal_places=2, default=Decimal('0.00'))
+    ingredient_count = models.PositiveIntegerField(default=0)
+    priciest_ingredient = models.ForeignKey(
+        Ingredient, on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )
+
+    class Meta:
+        verbose_name_plural = 'recipe summaries'
+        # Home sorted by calories or cost reads recipes in this order
+        indexes = [
+            models.Index(fields=['total_calories'], name='summary_calories_idx'),
+            models.Index(fields=['total_cost'], name='summary_cost_idx'),
+        ]
+
+    def __str__(self):
+        return f"Summary of {self.recipe_id}"
+
+
+class SearchTrigram(models.Model):
+    """
+    One trigram of one word used in recipe or ingredient names: the side
+    table behind typo-tolerant search (see recipes.fuzzy). Kept current by
+    recipes.signals; rebuild with `manage.py rebuild_search_index`.
+    """
+    trigram = models.CharField(max_length=3)
+    word = models.CharField(max_length=100, db_index=True)
+
+    class Meta:
+        # Also the index candidate lookups read (trigram -> words)
+        unique_together = ('trigram', 'word')
+
     def __str__(self):
-        return f"{self.ingredient.name} for {self.recipe.name} ({self.quantity})"
\ No newline at end of file
+        return f"{self.trigram!r} in {self.word}"
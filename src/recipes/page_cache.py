@@ -0,0 +1,156 @@
+"""
+Cached Home page grids, recipe cards and search suggestions.
+
+Everything cached here is keyed by the catalog version, a number that
+recipes.signals bumps whenever a recipe, an ingredient or an ingredient link
+is saved or deleted. Old entries are never deleted one by one: after a bump
+nothing looks them up any more, and they expire or are evicted by the cache
+backend. The time of the last bump is kept next to the version and used as
+the Last-Modified date of Home pages.
+
+The entries themselves live in the default cache, which may be private to
+each worker. The version does not: it is kept in the CATALOG_VERSION_CACHE
+cache, which every worker must share for a change made in one of them to
+reach the others (and for all of them to hand out the same ETag and
+Last-Modified date). `manage.py check` fails when that cache is per process.
+"""
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.core import checks
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+
+VERSION_KEY = 'catalog:version'
+MODIFIED_KEY = 'catalog:modified'
+DEFAULT_TIMEOUT = 300
+
+
+def cache_timeout():
+    return getattr(settings, 'HOME_CACHE_TIMEOUT', DEFAULT_TIMEOUT)
+
+
+def version_cache():
+    """The cache holding the catalog version, shared by all workers"""
+    return caches[getattr(settings, 'CATALOG_VERSION_CACHE', 'default')]
+
+
+def check_version_cache(app_configs=None, **kwargs):
+    """System check: the catalog version must not be kept per process"""
+    alias = getattr(settings, 'CATALOG_VERSION_CACHE', 'default')
+    if alias not in settings.CACHES:
+        return [checks.Error(
+            f'CATALOG_VERSION_CACHE names the cache {alias!r}, which is not in CACHES.',
+            id='recipes.E001',
+        )]
+    if isinstance(caches[alias], (LocMemCache, DummyCache)):
+        return [checks.Error(
+            f'The catalog version is kept in the {alias!r} cache, which is not shared between processes.',
+            hint=(
+                'Point CATALOG_VERSION_CACHE at a FileBasedCache, Redis or Memcached cache; '
+                'otherwise catalog changes made in one worker never invalidate the pages cached by the others.'
+            ),
+            id='recipes.E002',
+        )]
+    return []
+
+
+def catalog_version():
+    """The current catalog version (any change to the catalog changes it)"""
+    shared = version_cache()
+    version = shared.get(VERSION_KEY)
+    if version is None:
+        # Start from the clock, so a cache that was cleared or restarted
+        # never hands out a version that old entries were stored under
+        shared.add(VERSION_KEY, time.time_ns(), timeout=None)
+        version = shared.get(VERSION_KEY)
+    return version
+
+
+def catalog_last_modified():
+    """When the catalog version last changed, as a Unix timestamp"""
+    shared = version_cache()
+    modified = shared.get(MODIFIED_KEY)
+    if modified is None:
+        # Unknown (cleared or evicted), so assume it just changed
+        shared.add(MODIFIED_KEY, int(time.time()), timeout=None)
+        modified = shared.get(MODIFIED_KEY)
+    return modified
+
+
+def _bump():
+    shared = version_cache()
+    # A new value from the clock rather than incr(): on FileBasedCache incr()
+    # is a read then a write, so two workers bumping at once could both
+    # store the same number and one change would go unnoticed
+    version = time.time_ns()
+    previous = shared.get(VERSION_KEY)
+    if previous is not None and version <= previous:
+        version = previous + 1
+    shared.set(VERSION_KEY, version, timeout=None)
+    shared.set(MODIFIED_KEY, int(time.time()), timeout=None)
+
+
+def bump_catalog_version():
+    """
+    Invalidate every cached grid and card. Inside a transaction the version
+    is bumped again on commit, in case another request cached the old data
+    under the new version before the change became visible.
+    """
+    _bump()
+    connection = transaction.get_connection()
+    if connection.in_atomic_block:
+        transaction.on_commit(_bump)
+
+
+def grid_key(version, *parts):
+    """Cache key of one rendered grid page"""
+    digest = hashlib.md5(repr(parts).encode('utf-8')).hexdigest()
+    return f'home:grid:{version}:{digest}'
+
+
+def suggest_key(version, query):
+    """Cache key of the suggestions for one normalized search box prefix"""
+    return f'suggest:{version}:{hashlib.md5(query.encode("utf-8")).hexdigest()}'
+
+
+def facets_key(version, query):
+    """Cache key of the facet groups of the catalog, or of one search's results"""
+    return f'home:facets:{version}:{hashlib.md5((query or "").encode("utf-8")).hexdigest()}'
+
+
+def page_etag(key, user_id):
+    """ETag of a Home page: its grid and the user named in the header"""
+    return '"%s"' % hashlib.md5(f'{key}:{user_id}'.encode('utf-8')).hexdigest()
+
+
+class GridStats:
+    """Grid cache hits and misses of this process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+            }
+
+
+grid_stats = GridStats()
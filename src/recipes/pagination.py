@@ -0,0 +1,119 @@
+"""
+Keyset (cursor) pagination.
+
+Instead of OFFSET, each page remembers the primary key of its first and last
+row and the next page asks for rows after that key. The database walks the
+primary key index straight to the cursor, so every page costs the same no
+matter how deep it is, and no COUNT query is needed. Other sort orders
+work the same way with a (value, primary key) cursor.
+"""
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.http import Http404
+
+
+class KeysetPage:
+    """One page of results, with the cursors to reach its neighbours"""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def _parse_cursor(queryset, field, value):
+    """
+    Cursors are the primary key when ordering by pk, and "<value>~<pk>"
+    when ordering by another field.
+    """
+    if value in (None, ''):
+        return None
+    try:
+        if field == 'pk':
+            return int(value)
+        value, _, pk = value.rpartition('~')
+        if field in queryset.query.annotations:
+            output_field = queryset.query.annotations[field].output_field
+        else:
+            output_field = queryset.model._meta.get_field(field)
+        return output_field.to_python(value), int(pk)
+    except (TypeError, ValueError, ValidationError):
+        raise Http404('Invalid page cursor')
+
+
+def _cursor(row, field):
+    if field == 'pk':
+        return row.pk
+    return f'{getattr(row, field)}~{row.pk}'
+
+
+def _ordering(field, descending):
+    prefix = '-' if descending else ''
+    if field == 'pk':
+        return [f'{prefix}pk']
+    return [f'{prefix}{field}', f'{prefix}pk']
+
+
+def _beyond(field, cursor, descending):
+    """Rows that come after `cursor` in the given direction"""
+    lookup = 'lt' if descending else 'gt'
+    if field == 'pk':
+        return Q(**{f'pk__{lookup}': cursor})
+    value, pk = cursor
+    # (field > value) or (field = value and pk > cursor pk), with the range on
+    # field stated on its own so an index on it can seek straight to value
+    return Q(**{f'{field}__{lookup}e': value}) & (Q(**{f'{field}__{lookup}': value}) | Q(**{f'pk__{lookup}': pk}))
+
+
+def keyset_paginate(queryset, per_page, after=None, before=None, order_by='pk'):
+    """
+    Return the KeysetPage of `queryset` ordered by `order_by`: the primary
+    key by default, or a model field or annotation (prefix with '-' for
+    descending order) with the primary key breaking ties.
+    `after` and `before` are cursors taken from a previous page; pass
+    neither for the first page.
+    """
+    descending = order_by.startswith('-')
+    field = order_by.lstrip('-')
+    after = _parse_cursor(queryset, field, after)
+    before = _parse_cursor(queryset, field, before)
+
+    if before is not None:
+        # Walk backwards from the cursor, then restore the requested order
+        rows = list(
+            queryset.filter(_beyond(field, before, not descending))
+            .order_by(*_ordering(field, not descending))[:per_page + 1]
+        )
+        has_more = len(rows) > per_page
+        rows = rows[:per_page][::-1]
+        has_previous, has_next = has_more, True
+    else:
+        if after is not None:
+            queryset = queryset.filter(_beyond(field, after, descending))
+        rows = list(queryset.order_by(*_ordering(field, descending))[:per_page + 1])
+        has_next = len(rows) > per_page
+        rows = rows[:per_page]
+        has_previous = after is not None
+
+    if not rows:
+        return KeysetPage([])
+    return KeysetPage(
+        rows,
+        next_cursor=_cursor(rows[-1], field) if has_next else None,
+        previous_cursor=_cursor(rows[0], field) if has_previous else None,
+    )
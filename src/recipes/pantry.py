@@ -0,0 +1,253 @@
+"""
+In-memory inverted index for "cook with what I have" searches.
+
+For every ingredient name the index keeps the sorted ids of the recipes that
+use it, as a NumPy int32 array. A query turns the ingredients the user has
+into the names they match, adds one to a per-recipe counter for each posting
+list, and ranks recipes by the share of their ingredients that is covered.
+Names are compared lowercased, so the same ingredient from two suppliers is
+counted once.
+
+The index lives in each process. It is built from RecipeIngredient on first
+use and kept current by recipes.signals; changes made by other processes are
+picked up when it is rebuilt, PANTRY_INDEX_MAX_AGE seconds after it was
+built (None never rebuilds it).
+"""
+import re
+import threading
+import time
+from collections import defaultdict, namedtuple
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from .models import RecipeIngredient
+
+DEFAULT_MAX_AGE = 600
+DEFAULT_LIMIT = 50
+
+# One result: how many of the recipe's `total` ingredients the user has
+PantryMatch = namedtuple('PantryMatch', ['recipe_id', 'matched', 'total', 'coverage'])
+
+_SEPARATOR_RE = re.compile(r'[,;\n]+')
+
+
+def ingredient_key(name):
+    """Index key of an ingredient name: lowercased, single-spaced"""
+    return ' '.join(name.lower().split())
+
+
+def parse_pantry(text):
+    """Split what the user typed ("eggs, flour; milk") into ingredient keys"""
+    keys = (ingredient_key(part) for part in _SEPARATOR_RE.split(text or ''))
+    return list(dict.fromkeys(key for key in keys if key))
+
+
+def _words_match(wanted, key):
+    # "tomato" matches "cherry tomatoes": every word typed starts a word of the name
+    words = key.split()
+    return all(any(word.startswith(part) for word in words) for part in wanted)
+
+
+class PantryIndex:
+    """
+    Posting lists of recipe ids per ingredient name, plus what each recipe
+    is made of so it can be updated one recipe at a time. Safe to share
+    between threads.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.postings = {}
+        self.recipe_keys = {}
+        # Ingredient name as first seen, for display, by key
+        self.labels = {}
+        # Number of distinct ingredient names per recipe, indexed by recipe id
+        self.sizes = None
+        self.built_at = None
+        # Pantry entry -> the names it matches, until a name is added or removed
+        self._matches = {}
+
+    def build(self):
+        """(Re)load the whole index from the database"""
+        import numpy as np
+        recipe_keys = defaultdict(set)
+        labels = {}
+        for recipe_id, name in RecipeIngredient.objects.values_list('recipe_id', 'ingredient__name').iterator(chunk_size=10000):
+            key = ingredient_key(name)
+            recipe_keys[recipe_id].add(key)
+            labels.setdefault(key, name.strip())
+        ids_by_key = defaultdict(list)
+        for recipe_id, keys in recipe_keys.items():
+            for key in keys:
+                ids_by_key[key].append(recipe_id)
+        postings = {key: np.unique(np.array(ids, dtype=np.int32)) for key, ids in ids_by_key.items()}
+        sizes = np.zeros(max(recipe_keys, default=0) + 1, dtype=np.int32)
+        for recipe_id, keys in recipe_keys.items():
+            sizes[recipe_id] = len(keys)
+        with self._lock:
+            self.postings = postings
+            self.recipe_keys = {recipe_id: frozenset(keys) for recipe_id, keys in recipe_keys.items()}
+            self.labels = labels
+            self.sizes = sizes
+            self.built_at = time.monotonic()
+            self._matches = {}
+
+    def _apply(self, changes, labels=None):
+        """Move recipes between posting lists; `changes` maps recipe id -> new key set"""
+        import numpy as np
+        added, removed = defaultdict(list), defaultdict(list)
+        with self._lock:
+            for key, label in (labels or {}).items():
+                self.labels.setdefault(key, label)
+            largest = max(changes, default=0)
+            if largest >= len(self.sizes):
+                self.sizes = np.concatenate([self.sizes, np.zeros(largest + 1 - len(self.sizes), dtype=np.int32)])
+            for recipe_id, keys in changes.items():
+                self.sizes[recipe_id] = len(keys)
+                old = self.recipe_keys.get(recipe_id, frozenset())
+                for key in keys - old:
+                    added[key].append(recipe_id)
+                for key in old - keys:
+                    removed[key].append(recipe_id)
+                if keys:
+                    self.recipe_keys[recipe_id] = frozenset(keys)
+                else:
+                    self.recipe_keys.pop(recipe_id, None)
+            for key in set(added) | set(removed):
+                ids = self.postings.get(key, np.empty(0, dtype=np.int32))
+                if removed.get(key):
+                    ids = np.setdiff1d(ids, np.array(removed[key], dtype=np.int32), assume_unique=True)
+                if added.get(key):
+                    ids = np.union1d(ids, np.array(added[key], dtype=np.int32)).astype(np.int32)
+                if len(ids):
+                    if key not in self.postings:
+                        self._matches = {}
+                    self.postings[key] = ids
+                elif self.postings.pop(key, None) is not None:
+                    self.labels.pop(key, None)
+                    self._matches = {}
+
+    def update_recipes(self, recipe_ids):
+        """Re-read the ingredients of the given recipes"""
+        changes = {recipe_id: set() for recipe_id in recipe_ids}
+        labels = {}
+        rows = RecipeIngredient.objects.filter(recipe_id__in=list(changes)).values_list('recipe_id', 'ingredient__name')
+        for recipe_id, name in rows:
+            key = ingredient_key(name)
+            changes[recipe_id].add(key)
+            labels.setdefault(key, name.strip())
+        self._apply(changes, labels)
+
+    def remove_recipes(self, recipe_ids):
+        self._apply({recipe_id: set() for recipe_id in recipe_ids})
+
+    def matching_keys(self, pantry):
+        """Every indexed ingredient name that one of the pantry entries matches"""
+        keys = set()
+        with self._lock:
+            for entry in pantry:
+                matches = self._matches.get(entry)
+                if matches is None:
+                    words = entry.split()
+                    matches = self._matches[entry] = [key for key in self.postings if _words_match(words, key)]
+                keys.update(matches)
+        return keys
+
+    def popular_names(self, entry, limit):
+        """
+        (name, number of recipes using it) for the ingredient names an entry
+        matches, most used first
+        """
+        keys = self.matching_keys([ingredient_key(entry)]) if entry.strip() else ()
+        with self._lock:
+            counts = [(len(self.postings[key]), key) for key in keys if key in self.postings]
+            counts.sort(key=lambda item: (-item[0], item[1]))
+            return [(self.labels.get(key, key), count) for count, key in counts[:limit]]
+
+    def search(self, pantry, limit=DEFAULT_LIMIT):
+        """
+        Recipes using any of the `pantry` ingredients (keys from
+        parse_pantry), best covered first; ties go to the recipe missing
+        fewer ingredients, then to the lower id.
+        """
+        import numpy as np
+        keys = self.matching_keys(pantry)
+        with self._lock:
+            lists = [self.postings[key] for key in keys if key in self.postings]
+            if not lists:
+                return []
+            # matched[recipe id] = how many of its ingredients the user has
+            matched = np.bincount(np.concatenate(lists), minlength=len(self.sizes))
+            candidates = np.flatnonzero(matched)
+            matched = matched[candidates]
+            totals = self.sizes[candidates]
+        coverage = matched / totals
+        # One sortable integer per candidate: coverage (to a millionth, far
+        # finer than any two fractions of small counts differ), then missing
+        # ingredients, then id. Selecting the top `limit` is then linear.
+        order_key = (
+            ((1_000_000 - np.rint(coverage * 1_000_000).astype(np.int64)) << 42)
+            | (np.minimum(totals - matched, 2047).astype(np.int64) << 31)
+            | candidates.astype(np.int64)
+        )
+        if len(order_key) > limit:
+            top = np.argpartition(order_key, limit - 1)[:limit]
+        else:
+            top = np.arange(len(order_key))
+        top = top[np.argsort(order_key[top])]
+        return [
+            PantryMatch(int(candidates[i]), int(matched[i]), int(totals[i]), float(coverage[i]))
+            for i in top
+        ]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'ingredients': len(self.postings),
+                'recipes': len(self.recipe_keys),
+                'postings': sum(len(ids) for ids in self.postings.values()),
+                'bytes': sum(ids.nbytes for ids in self.postings.values()),
+            }
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_pantry_index():
+    """Return this process's index, building it on first use or when too old"""
+    global _index
+    max_age = getattr(settings, 'PANTRY_INDEX_MAX_AGE', DEFAULT_MAX_AGE)
+    index = _index
+    if index is None or (max_age is not None and time.monotonic() - index.built_at > max_age):
+        with _index_lock:
+            if _index is index:
+                index = PantryIndex()
+                index.build()
+                _index = index
+            index = _index
+    return index
+
+
+def update_pantry_index(recipe_ids):
+    """Re-read the given recipes into the index, if this process has one"""
+    if _index is not None:
+        _index.update_recipes(recipe_ids)
+
+
+def remove_from_pantry_index(recipe_ids):
+    if _index is not None:
+        _index.remove_recipes(recipe_ids)
+
+
+def reset_pantry_index():
+    global _index
+    _index = None
+
+
+@receiver(setting_changed)
+def reset_on_setting_change(setting, **kwargs):
+    if setting == 'PANTRY_INDEX_MAX_AGE':
+        reset_pantry_index()
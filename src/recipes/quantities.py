@@ -0,0 +1,162 @@
+"""
+Parse free-text ingredient quantities such as "2 cups", "1 1/2 tbsp",
+"½ tsp" or "2-3 cloves" into a number and a normalized unit.
+
+parse_quantity() handles one string and is used when a RecipeIngredient is
+saved. parse_quantity_batch() gives the same results for many strings at
+once using pandas string operations, for backfills and bulk imports.
+
+Ranges ("2-3", "2 to 3") are stored as their midpoint. Strings without a
+leading number ("a pinch", "to taste") have no amount, and words that are
+not known units ("2 large eggs") give an empty unit. The number has to come
+first: "about 2 cups" has no amount, where the charts used to take the
+first number found anywhere in the text. Digits from other scripts ("٣")
+are read as their ASCII equivalents.
+
+Migration 0011 backfilled existing rows with its own frozen copy of
+parse_quantity_batch(); changes here only apply to rows saved afterwards.
+"""
+import re
+from fractions import Fraction
+
+# Unicode vulgar fractions, rewritten as " n/d" before parsing
+VULGAR_FRACTIONS = {
+    '½': '1/2', '⅓': '1/3', '⅔': '2/3', '¼': '1/4', '¾': '3/4',
+    '⅕': '1/5', '⅖': '2/5', '⅗': '3/5', '⅘': '4/5', '⅙': '1/6',
+    '⅚': '5/6', '⅛': '1/8', '⅜': '3/8', '⅝': '5/8', '⅞': '7/8',
+}
+
+# Spellings of each unit, matched after lowercasing (except CASE_SENSITIVE_UNITS)
+UNIT_ALIASES = {
+    'cup': ('c', 'cup', 'cups'),
+    'tbsp': ('tbsp', 'tbsps', 'tbs', 'tbl', 'tablespoon', 'tablespoons'),
+    'tsp': ('tsp', 'tsps', 'teaspoon', 'teaspoons'),
+    'g': ('g', 'gr', 'gram', 'grams', 'gramme', 'grammes'),
+    'kg': ('kg', 'kgs', 'kilo', 'kilos', 'kilogram', 'kilograms'),
+    'mg': ('mg', 'milligram', 'milligrams'),
+    'ml': ('ml', 'millilitre', 'millilitres', 'milliliter', 'milliliters'),
+    'l': ('l', 'litre', 'litres', 'liter', 'liters'),
+    'oz': ('oz', 'ounce', 'ounces'),
+    'fl oz': ('floz',),
+    'lb': ('lb', 'lbs', 'pound', 'pounds'),
+    'pinch': ('pinch', 'pinches'),
+    'dash': ('dash', 'dashes'),
+    'piece': ('pc', 'pcs', 'piece', 'pieces'),
+    'clove': ('clove', 'cloves'),
+    'slice': ('slice', 'slices'),
+    'can': ('can', 'cans', 'tin', 'tins'),
+    'stick': ('stick', 'sticks'),
+    'bunch': ('bunch', 'bunches'),
+    'package': ('pkg', 'package', 'packages', 'packet', 'packets'),
+    'scoop': ('scoop', 'scoops'),
+}
+# Cookbook shorthand where case matters: T = tablespoon, t = teaspoon
+CASE_SENSITIVE_UNITS = {'T': 'tbsp', 't': 'tsp'}
+
+_UNIT_LOOKUP = {alias: unit for unit, aliases in UNIT_ALIASES.items() for alias in aliases}
+
+_NUMBER = r'\d+\s+\d+/\d+|\d+/\d+|\d*\.\d+|\d+'
+QUANTITY_RE = re.compile(
+    rf'^\s*(?P<low>{_NUMBER})'
+    rf'(?:\s*(?:-|–|to)\s*(?P<high>{_NUMBER}))?'
+    r'\s*(?P<unit>[^\W\d_]+(?:\s?[^\W\d_]+)?)?'
+)
+# Digits other than 0-9; pandas' to_numeric() does not read them
+_OTHER_DIGIT_RE = re.compile(r'(?![0-9])\d')
+# Pieces of one number: optional whole part, then a fraction or a decimal
+NUMBER_PARTS_RE = re.compile(r'^(?:(?P<whole>\d+)\s+)?(?:(?P<num>\d+)/(?P<den>\d+)|(?P<value>\d*\.\d+|\d+))$')
+
+
+def normalize_text(text):
+    """
+    Rewrite vulgar fractions so "1½" and "½" read as "1 1/2" and " 1/2",
+    and other scripts' digits as 0-9
+    """
+    text = str(text or '')
+    for char, fraction in VULGAR_FRACTIONS.items():
+        text = text.replace(char, f' {fraction}')
+    return _OTHER_DIGIT_RE.sub(_ascii_digit, text)
+
+
+def _ascii_digit(match):
+    return str(int(match.group()))
+
+
+def normalize_unit(word):
+    """Map a unit spelling to its canonical name, or '' if it is not a unit"""
+    if not word:
+        return ''
+    if word in CASE_SENSITIVE_UNITS:
+        return CASE_SENSITIVE_UNITS[word]
+    word = word.lower().rstrip('.').replace(' ', '')
+    return _UNIT_LOOKUP.get(word, '')
+
+
+def parse_number(text):
+    """Value of "2", "1.5", ".5", "3/4" or "1 1/2"; None for "1/0" """
+    match = NUMBER_PARTS_RE.match(text.strip())
+    if not match:
+        return None
+    if match.group('value') is not None:
+        return float(match.group('value'))
+    if int(match.group('den')) == 0:
+        return None
+    value = Fraction(int(match.group('num')), int(match.group('den')))
+    if match.group('whole'):
+        value += int(match.group('whole'))
+    return float(value)
+
+
+def parse_quantity(text):
+    """Return (amount, unit) for one quantity string; amount may be None"""
+    match = QUANTITY_RE.match(normalize_text(text))
+    if not match:
+        return None, ''
+    amount = parse_number(match.group('low'))
+    if match.group('high') is not None:
+        high = parse_number(match.group('high'))
+        amount = None if amount is None or high is None else (amount + high) / 2
+    unit = _parse_unit(match.group('unit'))
+    return amount, unit
+
+
+def _parse_unit(words):
+    # "fl oz" is the only two-word unit; otherwise only the first word counts
+    if not words:
+        return ''
+    if normalize_unit(words):
+        return normalize_unit(words)
+    return normalize_unit(words.split()[0])
+
+
+def _number_series(texts):
+    import numpy as np
+    import pandas as pd
+    parts = texts.str.strip().str.extract(NUMBER_PARTS_RE)
+    value = pd.to_numeric(parts['value'], errors='coerce')
+    num = pd.to_numeric(parts['num'], errors='coerce')
+    den = pd.to_numeric(parts['den'], errors='coerce').replace(0, np.nan)
+    whole = pd.to_numeric(parts['whole'], errors='coerce').fillna(0)
+    return value.fillna(whole + num / den)
+
+
+def parse_quantity_batch(texts):
+    """
+    Parse many quantity strings at once.
+    Returns two lists, amounts (float or None) and units, in input order.
+    """
+    import pandas as pd
+    texts = pd.Series(list(texts), dtype=object).fillna('').astype(str)
+    if texts.empty:
+        return [], []
+    for char, fraction in VULGAR_FRACTIONS.items():
+        texts = texts.str.replace(char, f' {fraction}', regex=False)
+    texts = texts.str.replace(_OTHER_DIGIT_RE, _ascii_digit, regex=True)
+    parts = texts.str.extract(QUANTITY_RE)
+    low = _number_series(parts['low'])
+    high = _number_series(parts['high'])
+    amount = low.where(parts['high'].isna(), (low + high) / 2)
+    # Each distinct unit spelling is looked up once
+    units = parts['unit'].map(_parse_unit, na_action='ignore').fillna('')
+    amounts = [None if pd.isna(value) else float(value) for value in amount]
+    return amounts, units.tolist()
@@ -0,0 +1,102 @@
+"""
+Bounded worker pool for chart rendering.
+
+Rendering a chart is CPU-bound and can be slow, so it runs in a small pool
+instead of directly in the web worker. The pool limits how many renders run
+at once (CHART_RENDER_WORKERS) and how many may wait for a free worker
+(CHART_RENDER_QUEUE). Callers wait at most CHART_RENDER_TIMEOUT seconds and
+then get a ChartRenderError, so a slow chart never holds a request forever.
+Set CHART_RENDER_EXECUTOR to 'process' to render in separate processes.
+"""
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+DEFAULT_WORKERS = 2
+DEFAULT_QUEUE = 8
+DEFAULT_TIMEOUT = 5.0
+
+
+class ChartRenderError(Exception):
+    """The chart could not be rendered in time"""
+
+
+class ChartRenderBusy(ChartRenderError):
+    """Too many renders are already running or waiting"""
+
+
+class ChartRenderTimeout(ChartRenderError):
+    """The render did not finish before the deadline"""
+
+
+class RenderPool:
+
+    def __init__(self, workers=DEFAULT_WORKERS, queue=DEFAULT_QUEUE, timeout=DEFAULT_TIMEOUT, executor='thread'):
+        if executor == 'process':
+            self._executor = ProcessPoolExecutor(max_workers=workers)
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='chart-render')
+        self.timeout = timeout
+        # Slots for renders that are running or waiting for a worker
+        self._slots = threading.BoundedSemaphore(workers + queue)
+
+    def render(self, fn, *args, on_late_result=None, **kwargs):
+        """
+        Run fn(*args, **kwargs) in the pool and return its result.
+        Raise ChartRenderBusy if the pool is full and ChartRenderTimeout if
+        the result is not ready in time. A render that misses the deadline
+        keeps running; its result is passed to on_late_result (if given) so
+        it can still be cached for the next request.
+        """
+        if not self._slots.acquire(blocking=False):
+            raise ChartRenderBusy('Chart render pool is full')
+        try:
+            future = self._executor.submit(fn, *args, **kwargs)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            if not future.cancel() and on_late_result is not None:
+                future.add_done_callback(lambda done: _deliver_late(done, on_late_result))
+            raise ChartRenderTimeout(f'Chart render took longer than {self.timeout}s')
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _deliver_late(future, callback):
+    if not future.cancelled() and future.exception() is None:
+        callback(future.result())
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_render_pool():
+    """Return the process-wide render pool configured from settings"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = RenderPool(
+                workers=getattr(settings, 'CHART_RENDER_WORKERS', DEFAULT_WORKERS),
+                queue=getattr(settings, 'CHART_RENDER_QUEUE', DEFAULT_QUEUE),
+                timeout=getattr(settings, 'CHART_RENDER_TIMEOUT', DEFAULT_TIMEOUT),
+                executor=getattr(settings, 'CHART_RENDER_EXECUTOR', 'thread'),
+            )
+        return _pool
+
+
+@receiver(setting_changed)
+def reset_render_pool(setting, **kwargs):
+    global _pool
+    if setting.startswith('CHART_RENDER_') and _pool is not None:
+        _pool.shutdown()
+        _pool = None
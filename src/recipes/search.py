@@ -0,0 +1,213 @@
+"""
+Full-text search over recipes.
+
+Search goes through a backend object so each database can use the best
+index it has. On SQLite the catalog is mirrored into an FTS5 table and
+ranked with BM25; other databases fall back to plain substring filters.
+Pick a backend with the RECIPE_SEARCH_BACKEND setting (a dotted path), or
+leave it unset to choose one from the database vendor.
+"""
+import re
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils.html import escape
+from django.utils.module_loading import import_string
+from django.utils.safestring import mark_safe
+
+from .models import Recipe
+
+# One search result: the recipe id, its score (lower is better) and an
+# HTML snippet with the matched words wrapped in <mark> (or None)
+SearchHit = namedtuple('SearchHit', ['recipe_id', 'rank', 'snippet'])
+
+DEFAULT_LIMIT = 50
+
+# Characters that never appear in recipe text, used to mark matches in
+# snippets before the text is HTML-escaped
+_MARK_START = '\x02'
+_MARK_END = '\x03'
+
+_TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def search_terms(query):
+    """Split a user query into plain words, dropping any search syntax"""
+    return _TERM_RE.findall(query or '')
+
+
+def normalize_query(query):
+    """
+    The words of a query, lowercased and single-spaced. Every backend
+    searches by these words without regard to case, so queries with the
+    same normal form have the same results (and share a cache entry).
+    """
+    return ' '.join(search_terms(query)).lower()
+
+
+def _highlight(text):
+    text = escape(text).replace(_MARK_START, '<mark>').replace(_MARK_END, '</mark>')
+    return mark_safe(text)
+
+
+def _chunks(ids, size=500):
+    # Stay well below SQLite's limit on query parameters
+    ids = list(ids)
+    for start in range(0, len(ids), size):
+        yield ids[start:start + size]
+
+
+class SearchBackend:
+    """
+    Interface every search backend implements.
+    The index_* methods are called from recipes.signals whenever the
+    indexed data changes; backends without an index can ignore them.
+    """
+
+    def install(self):
+        """
+        Create the index storage if it does not exist yet.
+        Return True when it was created, so the caller can fill it.
+        """
+        return False
+
+    def search(self, query, limit=DEFAULT_LIMIT):
+        """Return a list of SearchHit, best match first"""
+        raise NotImplementedError
+
+    def index_recipes(self, recipe_ids):
+        """(Re)index the given recipes"""
+
+    def remove_recipes(self, recipe_ids):
+        """Drop the given recipes from the index"""
+
+    def rebuild(self):
+        """Rebuild the whole index and return the number of indexed recipes"""
+        return Recipe.objects.count()
+
+
+class SimpleSearchBackend(SearchBackend):
+    """
+    Unindexed fallback that works on every database.
+    Matches recipes containing all query words in any indexed field.
+    """
+
+    def search(self, query, limit=DEFAULT_LIMIT):
+        terms = search_terms(query)
+        if not terms:
+            return []
+        queryset = Recipe.objects.all()
+        for term in terms:
+            queryset = queryset.filter(
+                Q(name__icontains=term)
+                | Q(description__icontains=term)
+                | Q(instructions__icontains=term)
+                | Q(ingredients__name__icontains=term)
+            )
+        recipe_ids = queryset.order_by('name', 'pk').values_list('pk', flat=True).distinct()[:limit]
+        return [SearchHit(pk, position, None) for position, pk in enumerate(recipe_ids)]
+
+
+class SQLiteFTSBackend(SearchBackend):
+    """
+    FTS5 index stored in its own virtual table, one row per recipe
+    (rowid = recipe id). Ingredient names are flattened into one column.
+    """
+
+    table = 'recipes_recipe_fts'
+    # BM25 column weights: name, description, instructions, ingredients
+    weights = (10.0, 2.0, 1.0, 5.0)
+    snippet_tokens = 12
+
+    def install(self):
+        if self.table in connection.introspection.table_names():
+            return False
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE {self.table} USING fts5("
+                "name, description, instructions, ingredients, "
+                "tokenize='porter unicode61 remove_diacritics 2')"
+            )
+        return True
+
+    def _insert_sql(self, where):
+        return (
+            f"INSERT INTO {self.table} (rowid, name, description, instructions, ingredients) "
+            "SELECT r.id, r.name, r.description, r.instructions, "
+            "COALESCE((SELECT group_concat(i.name, ' ') "
+            "FROM recipes_recipeingredient ri "
+            "JOIN recipes_ingredient i ON i.id = ri.ingredient_id "
+            "WHERE ri.recipe_id = r.id), '') "
+            f"FROM recipes_recipe r {where}"
+        )
+
+    def index_recipes(self, recipe_ids):
+        with connection.cursor() as cursor:
+            for chunk in _chunks(recipe_ids):
+                placeholders = ', '.join(['%s'] * len(chunk))
+                cursor.execute(f"DELETE FROM {self.table} WHERE rowid IN ({placeholders})", chunk)
+                cursor.execute(self._insert_sql(f"WHERE r.id IN ({placeholders})"), chunk)
+
+    def remove_recipes(self, recipe_ids):
+        with connection.cursor() as cursor:
+            for chunk in _chunks(recipe_ids):
+                placeholders = ', '.join(['%s'] * len(chunk))
+                cursor.execute(f"DELETE FROM {self.table} WHERE rowid IN ({placeholders})", chunk)
+
+    def rebuild(self):
+        self.install()
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table}")
+            cursor.execute(self._insert_sql(''))
+            cursor.execute(f"INSERT INTO {self.table} ({self.table}) VALUES ('optimize')")
+            cursor.execute(f"SELECT count(*) FROM {self.table}")
+            return cursor.fetchone()[0]
+
+    def match_expression(self, query):
+        """
+        Build an FTS5 query from user input. Every word is quoted so FTS
+        operators in the input are taken literally, and matched as a prefix
+        so partially typed words still find results.
+        """
+        terms = search_terms(query)
+        return ' '.join(f'"{term}"*' for term in terms)
+
+    def search(self, query, limit=DEFAULT_LIMIT):
+        match = self.match_expression(query)
+        if not match:
+            return []
+        weights = ', '.join(str(weight) for weight in self.weights)
+        sql = (
+            f"SELECT rowid, bm25({self.table}, {weights}) AS score, "
+            f"snippet({self.table}, -1, %s, %s, '…', {self.snippet_tokens}) "
+            f"FROM {self.table} WHERE {self.table} MATCH %s "
+            "ORDER BY score, rowid LIMIT %s"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [_MARK_START, _MARK_END, match, limit])
+            rows = cursor.fetchall()
+        return [SearchHit(pk, score, _highlight(snippet)) for pk, score, snippet in rows]
+
+
+_backend = None
+
+
+def get_backend():
+    """Return the configured search backend (created once per process)"""
+    global _backend
+    if _backend is None:
+        path = getattr(settings, 'RECIPE_SEARCH_BACKEND', None)
+        if path:
+            _backend = import_string(path)()
+        elif connection.vendor == 'sqlite':
+            _backend = SQLiteFTSBackend()
+        else:
+            _backend = SimpleSearchBackend()
+    return _backend
+
+
+def search_recipes(query, limit=DEFAULT_LIMIT):
+    """Search the catalog with the configured backend"""
+    return get_backend().search(query, limit=limit)
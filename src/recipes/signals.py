@@ -0,0 +1,218 @@
+import threading
+from contextlib import contextmanager
+
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .models import Ingredient, Recipe, RecipeIngredient
+from .search import get_backend
+from .chart_cache import get_chart_cache
+from .fuzzy import index_name_words, index_recipe_words, rebuild_search_words
+from .page_cache import bump_catalog_version
+from .pantry import remove_from_pantry_index, reset_pantry_index, update_pantry_index
+from .typeahead import (
+    remove_from_typeahead_index, reset_typeahead_index, update_typeahead_index, update_typeahead_recipes,
+)
+
+
+# ============================================
+# BULK CHANGES
+# ============================================
+# bulk_create() and QuerySet.update() skip these handlers anyway. For bulk
+# deletes, which still send a signal per row, suspend_handlers() turns them
+# off. Either way, call refresh_recipes() once the bulk change is done.
+
+_state = threading.local()
+
+
+def handlers_suspended():
+    return getattr(_state, 'suspended', False)
+
+
+@contextmanager
+def suspend_handlers():
+    """Skip the handlers below in this thread while the block runs"""
+    previous = handlers_suspended()
+    _state.suspended = True
+    try:
+        yield
+    finally:
+        _state.suspended = previous
+
+
+def refresh_recipes(recipe_ids=None):
+    """
+    Recompute everything derived from recipes and their ingredient links:
+    ingredient_count, summaries, the search, pantry and typeahead indexes,
+    the words known to typo-tolerant search, cached charts and cached Home
+    pages. Pass the ids that changed, or None to refresh every recipe.
+    Words no name uses any more are only dropped by a full refresh.
+    """
+    if recipe_ids is None:
+        Recipe.objects.refresh_ingredient_count()
+        Recipe.objects.refresh_summaries()
+        get_backend().rebuild()
+        rebuild_search_words()
+        get_chart_cache().clear()
+        reset_pantry_index()
+        reset_typeahead_index()
+        bump_catalog_version()
+        return
+    recipe_ids = list(recipe_ids)
+    for start in range(0, len(recipe_ids), 500):
+        chunk = recipe_ids[start:start + 500]
+        recipes = Recipe.objects.filter(pk__in=chunk)
+        recipes.refresh_ingredient_count()
+        recipes.refresh_summaries()
+    get_backend().index_recipes(recipe_ids)
+    index_recipe_words(recipe_ids)
+    get_chart_cache().invalidate_recipes(recipe_ids)
+    update_pantry_index(recipe_ids)
+    update_typeahead_recipes(recipe_ids)
+    bump_catalog_version()
+
+
+# ============================================
+# INGREDIENT COUNT AND SUMMARIES
+# ============================================
+# Recipe.ingredient_count is a stored copy of recipe.recipe_ingredients.count()
+# and RecipeSummary holds the recipe's calorie and cost totals. Every change
+# to the RecipeIngredient table recomputes both for the affected recipes from
+# scratch, so the values cannot drift even if a handler runs twice.
+
+def _deleting_recipe_ids():
+    """
+    Recipes this thread is deleting. Their links are deleted before the recipe
+    itself, and refreshing the summary then would recreate the row the cascade
+    just removed.
+    """
+    return _state.__dict__.setdefault('deleting_recipe_ids', set())
+
+
+def _recount(recipe_ids):
+    recipe_ids = {pk for pk in recipe_ids if pk is not None}
+    if recipe_ids:
+        recipes = Recipe.objects.filter(pk__in=recipe_ids)
+        recipes.refresh_ingredient_count()
+        recipes.exclude(pk__in=_deleting_recipe_ids()).refresh_summaries()
+    return recipe_ids
+
+
+def _links_changed(recipe_ids):
+    """Called whenever the ingredient list of some recipes changed"""
+    recipe_ids = _recount(recipe_ids)
+    if recipe_ids:
+        get_backend().index_recipes(recipe_ids)
+        get_chart_cache().invalidate_recipes(recipe_ids)
+        update_pantry_index(recipe_ids)
+        bump_catalog_version()
+
+
+@receiver(pre_save, sender=RecipeIngredient)
+def remember_previous_recipe(sender, instance, raw=False, **kwargs):
+    if handlers_suspended():
+        return
+    # An edit may move the link to another recipe; remember the old one
+    instance._previous_recipe_id = None
+    if instance.pk and not raw:
+        instance._previous_recipe_id = (
+            RecipeIngredient.objects.filter(pk=instance.pk)
+            .values_list('recipe_id', flat=True)
+            .first()
+        )
+
+
+@receiver(post_save, sender=RecipeIngredient)
+def recipe_ingredient_saved(sender, instance, raw=False, **kwargs):
+    if raw or handlers_suspended():
+        return
+    _links_changed([instance.recipe_id, getattr(instance, '_previous_recipe_id', None)])
+
+
+@receiver(post_delete, sender=RecipeIngredient)
+def recipe_ingredient_deleted(sender, instance, **kwargs):
+    if handlers_suspended():
+        return
+    _links_changed([instance.recipe_id])
+
+
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def recipe_ingredients_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Handle recipe.ingredients.add/remove/clear/set, which bypass post_save"""
+    if handlers_suspended():
+        return
+    if reverse and action == 'pre_clear':
+        # ingredient.recipes.clear() does not report which recipes it touched
+        instance._cleared_recipe_ids = list(instance.recipes.values_list('pk', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        _links_changed([instance.pk])
+    elif action == 'post_clear':
+        _links_changed(getattr(instance, '_cleared_recipe_ids', []))
+    else:
+        # ingredient.recipes.add/remove(...) - pk_set holds recipe ids
+        _links_changed(pk_set or [])
+
+
+# ============================================
+# SEARCH INDEXES, CHART CACHE AND PAGE CACHE
+# ============================================
+# Changes to ingredient lists are handled by _links_changed above; these
+# handlers cover the recipe and ingredient rows themselves.
+
+def _name_saved(instance):
+    if 'name' not in instance.get_deferred_fields():
+        index_name_words(instance.name)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, created, raw=False, **kwargs):
+    if raw or handlers_suspended():
+        return
+    get_backend().index_recipes([instance.pk])
+    _name_saved(instance)
+    update_typeahead_index(instance)
+    bump_catalog_version()
+    if created:
+        # Every recipe has a summary row, even before it has ingredients
+        instance.refresh_summary()
+
+
+@receiver(pre_delete, sender=Recipe)
+def recipe_deleting(sender, instance, **kwargs):
+    if handlers_suspended():
+        return
+    _deleting_recipe_ids().add(instance.pk)
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    if handlers_suspended():
+        return
+    _deleting_recipe_ids().discard(instance.pk)
+    get_backend().remove_recipes([instance.pk])
+    get_chart_cache().invalidate_recipes([instance.pk])
+    remove_from_pantry_index([instance.pk])
+    remove_from_typeahead_index(instance.pk)
+    bump_catalog_version()
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_saved(sender, instance, created, raw=False, **kwargs):
+    if raw or handlers_suspended():
+        return
+    _name_saved(instance)
+    # A new ingredient is not linked to any recipe yet
+    if created:
+        return
+    recipe_ids = list(instance.ingredient_recipes.values_list('recipe_id', flat=True))
+    if recipe_ids:
+        # A new price or calorie count changes the totals of every recipe using it
+        Recipe.objects.filter(pk__in=recipe_ids).refresh_summaries()
+        get_backend().index_recipes(recipe_ids)
+        get_chart_cache().invalidate_recipes(recipe_ids)
+        # The ingredient may have been renamed
+        update_pantry_index(recipe_ids)
+        bump_catalog_version()
@@ -9,4 +9,41 @@ document.addEventListener('DOMContentLoaded', function() { // Ensure the DOM is
             window.scrollTo(0, recipes_section.offsetTop);
         });
     }
-});   
\ No newline at end of file
+});
+
+// Search box suggestions from recipes:suggest, shown through the <datalist>
+document.addEventListener('DOMContentLoaded', function() {
+    const datalist = document.getElementById('recipe-suggestions');
+    const input = datalist && document.querySelector('input[list="recipe-suggestions"]');
+    if (!input) {
+        return;
+    }
+    let timer = null;
+    let pending = null;
+    input.addEventListener('input', function() {
+        clearTimeout(timer);
+        timer = setTimeout(function() {
+            const query = input.value.trim();
+            if (query.length < 2) {
+                datalist.replaceChildren();
+                return;
+            }
+            if (pending) {
+                pending.abort();
+            }
+            pending = new AbortController();
+            fetch(datalist.dataset.url + '?q=' + encodeURIComponent(query), {signal: pending.signal})
+                .then(function(response) { return response.json(); })
+                .then(function(data) {
+                    const names = data.recipes.map(function(recipe) { return recipe.name; })
+                        .concat(data.ingredients.map(function(ingredient) { return ingredient.name; }));
+                    datalist.replaceChildren(...names.map(function(name) {
+                        const option = document.createElement('option');
+                        option.value = name;
+                        return option;
+                    }));
+                })
+                .catch(function() {});
+        }, 150);
+    });
+});
@@ -1,7 +1,48 @@
-from django.test import TestCase
+import gzip
+import json
+import os
+import shutil
+import signal
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from importlib import import_module
+from io import BytesIO, StringIO
+from unittest import mock
+from django.conf import settings
+from django.test import RequestFactory, SimpleTestCase, TestCase, tag
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.core.management import call_command, CommandError
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.db.models.signals import post_delete
 from django.contrib.auth.models import User
-from .models import Recipe, Ingredient
-from .forms import RecipeSearchForm
+from django.urls import reverse
+from .models import Recipe, Ingredient, RecipeIngredient, RecipeSummary, SearchTrigram
+from .forms import RecipeSearchForm, CHART_CHOICES
+from . import fuzzy, search
+from .chart_cache import ChartCache, chart_key, get_chart_cache
+from .utils import CHART_FIELDS, ChartData, render_chart
+from .quantities import parse_quantity, parse_quantity_batch
+from .catalog_io import export_catalog
+from .page_cache import catalog_version, check_version_cache
+from .management.commands.audit_query_plans import full_scans
+from .facets import facet_filter, facet_groups
+from .signals import _deleting_recipe_ids, refresh_recipes
+from .pantry import get_pantry_index, parse_pantry, reset_pantry_index
+from .typeahead import get_typeahead_index, reset_typeahead_index
+from .views import chart_rows, chart_url
+from .render_pool import ChartRenderBusy, ChartRenderTimeout, RenderPool
+import numpy as np
+from pandas import DataFrame
+from matplotlib._pylab_helpers import Gcf
+from jangorecipes.middleware import RequestTimingMiddleware, current_rss_bytes, sql_shape
+from .management.commands.check_import_time import parse_importtime, project_import_us
 
 
 # ============================================
@@ -679,4 +720,1908 @@ class RegisterViewTest(TestCase):
         
         # User should not be created
         self.assertFalse(User.objects.filter(username='newuser').exists())
-        
\ No newline at end of file
+
+
+# ============================================
+# INGREDIENT COUNT AND DIFFICULTY TESTS
+# ============================================
+# Recipe.ingredient_count is a stored copy of the number of RecipeIngredient
+# rows. These tests check that it stays correct and that listing pages run
+# a constant number of queries no matter how many recipes are shown.
+
+class IngredientCountTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.test_user = User.objects.create_user(username='testuser', password='testpass123')
+        cls.ingredients = [
+            Ingredient.objects.create(name=f"Ingredient {i}", calories=10, price=1.0, supplier="Store")
+            for i in range(8)
+        ]
+
+    def make_recipe(self, cooking_time=10):
+        return Recipe.objects.create(
+            name="Counted Recipe",
+            user=self.test_user,
+            cooking_time=cooking_time,
+            description="Test",
+            instructions="Test"
+        )
+
+    def test_count_follows_m2m_add_remove_clear(self):
+        recipe = self.make_recipe()
+        recipe.ingredients.add(*self.ingredients[:3])
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.ingredient_count, 3)
+
+        recipe.ingredients.remove(self.ingredients[0])
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.ingredient_count, 2)
+
+        recipe.ingredients.clear()
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.ingredient_count, 0)
+
+    def test_count_follows_reverse_m2m(self):
+        recipe = self.make_recipe()
+        self.ingredients[0].recipes.add(recipe)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.ingredient_count, 1)
+
+        self.ingredients[0].recipes.clear()
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.ingredient_count, 0)
+
+    def test_count_follows_recipe_ingredient_rows(self):
+        recipe = self.make_recipe()
+        other = self.make_recipe()
+        link = RecipeIngredient.objects.create(recipe=recipe, ingredient=self.ingredients[0], quantity="1 cup")
+        RecipeIngredient.objects.create(recipe=recipe, ingredient=self.ingredients[1], quantity="2 cups")
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.ingredient_count, 2)
+
+        # Moving a link updates both recipes
+        link.recipe = other
+        link.save()
+        recipe.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(recipe.ingredient_count, 1)
+        self.assertEqual(other.ingredient_count, 1)
+
+        # Bulk delete through a queryset still fires post_delete per row
+        RecipeIngredient.objects.filter(recipe=recipe).delete()
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.ingredient_count, 0)
+
+    def test_refresh_after_bulk_create(self):
+        recipe = self.make_recipe()
+        RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(recipe=recipe, ingredient=ingredient, quantity="1")
+            for ingredient in self.ingredients[:4]
+        ])
+        # bulk_create skips signals, so the count has to be refreshed explicitly
+        Recipe.objects.filter(pk=recipe.pk).refresh_ingredient_count()
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.ingredient_count, 4)
+
+    def test_difficulty_does_not_query(self):
+        recipe = self.make_recipe()
+        recipe.ingredients.add(*self.ingredients[:6])
+        recipe = Recipe.objects.get(pk=recipe.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(recipe.difficulty, 'Medium')
+
+    def test_with_difficulty_matches_property(self):
+        cases = [(10, 2), (10, 6), (45, 2), (45, 6)]
+        for cooking_time, count in cases:
+            recipe = self.make_recipe(cooking_time=cooking_time)
+            recipe.ingredients.add(*self.ingredients[:count])
+        for recipe in Recipe.objects.with_difficulty():
+            self.assertEqual(recipe.difficulty_label, recipe.difficulty)
+        labels = set(Recipe.objects.with_difficulty().values_list('difficulty_label', flat=True))
+        self.assertEqual(labels, {'Easy', 'Medium', 'Intermediate', 'Hard'})
+
+
+class ListingQueryCountTest(TestCase):
+    """
+    Pages that show many recipes must not run one query per recipe.
+    Each test measures a page, grows the catalog and measures it again.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin_user = User.objects.create_superuser(username='admin', password='adminpass123')
+        cls.ingredients = [
+            Ingredient.objects.create(name=f"Ingredient {i}", calories=10, price=1.0, supplier="Store")
+            for i in range(6)
+        ]
+        cls.recipe = cls.add_recipes(1)[0]
+
+    @classmethod
+    def add_recipes(cls, count):
+        recipes = []
+        for i in range(count):
+            recipe = Recipe.objects.create(
+                name=f"Recipe {i}",
+                user=cls.admin_user,
+                cooking_time=10 * i,
+                description="Test",
+                instructions="Test"
+            )
+            recipe.ingredients.add(*cls.ingredients[:i % 6 + 1])
+            recipes.append(recipe)
+        return recipes
+
+    def setUp(self):
+        # Rolled-back test data does not bump the catalog version
+        cache.clear()
+        self.client.force_login(self.admin_user)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_home_query_count_is_constant(self):
+        before = self.count_queries('/')
+        self.add_recipes(20)
+        self.assertEqual(self.count_queries('/'), before)
+
+    def test_detail_query_count_is_constant(self):
+        url = self.recipe.get_absolute_url()
+        before = self.count_queries(url)
+        self.recipe.ingredients.add(*self.ingredients)
+        self.assertEqual(self.count_queries(url), before)
+
+    def test_admin_changelist_query_count_is_constant(self):
+        url = '/admin/recipes/recipe/'
+        before = self.count_queries(url)
+        self.add_recipes(20)
+        self.assertEqual(self.count_queries(url), before)
+
+
+# ============================================
+# FULL-TEXT SEARCH TESTS
+# ============================================
+
+class RecipeSearchTest(TestCase):
+    """
+    Tests for recipes.search and the Home search form.
+    The index is rebuilt in setUpTestData; later changes must reach it
+    through the signal handlers alone.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.test_user = User.objects.create_user(username='testuser', password='testpass123')
+        cls.walnut = Ingredient.objects.create(name="Walnut", calories=200, price=3.0, supplier="Store")
+        cls.cake = Recipe.objects.create(
+            name="Carrot Cake",
+            user=cls.test_user,
+            cooking_time=60,
+            description="A moist cake with carrots.",
+            instructions="Grate the carrots and bake."
+        )
+        cls.cake.ingredients.add(cls.walnut)
+        cls.soup = Recipe.objects.create(
+            name="Carrot Soup",
+            user=cls.test_user,
+            cooking_time=20,
+            description="Warming soup.",
+            instructions="Simmer until soft. Serve with a slice of cake."
+        )
+        search.get_backend().rebuild()
+
+    def hit_ids(self, query):
+        return [hit.recipe_id for hit in search.search_recipes(query)]
+
+    def test_name_matches_rank_first(self):
+        # "cake" is in the cake's name but only in the soup's instructions
+        self.assertEqual(self.hit_ids('cake'), [self.cake.pk, self.soup.pk])
+
+    def test_all_words_must_match(self):
+        self.assertEqual(self.hit_ids('carrot soup'), [self.soup.pk])
+        self.assertEqual(self.hit_ids('carrot pizza'), [])
+
+    def test_prefix_and_stemmed_matches(self):
+        self.assertEqual(self.hit_ids('carr'), sorted(self.hit_ids('carrots')))
+        self.assertIn(self.soup.pk, self.hit_ids('simmering'))
+
+    def test_search_syntax_is_ignored(self):
+        self.assertEqual(self.hit_ids('"cake" OR ('), self.hit_ids('cake or'))
+        self.assertEqual(self.hit_ids('*'), [])
+
+    def test_snippet_is_highlighted_and_escaped(self):
+        self.soup.instructions = "Add <b>cream</b> at the end."
+        self.soup.save()
+        hit = search.search_recipes('cream')[0]
+        self.assertIn('<mark>cream</mark>', hit.snippet)
+        self.assertIn('&lt;b&gt;', hit.snippet)
+
+    def test_index_follows_ingredient_changes(self):
+        self.assertEqual(self.hit_ids('walnut'), [self.cake.pk])
+        self.walnut.name = "Pecan"
+        self.walnut.save()
+        self.assertEqual(self.hit_ids('walnut'), [])
+        self.assertEqual(self.hit_ids('pecan'), [self.cake.pk])
+
+        self.soup.ingredients.add(self.walnut)
+        self.assertCountEqual(self.hit_ids('pecan'), [self.cake.pk, self.soup.pk])
+        self.cake.ingredients.remove(self.walnut)
+        self.assertEqual(self.hit_ids('pecan'), [self.soup.pk])
+
+    def test_index_follows_recipe_changes(self):
+        recipe = Recipe.objects.create(
+            name="Lemon Tart", user=self.test_user, description="Tangy.", instructions="Bake."
+        )
+        self.assertEqual(self.hit_ids('lemon'), [recipe.pk])
+        recipe.delete()
+        self.assertEqual(self.hit_ids('lemon'), [])
+
+    def test_simple_backend_matches_same_recipes(self):
+        backend = search.SimpleSearchBackend()
+        for query in ['cake', 'carrot soup', 'walnut']:
+            simple_ids = [hit.recipe_id for hit in backend.search(query)]
+            self.assertCountEqual(simple_ids, self.hit_ids(query))
+
+    def test_home_search(self):
+        self.client.force_login(self.test_user)
+        response = self.client.get('/', {'recipe_name': 'cake'})
+        self.assertEqual(list(response.context['object_list']), [self.cake, self.soup])
+        self.assertContains(response, '<mark>cake</mark>', html=False)
+
+    def test_rebuild_command(self):
+        out = StringIO()
+        version = catalog_version()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn('Indexed 2 recipes', out.getvalue())
+        self.assertNotEqual(catalog_version(), version)
+        self.assertEqual(self.hit_ids('soup'), [self.soup.pk])
+
+
+# ============================================
+# HOME PAGINATION TESTS
+# ============================================
+
+class HomePaginationTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.test_user = User.objects.create_user(username='testuser', password='testpass123')
+        cls.recipes = [
+            Recipe.objects.create(
+                name=f"Recipe {i}",
+                user=cls.test_user,
+                cooking_time=10,
+                description="Long description " * 50,
+                instructions="Long instructions " * 50
+            )
+            for i in range(30)
+        ]
+
+    def setUp(self):
+        # Rolled-back test data does not bump the catalog version
+        cache.clear()
+        self.client.force_login(self.test_user)
+
+    def get_page(self, query=''):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/' + query)
+        self.assertEqual(response.status_code, 200)
+        return response, queries
+
+    def test_walk_forward_and_back(self):
+        seen = []
+        response, _ = self.get_page()
+        page = response.context['page_obj']
+        self.assertFalse(page.has_previous())
+        seen += [recipe.pk for recipe in page]
+        while page.has_next():
+            response, _ = self.get_page(f'?after={page.next_cursor}')
+            page = response.context['page_obj']
+            seen += [recipe.pk for recipe in page]
+        self.assertEqual(seen, [recipe.pk for recipe in self.recipes])
+
+        # The last page (6 recipes) leads back to the full page before it
+        response, _ = self.get_page(f'?before={page.previous_cursor}')
+        previous = response.context['page_obj']
+        self.assertEqual([recipe.pk for recipe in previous], seen[12:24])
+        self.assertTrue(previous.has_previous())
+        self.assertEqual(previous.next_cursor, seen[23])
+
+    def test_deep_page_costs_the_same(self):
+        _, first = self.get_page()
+        _, deep = self.get_page(f'?after={self.recipes[24].pk}')
+        # The facet counts are computed by the first page and shared by all
+        first = [q for q in first if 'GROUP BY' not in q['sql']]
+        self.assertEqual(len(first), len(deep))
+
+    def test_cards_skip_text_columns(self):
+        _, queries = self.get_page()
+        recipe_queries = [q['sql'] for q in queries if 'FROM "recipes_recipe"' in q['sql'] and 'GROUP BY' not in q['sql']]
+        self.assertEqual(len(recipe_queries), 1)
+        self.assertNotIn('"description"', recipe_queries[0])
+        self.assertNotIn('"instructions"', recipe_queries[0])
+
+    def test_invalid_cursor_is_404(self):
+        self.assertEqual(self.client.get('/?after=abc').status_code, 404)
+
+    def test_search_reads_recipes_once(self):
+        search.get_backend().rebuild()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/', {'recipe_name': 'recipe'})
+        self.assertEqual(len(response.context['object_list']), 30)
+        recipe_queries = [q['sql'] for q in queries if 'FROM "recipes_recipe"' in q['sql'] and 'GROUP BY' not in q['sql']]
+        self.assertEqual(len(recipe_queries), 1)
+
+
+# ============================================
+# CHART CACHE TESTS
+# ============================================
+
+class ChartCacheTest(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def test_key_changes_with_data(self):
+        rows = [{'ingredient__name': 'Flour', 'ingredient__price': Decimal('1.00')}]
+        changed = [{'ingredient__name': 'Flour', 'ingredient__price': Decimal('1.50')}]
+        self.assertEqual(chart_key(1, '#1', rows), chart_key(1, '#1', list(rows)))
+        self.assertNotEqual(chart_key(1, '#1', rows), chart_key(1, '#1', changed))
+        self.assertNotEqual(chart_key(1, '#1', rows), chart_key(1, '#2', rows))
+
+    def test_memory_tier_respects_byte_budget(self):
+        cache = ChartCache(memory_bytes=10)
+        cache.set('1-a', b'12345')
+        cache.set('1-b', b'12345')
+        cache.get('1-a')  # 1-a is now the most recently used
+        cache.set('1-c', b'12345')
+        self.assertEqual(cache.get('1-b'), None)
+        self.assertEqual(cache.get('1-a'), b'12345')
+        stats = cache.stats()
+        self.assertEqual(stats['evictions'], 1)
+        self.assertLessEqual(stats['memory_bytes'], 10)
+
+    def test_disk_tier_survives_a_new_process(self):
+        ChartCache(directory=self.directory).set('7-key', b'png')
+        cache = ChartCache(directory=self.directory)
+        self.assertEqual(cache.get('7-key'), b'png')
+        self.assertEqual(cache.get('7-key'), b'png')
+        stats = cache.stats()
+        self.assertEqual((stats['hits_disk'], stats['hits_memory'], stats['misses']), (1, 1, 0))
+
+    def test_invalidate_recipes(self):
+        cache = ChartCache(directory=self.directory)
+        cache.set('1-key', b'one')
+        cache.set('2-key', b'two')
+        cache.invalidate_recipes([1])
+        self.assertIsNone(cache.get('1-key'))
+        self.assertEqual(cache.get('2-key'), b'two')
+
+
+class ChartImageTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.test_user = User.objects.create_user(username='testuser', password='testpass123')
+        cls.flour = Ingredient.objects.create(name="Flour", calories=100, price=1.0, supplier="Store")
+        cls.recipe = Recipe.objects.create(
+            name="Bread", user=cls.test_user, description="Test", instructions="Test"
+        )
+        RecipeIngredient.objects.create(recipe=cls.recipe, ingredient=cls.flour, quantity="2 cups")
+
+    def setUp(self):
+        get_chart_cache().clear()
+        self.client.force_login(self.test_user)
+
+    def post_chart(self, chart_type='#1'):
+        """Pick a chart on the detail page and load the image it links to"""
+        response = self.client.post(self.recipe.get_absolute_url(), {'chart_type': chart_type})
+        url = response.context['chart']
+        self.assertContains(response, f'<img src="{url}"', html=False)
+        image = self.client.get(url)
+        self.assertEqual(image.status_code, 200)
+        return image.content
+
+    def test_suite_uses_a_temporary_chart_cache(self):
+        # Set by jangorecipes.test_runner, so tests never touch MEDIA_ROOT
+        directory = os.path.realpath(get_chart_cache().directory)
+        self.assertFalse(directory.startswith(os.path.realpath(settings.MEDIA_ROOT)))
+
+    def test_repeat_views_skip_matplotlib(self):
+        with mock.patch('recipes.views.render_chart', wraps=render_chart) as render:
+            first = self.post_chart()
+            second = self.post_chart()
+            self.assertEqual(render.call_count, 1)
+            self.assertEqual(first, second)
+
+            self.post_chart('#2')
+            self.assertEqual(render.call_count, 2)
+
+    def test_ingredient_change_invalidates(self):
+        misses = get_chart_cache().stats()['misses']
+        with mock.patch('recipes.views.render_chart', wraps=render_chart) as render:
+            self.post_chart()
+            self.flour.price = 2.0
+            self.flour.save()
+            self.post_chart()
+            self.assertEqual(render.call_count, 2)
+        stats = get_chart_cache().stats()
+        self.assertEqual(stats['misses'] - misses, 2)
+        self.assertEqual(stats['memory_entries'], 1)
+
+    def test_etag_and_conditional_get(self):
+        url = f'/recipe/{self.recipe.pk}/chart/prices.png'
+        response = self.client.get(url)
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertIn('no-cache', response['Cache-Control'])
+        etag = response['ETag']
+
+        with mock.patch('recipes.views.render_chart') as render:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        render.assert_not_called()
+
+        self.flour.price = 3.0
+        self.flour.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_versioned_url_is_immutable(self):
+        response = self.client.post(self.recipe.get_absolute_url(), {'chart_type': '#3'})
+        image = self.client.get(response.context['chart'])
+        self.assertIn('immutable', image['Cache-Control'])
+        self.assertIn('private', image['Cache-Control'])
+
+    def test_svg_and_unknown_charts(self):
+        response = self.client.get(f'/recipe/{self.recipe.pk}/chart/calories.svg')
+        self.assertEqual(response['Content-Type'], 'image/svg+xml')
+        self.assertIn(b'<svg', response.content)
+        self.assertEqual(self.client.get(f'/recipe/{self.recipe.pk}/chart/calories.gif').status_code, 404)
+        self.assertEqual(self.client.get(f'/recipe/{self.recipe.pk}/chart/other.png').status_code, 404)
+        self.assertEqual(self.client.get('/recipe/999/chart/prices.png').status_code, 404)
+
+    def test_render_timeout_returns_503(self):
+        with mock.patch.object(RenderPool, 'render', side_effect=ChartRenderTimeout):
+            response = self.client.get(f'/recipe/{self.recipe.pk}/chart/prices.png')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '2')
+
+    def test_stats_endpoint_is_staff_only(self):
+        self.assertEqual(self.client.get('/charts/cache-stats').status_code, 302)
+        self.test_user.is_staff = True
+        self.test_user.save()
+        response = self.client.get('/charts/cache-stats')
+        self.assertIn('hit_ratio', response.json())
+
+
+# ============================================
+# CHART RENDERING TESTS
+# ============================================
+
+class ChartRenderingTest(TestCase):
+
+    rows = [
+        {'ingredient__name': 'Flour', 'ingredient__calories': 100, 'ingredient__price': 1.5, 'amount': 2.0},
+        {'ingredient__name': 'Sugar', 'ingredient__calories': 200, 'ingredient__price': 2.0, 'amount': 0.5},
+    ]
+
+    def render(self, chart_type):
+        data = DataFrame(self.rows)
+        return render_chart(chart_type, data, labels=data['ingredient__name'].values)
+
+    def test_renders_png_for_every_chart_type(self):
+        for chart_type, _ in CHART_CHOICES:
+            self.assertTrue(self.render(chart_type).startswith(b'\x89PNG'))
+
+    def test_concurrent_renders_match_serial_renders(self):
+        expected = {chart_type: self.render(chart_type) for chart_type, _ in CHART_CHOICES}
+        jobs = [chart_type for chart_type, _ in CHART_CHOICES] * 4
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(self.render, jobs))
+        for chart_type, png in zip(jobs, results):
+            self.assertEqual(png, expected[chart_type])
+
+    def test_pool_deadline_and_late_result(self):
+        pool = RenderPool(workers=1, queue=0, timeout=0.05)
+        self.addCleanup(pool.shutdown)
+        release = threading.Event()
+        late = []
+        delivered = threading.Event()
+
+        def slow():
+            release.wait(5)
+            return b'late'
+
+        def on_late_result(value):
+            late.append(value)
+            delivered.set()
+
+        with self.assertRaises(ChartRenderTimeout):
+            pool.render(slow, on_late_result=on_late_result)
+        # The only worker is still busy and there is no queue
+        with self.assertRaises(ChartRenderBusy):
+            pool.render(slow)
+        release.set()
+        self.assertTrue(delivered.wait(5))
+        self.assertEqual(late, [b'late'])
+        self.assertEqual(pool.render(lambda: b'fast'), b'fast')
+
+
+# ============================================
+# MEMORY TESTS
+# ============================================
+# Slow: skip with `python src/manage.py test --exclude-tag slow`
+
+@tag('slow')
+class ChartMemoryTest(SimpleTestCase):
+
+    def test_rss_stays_flat_over_thousands_of_renders(self):
+        data = DataFrame([
+            {'ingredient__name': f'Ingredient {i}', 'ingredient__calories': 100,
+             'ingredient__price': 1.5, 'amount': 2.0}
+            for i in range(6)
+        ])
+        labels = data['ingredient__name'].values
+        chart_types = [chart_type for chart_type, _ in CHART_CHOICES]
+
+        # Warm up font and glyph caches before measuring
+        for i in range(60):
+            render_chart(chart_types[i % 3], data, labels=labels)
+        start = current_rss_bytes()
+        for i in range(2000):
+            render_chart(chart_types[i % 3], data, labels=labels)
+        growth = current_rss_bytes() - start
+
+        # A leaked figure costs about 1 MB, so a leak would add ~2 GB here
+        self.assertLess(growth, 32 * 1024 * 1024)
+        self.assertEqual(Gcf.get_num_fig_managers(), 0)
+
+
+class MemoryWatchdogTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.test_user = User.objects.create_user(username='testuser', password='testpass123')
+
+    def test_disabled_by_default(self):
+        with mock.patch('jangorecipes.middleware.os.kill') as kill:
+            self.client.get('/login/')
+        kill.assert_not_called()
+
+    def test_recycles_worker_over_limit_once(self):
+        with self.settings(WORKER_MAX_RSS_MB=1, WORKER_RSS_CHECK_INTERVAL=1), \
+                mock.patch('jangorecipes.middleware.os.kill') as kill:
+            self.assertEqual(self.client.get('/login/').status_code, 200)
+            self.client.get('/login/')
+        kill.assert_called_once_with(os.getpid(), signal.SIGTERM)
+
+
+# ============================================
+# CLIENT-SIDE CHART TESTS
+# ============================================
+
+class ChartDataTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.test_user = User.objects.create_user(username='testuser', password='testpass123')
+        cls.recipe = Recipe.objects.create(
+            name="Bread", user=cls.test_user, description="Test", instructions="Test"
+        )
+        flour = Ingredient.objects.create(name="Flour", calories=100, price=1.25, supplier="Store")
+        sugar = Ingredient.objects.create(name="Sugar", calories=200, price=2.0, supplier="Store")
+        RecipeIngredient.objects.create(recipe=cls.recipe, ingredient=flour, quantity="2 cups")
+        RecipeIngredient.objects.create(recipe=cls.recipe, ingredient=sugar, quantity="1/2 cup")
+
+    def setUp(self):
+        self.client.force_login(self.test_user)
+
+    def test_chart_data_json(self):
+        response = self.client.get(f'/recipe/{self.recipe.pk}/chart.json')
+        data = response.json()
+        self.assertEqual(data['names'], ['Flour', 'Sugar'])
+        self.assertEqual(data['prices'], [1.25, 2.0])
+        self.assertEqual(data['calories'], [100, 200])
+        self.assertEqual(data['quantities'], [2.0, 0.5])
+        self.assertEqual(data['images']['#1'], f'/recipe/{self.recipe.pk}/chart/prices.png')
+
+        response = self.client.get(f'/recipe/{self.recipe.pk}/chart.json', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_client_mode_never_renders_on_server(self):
+        with self.settings(CHART_RENDERING='client'), \
+                mock.patch('recipes.views.render_chart') as render:
+            response = self.client.post(self.recipe.get_absolute_url(), {'chart_type': '#2'})
+        render.assert_not_called()
+        self.assertContains(response, 'id="ingredient-chart"')
+        self.assertContains(response, 'data-chart-type="#2"')
+        self.assertContains(response, 'recipes/js/charts.js')
+
+    def test_server_mode_shows_image(self):
+        with self.settings(CHART_RENDERING='server'):
+            response = self.client.post(self.recipe.get_absolute_url(), {'chart_type': '#2'})
+        self.assertNotContains(response, 'id="ingredient-chart"')
+        self.assertContains(response, f'<img src="{response.context["chart"]}"', html=False)
+
+
+# ============================================
+# IMPORT TIME TESTS
+# ============================================
+
+class ImportTimeTest(SimpleTestCase):
+
+    def test_parse_importtime(self):
+        stderr = (
+            "import time: self [us] | cumulative | imported package\n"
+            "import time:       100 |        100 |   encodings.aliases\n"
+            "import time:       300 |        400 | encodings\n"
+        )
+        self.assertEqual(parse_importtime(stderr), [
+            ('encodings.aliases', 100, 100, 1),
+            ('encodings', 300, 400, 0),
+        ])
+
+    def test_project_import_time(self):
+        imports = [
+            ('django.urls', 50, 50, 2),
+            ('recipes.utils', 100, 100, 2),
+            ('recipes.views', 200, 350, 1),
+            ('django.contrib.admin', 500, 500, 1),
+            ('django', 10, 860, 0),
+            ('jangorecipes.settings', 40, 40, 0),
+        ]
+        # recipes.utils is inside recipes.views, which already counts it
+        self.assertEqual(project_import_us(imports, {'recipes', 'jangorecipes'}), 390)
+
+    def test_startup_within_configured_budget(self):
+        out = StringIO()
+        # Enforces settings.IMPORT_TIME_BUDGET_MS and the lazy imports
+        call_command('check_import_time', stdout=out)
+        self.assertIn(f'(budget {settings.IMPORT_TIME_BUDGET_MS} ms)', out.getvalue())
+        self.assertIn('Import time OK', out.getvalue())
+
+    def test_over_budget_fails(self):
+        with self.assertRaisesMessage(CommandError, 'over the 0 ms budget'):
+            call_command('check_import_time', budget_ms=0, stdout=StringIO())
+
+
+# ============================================
+# COLUMNAR CHART DATA TESTS
+# ============================================
+
+class ChartDataColumnsTest(SimpleTestCase):
+
+    rows = [
+        ('Flour', 100, Decimal('1.50'), 2.0),
+        ('Sugar', 200, Decimal('2.00'), None),
+    ]
+
+    def test_columns_are_numpy_arrays(self):
+        data = ChartData.from_rows(self.rows)
+        self.assertEqual(data.shape, (2, 4))
+        self.assertEqual(list(data['ingredient__name']), ['Flour', 'Sugar'])
+        self.assertEqual(data['ingredient__calories'].dtype, 'int64')
+        self.assertEqual(list(data['ingredient__price']), [1.5, 2.0])
+        self.assertEqual(data['amount'][0], 2.0)
+        self.assertTrue(np.isnan(data['amount'][1]))
+
+    def test_empty(self):
+        self.assertEqual(ChartData.from_rows([]).shape, (0, 4))
+
+    def test_same_chart_as_dataframe(self):
+        data = ChartData.from_rows(self.rows)
+        frame = DataFrame([dict(zip(CHART_FIELDS, row)) for row in self.rows])
+        for chart_type, _ in CHART_CHOICES:
+            self.assertEqual(
+                render_chart(chart_type, data, labels=data['ingredient__name']),
+                render_chart(chart_type, frame, labels=frame['ingredient__name'].values),
+            )
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command('benchmark_chart_data', sizes=[5], repeat=1, stdout=out)
+        self.assertIn('ChartData', out.getvalue())
+
+
+# ============================================
+# STRUCTURED QUANTITY TESTS
+# ============================================
+
+class ParseQuantityTest(SimpleTestCase):
+
+    cases = {
+        '2 cups': (2.0, 'cup'),
+        '1 1/2 Tbsp': (1.5, 'tbsp'),
+        '3/4 c.': (0.75, 'cup'),
+        '½ tsp': (0.5, 'tsp'),
+        '1½ cup': (1.5, 'cup'),
+        '.5 kg': (0.5, 'kg'),
+        '250g flour': (250.0, 'g'),
+        '2-3 cloves': (2.5, 'clove'),
+        '10 to 12 oz': (11.0, 'oz'),
+        '1 T sugar': (1.0, 'tbsp'),
+        '1 t salt': (1.0, 'tsp'),
+        '2 fl oz milk': (2.0, 'fl oz'),
+        '2 large eggs': (2.0, ''),
+        '1 tomato': (1.0, ''),
+        'a pinch': (None, ''),
+        'to taste': (None, ''),
+        # Only a leading number is an amount
+        'about 2 cups': (None, ''),
+        # Other scripts' digits read as 0-9
+        '٣ cups': (3.0, 'cup'),
+        '١½ cup': (1.5, 'cup'),
+        '1/0 cup': (None, 'cup'),
+        '': (None, ''),
+    }
+
+    def test_parse_quantity(self):
+        for text, expected in self.cases.items():
+            with self.subTest(text=text):
+                self.assertEqual(parse_quantity(text), expected)
+
+    def test_batch_matches_single_parser(self):
+        amounts, units = parse_quantity_batch([*self.cases, None])
+        self.assertEqual(list(zip(amounts, units)), [*self.cases.values(), (None, '')])
+
+    def test_parsers_agree(self):
+        texts = ['٣ cups', '٣/٤ tsp', '۲-۳ cloves', '२ kg', '٣', '1٣ g', '½٣ cup', '3 ٣ cups']
+        amounts, units = parse_quantity_batch(texts)
+        self.assertEqual(list(zip(amounts, units)), [parse_quantity(text) for text in texts])
+
+    def test_migration_parser(self):
+        # 0011 backfilled with a frozen copy of the batch parser
+        migration = import_module('recipes.migrations.0011_recipeingredient_amount_unit')
+        amounts, units = migration.parse_quantity_batch(self.cases)
+        self.assertEqual(list(zip(amounts, units)), list(self.cases.values()))
+        self.assertEqual(migration.parse_quantity_batch([]), ([], []))
+        self.assertEqual(parse_quantity_batch([]), ([], []))
+
+
+class RecipeIngredientAmountTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(username='testuser', password='testpass123')
+        cls.recipe = Recipe.objects.create(name="Bread", user=user, description="Test", instructions="Test")
+        cls.flour = Ingredient.objects.create(name="Flour", calories=100, price=1.25, supplier="Store")
+        cls.salt = Ingredient.objects.create(name="Salt", calories=0, price=0.5, supplier="Store")
+
+    def test_amount_and_unit_parsed_on_save(self):
+        link = RecipeIngredient.objects.create(recipe=self.recipe, ingredient=self.flour, quantity="1 1/2 cups")
+        link.refresh_from_db()
+        self.assertEqual((link.amount, link.unit), (1.5, 'cup'))
+
+        link.quantity = '200 g'
+        link.save(update_fields=['quantity'])
+        link.refresh_from_db()
+        self.assertEqual((link.amount, link.unit), (200.0, 'g'))
+
+    def test_charts_use_stored_amount(self):
+        RecipeIngredient.objects.create(recipe=self.recipe, ingredient=self.flour, quantity="2-3 cups")
+        RecipeIngredient.objects.create(recipe=self.recipe, ingredient=self.salt, quantity="a pinch")
+        self.assertEqual([row[-1] for row in chart_rows(self.recipe.pk)], [2.5, None])
+
+        self.client.force_login(self.recipe.user)
+        data = self.client.get(f'/recipe/{self.recipe.pk}/chart.json').json()
+        self.assertEqual(data['quantities'], [2.5, 1.0])
+
+
+# ============================================
+# RECIPE SUMMARY TESTS
+# ============================================
+
+class RecipeSummaryTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.test_user = User.objects.create_user(username='testuser', password='testpass123')
+        cls.recipe = Recipe.objects.create(name="Bread", user=cls.test_user, description="Test", instructions="Test")
+        cls.flour = Ingredient.objects.create(name="Flour", calories=100, price=Decimal('1.25'), supplier="Store")
+        cls.butter = Ingredient.objects.create(name="Butter", calories=300, price=Decimal('3.50'), supplier="Store")
+
+    def summary(self, recipe=None):
+        return RecipeSummary.objects.get(recipe=recipe or self.recipe)
+
+    def test_new_recipe_has_empty_summary(self):
+        summary = self.summary()
+        self.assertEqual((summary.total_calories, summary.total_cost, summary.ingredient_count), (0, 0, 0))
+        self.assertIsNone(summary.priciest_ingredient)
+
+    def test_refreshed_when_links_change(self):
+        link = RecipeIngredient.objects.create(recipe=self.recipe, ingredient=self.flour, quantity="2 cups")
+        self.recipe.ingredients.add(self.butter, through_defaults={'quantity': '1 stick'})
+        summary = self.summary()
+        self.assertEqual(summary.total_calories, 400)
+        self.assertEqual(summary.total_cost, Decimal('4.75'))
+        self.assertEqual(summary.ingredient_count, 2)
+        self.assertEqual(summary.priciest_ingredient, self.butter)
+
+        self.recipe.ingredients.remove(self.butter)
+        summary = self.summary()
+        self.assertEqual((summary.total_calories, summary.priciest_ingredient), (100, self.flour))
+
+        link.delete()
+        self.assertEqual(self.summary().ingredient_count, 0)
+
+    def test_refreshed_when_ingredient_changes(self):
+        self.recipe.ingredients.add(self.flour, self.butter, through_defaults={'quantity': '1'})
+        self.flour.price = Decimal('9.00')
+        self.flour.save()
+        summary = self.summary()
+        self.assertEqual(summary.total_cost, Decimal('12.50'))
+        self.assertEqual(summary.priciest_ingredient, self.flour)
+
+        self.butter.delete()
+        self.assertEqual(self.summary().total_calories, 100)
+
+    def test_deleting_recipe_removes_summary(self):
+        self.recipe.ingredients.add(self.flour, through_defaults={'quantity': '1'})
+        self.recipe.delete()
+        self.assertFalse(RecipeSummary.objects.exists())
+
+    def test_deleting_recipe_ids_are_per_thread(self):
+        self.recipe.ingredients.add(self.flour, through_defaults={'quantity': '1'})
+        seen = {}
+
+        def link_deleted(sender, **kwargs):
+            # Another thread saving links for this recipe must still refresh it
+            other = threading.Thread(target=lambda: seen.update(other=set(_deleting_recipe_ids())))
+            other.start()
+            other.join()
+            seen['this'] = set(_deleting_recipe_ids())
+
+        post_delete.connect(link_deleted, sender=RecipeIngredient)
+        self.addCleanup(post_delete.disconnect, link_deleted, sender=RecipeIngredient)
+        recipe_id = self.recipe.pk
+        self.recipe.delete()
+        self.assertEqual(seen, {'this': {recipe_id}, 'other': set()})
+        self.assertEqual(_deleting_recipe_ids(), set())
+
+    def test_rebuild_command_uses_one_aggregate_query(self):
+        self.recipe.ingredients.add(self.flour, self.butter, through_defaults={'quantity': '1'})
+        RecipeSummary.objects.update(total_calories=0, total_cost=0, ingredient_count=0)
+        version = catalog_version()
+        with CaptureQueriesContext(connection) as queries:
+            call_command('rebuild_recipe_summaries', stdout=StringIO())
+        selects = [q['sql'] for q in queries if q['sql'].startswith('SELECT')]
+        self.assertEqual(len(selects), 1)
+        self.assertEqual(self.summary().total_calories, 400)
+        # Cached grids with the old totals are invalidated
+        self.assertNotEqual(catalog_version(), version)
+
+
+class HomeSortTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.test_user = User.objects.create_user(username='testuser', password='testpass123')
+        cls.recipes = []
+        for i in range(30):
+            recipe = Recipe.objects.create(name=f"Recipe {i}", user=cls.test_user, description="T", instructions="T")
+            # Prices repeat so the pk has to break ties
+            ingredient = Ingredient.objects.create(
+                name=f"Ingredient {i}", calories=i * 10, price=Decimal(i % 7), supplier="Store"
+            )
+            recipe.ingredients.add(ingredient, through_defaults={'quantity': '1'})
+            cls.recipes.append(recipe)
+
+    def setUp(self):
+        # Rolled-back test data does not bump the catalog version
+        cache.clear()
+        self.client.force_login(self.test_user)
+
+    def walk(self, sort):
+        seen = []
+        response = self.client.get(f'/?sort={sort}')
+        page = response.context['page_obj']
+        seen += [recipe.pk for recipe in page]
+        while page.has_next():
+            response = self.client.get('/', {'sort': sort, 'after': page.next_cursor})
+            page = response.context['page_obj']
+            seen += [recipe.pk for recipe in page]
+        return seen
+
+    def test_sort_by_cost_both_ways(self):
+        by_cost = sorted((i % 7, recipe.pk) for i, recipe in enumerate(self.recipes))
+        self.assertEqual(self.walk('cost'), [pk for _, pk in by_cost])
+        self.assertEqual(self.walk('-cost'), [pk for _, pk in reversed(by_cost)])
+
+    def test_previous_page_with_sort(self):
+        seen = self.walk('-calories')
+        # Render the pages again instead of serving them from the page cache
+        cache.clear()
+        response = self.client.get('/', {'sort': '-calories', 'after': f'{(30 - 12) * 10}~{seen[11]}'})
+        page = response.context['page_obj']
+        response = self.client.get('/', {'sort': '-calories', 'before': page.previous_cursor})
+        self.assertEqual([recipe.pk for recipe in response.context['page_obj']], seen[:12])
+
+    def test_cards_show_totals_without_extra_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/?sort=calories')
+        # Leaving out the facet counts (see HomeFacetTest)
+        recipe_queries = [q['sql'] for q in queries if 'FROM "recipes_recipe"' in q['sql'] and 'GROUP BY' not in q['sql']]
+        self.assertEqual(len(recipe_queries), 1)
+        self.assertIn('recipes_recipesummary', recipe_queries[0])
+        self.assertContains(response, '0 kcal')
+
+    def test_bad_sort_and_cursor(self):
+        response = self.client.get('/?sort=name')
+        self.assertIsNone(response.context['sort'])
+        self.assertEqual(self.client.get('/?sort=cost&after=abc~1').status_code, 404)
+
+
+# ============================================
+# RECIPE IMAGE VARIANT TESTS
+# ============================================
+
+def image_upload(name='photo.png', size=(800, 600)):
+    from PIL import Image
+    buffer = BytesIO()
+    Image.new('RGB', size, (200, 120, 40)).save(buffer, 'PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+
+class RecipeImageVariantTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.test_user = User.objects.create_user(username='testuser', password='testpass123')
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = self.settings(MEDIA_ROOT=self.media_root, RECIPE_IMAGE_WIDTHS=(320, 640, 1024))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client.force_login(self.test_user)
+
+    def create_recipe(self, **kwargs):
+        return Recipe.objects.create(
+            name="Bread", user=self.test_user, description="Test", instructions="Test", **kwargs
+        )
+
+    def test_upload_builds_variants(self):
+        recipe = self.create_recipe(pic=image_upload())
+        recipe.refresh_from_db()
+        variants = recipe.pic_variants
+        self.assertEqual(variants['source'], recipe.pic.name)
+        self.assertTrue(variants['placeholder'].startswith('data:image/jpeg;base64,'))
+        self.assertLess(len(variants['placeholder']), 2000)
+        # 1024 is wider than the upload, so the largest variant is full size
+        self.assertEqual([width for width, _ in variants['jpeg']], [320, 640, 800])
+        self.assertEqual([width for width, _ in variants['webp']], [320, 640, 800])
+        for width, name in variants['webp'] + variants['jpeg']:
+            self.assertTrue(os.path.exists(os.path.join(self.media_root, name)))
+            self.assertRegex(name, rf'^recipe_pics/variants/[0-9a-f]{{16}}-{width}\.(webp|jpg)$')
+
+    def test_variants_invalidate_cached_pages(self):
+        # The variants are written after post_save, so they bump the version again
+        with mock.patch('recipes.models.bump_catalog_version') as bump:
+            self.create_recipe(pic=image_upload())
+        bump.assert_called_once_with()
+
+    def test_same_photo_reuses_files(self):
+        first = self.create_recipe(pic=image_upload('a.png'))
+        second = self.create_recipe(pic=image_upload('b.png'))
+        self.assertEqual(first.pic_variants['webp'], second.pic_variants['webp'])
+
+    def test_templates_use_srcset_and_lazy_loading(self):
+        recipe = self.create_recipe(pic=image_upload())
+        response = self.client.get('/')
+        self.assertContains(response, 'type="image/webp"')
+        self.assertContains(response, '320w')
+        self.assertContains(response, 'loading="lazy"')
+        self.assertContains(response, 'data:image/jpeg;base64,')
+        response = self.client.get(recipe.get_absolute_url())
+        self.assertContains(response, 'srcset=')
+        self.assertContains(response, 'loading="eager"')
+
+    def test_recipe_without_variants_uses_original(self):
+        recipe = self.create_recipe()
+        self.assertEqual(recipe.pic_variants, {})
+        self.assertEqual(recipe.picture, {'src': recipe.pic.url})
+        response = self.client.get('/')
+        self.assertContains(response, f'src="{recipe.pic.url}"')
+        self.assertContains(response, 'loading="lazy"')
+
+    def test_backfill_command(self):
+        uploaded = self.create_recipe(pic=image_upload())
+        existing = [self.create_recipe(pic=uploaded.pic.name) for _ in range(2)]
+        missing = self.create_recipe(pic='recipe_pics/missing.png')
+        out = StringIO()
+        version = catalog_version()
+        with self.assertLogs('recipes.thumbnails', 'WARNING'):
+            call_command('build_recipe_thumbnails', stdout=out)
+        self.assertIn('Built variants for 3 recipes (2 images), 1 already up to date', out.getvalue())
+        self.assertNotEqual(catalog_version(), version)
+        for recipe in existing:
+            recipe.refresh_from_db()
+            self.assertEqual(recipe.pic_variants['jpeg'], uploaded.pic_variants['jpeg'])
+        missing.refresh_from_db()
+        self.assertEqual(missing.picture, {'src': missing.pic.url})
+
+
+# ============================================
+# DETAIL PAGE QUERY BUDGET TESTS
+# ============================================
+
+class DetailQueryBudgetTest(TestCase):
+    """The detail page reads the recipe and its ingredient links once each"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.test_user = User.objects.create_user(username='testuser', password='testpass123')
+        cls.recipe = Recipe.objects.create(name="Bread", user=cls.test_user, description="Test", instructions="Test")
+        for i in range(8):
+            ingredient = Ingredient.objects.create(
+                name=f"Ingredient {i}", calories=10 * i, price=Decimal('1.50'), supplier="Store"
+            )
+            RecipeIngredient.objects.create(recipe=cls.recipe, ingredient=ingredient, quantity=f"{i + 1} cups")
+
+    def setUp(self):
+        self.client.force_login(self.test_user)
+        self.url = self.recipe.get_absolute_url()
+
+    def recipe_queries(self, method='get', **data):
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(self.url, data)
+        self.assertEqual(response.status_code, 200)
+        # Session and user lookups are the login machinery, not the page
+        return response, [
+            q['sql'] for q in queries
+            if 'django_session' not in q['sql'] and 'auth_user' not in q['sql']
+        ]
+
+    def test_get_uses_two_queries(self):
+        response, queries = self.recipe_queries()
+        self.assertEqual(len(queries), 2, queries)
+        self.assertContains(response, 'Ingredient 7')
+        self.assertContains(response, '8 cups')
+
+    def test_chart_post_uses_the_same_two_queries(self):
+        for chart_type, _ in CHART_CHOICES:
+            response, queries = self.recipe_queries('post', chart_type=chart_type)
+            self.assertEqual(len(queries), 2, queries)
+            # The digest from the in-memory rows matches the chart endpoint's
+            self.assertEqual(
+                response.context['chart'],
+                chart_url(self.recipe.pk, chart_type, chart_rows(self.recipe.pk)),
+            )
+
+    def test_unknown_recipe_is_404(self):
+        self.assertEqual(self.client.get('/recipe/999999').status_code, 404)
+
+
+# ============================================
+# REQUEST TIMING MIDDLEWARE TESTS
+# ============================================
+
+class RequestTimingTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.test_user = User.objects.create_user(username='testuser', password='testpass123')
+        cls.recipe = Recipe.objects.create(name="Bread", user=cls.test_user, description="Test", instructions="Test")
+        flour = Ingredient.objects.create(name="Flour", calories=100, price=1.25, supplier="Store")
+        RecipeIngredient.objects.create(recipe=cls.recipe, ingredient=flour, quantity="2 cups")
+
+    def setUp(self):
+        self.client.force_login(self.test_user)
+
+    def middleware(self, view, **settings):
+        with self.settings(**settings):
+            return RequestTimingMiddleware(view)
+
+    def test_server_timing_header(self):
+        with self.assertNoLogs('jangorecipes.timing'):
+            response = self.client.get('/')
+        metrics = {metric.split(';')[0]: metric for metric in response['Server-Timing'].split(', ')}
+        self.assertEqual(set(metrics), {'total', 'db', 'tpl'})
+        self.assertRegex(metrics['db'], r'^db;dur=[\d.]+;desc="\d+ queries"$')
+
+        response = self.client.get(self.recipe.get_absolute_url())
+        self.assertIn('tpl;dur=', response['Server-Timing'])
+
+    def test_chart_render_time(self):
+        get_chart_cache().clear()
+        response = self.client.get(f'/recipe/{self.recipe.pk}/chart/prices.png')
+        self.assertIn('chart;dur=', response['Server-Timing'])
+        # Served from the cache the second time
+        response = self.client.get(f'/recipe/{self.recipe.pk}/chart/prices.png')
+        self.assertNotIn('chart;dur=', response['Server-Timing'])
+
+    def test_repeated_queries_are_logged(self):
+        def n_plus_one(request):
+            for recipe in Recipe.objects.all():
+                for _ in range(12):
+                    recipe.recipe_ingredients.count()
+            return HttpResponse()
+
+        middleware = self.middleware(n_plus_one, REQUEST_TIMING_REPEATED_QUERIES=10)
+        with self.assertLogs('jangorecipes.timing', 'WARNING') as logs:
+            response = middleware(RequestFactory().get('/loop'))
+        self.assertIn('db;dur=', response['Server-Timing'])
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['reasons'], ['repeated_queries'])
+        self.assertEqual(record['path'], '/loop')
+        self.assertEqual(record['queries'], 13)
+        self.assertEqual(record['repeated_queries'][0]['count'], 12)
+        self.assertIn('COUNT(*)', record['repeated_queries'][0]['sql'])
+
+    def test_thresholds(self):
+        def view(request):
+            list(Recipe.objects.all())
+            return HttpResponse()
+
+        with self.assertLogs('jangorecipes.timing', 'WARNING') as logs:
+            self.middleware(view, REQUEST_TIMING_SLOW_MS=0, REQUEST_TIMING_MAX_QUERIES=0)(RequestFactory().get('/'))
+        self.assertEqual(json.loads(logs.records[0].getMessage())['reasons'], ['slow', 'queries'])
+
+        with self.assertRaises(MiddlewareNotUsed):
+            self.middleware(view, REQUEST_TIMING=False)
+
+    def test_sql_shape_collapses_in_lists(self):
+        self.assertEqual(
+            sql_shape('SELECT 1 WHERE id IN (%s, %s, %s)'),
+            sql_shape('SELECT 1 WHERE id IN (%s,%s)'),
+        )
+
+
+# ============================================
+# SYNTHETIC DATA AND BENCHMARK COMMAND TESTS
+# ============================================
+
+class SeedCatalogTest(TestCase):
+
+    def seed(self, **options):
+        options = {'recipes': 30, 'ingredients': 20, 'users': 2, 'batch_size': 7, **options}
+        call_command('seed_catalog', stdout=StringIO(), **options)
+
+    def test_seeds_consistent_catalog(self):
+        self.seed()
+        self.assertEqual(Recipe.objects.count(), 30)
+        self.assertEqual(Ingredient.objects.count(), 20)
+        recipe = Recipe.objects.order_by('pk').first()
+        links = recipe.recipe_ingredients.all()
+        self.assertTrue(3 <= len(links) <= 12)
+        # Everything the signal handlers normally maintain is in place
+        self.assertEqual(recipe.ingredient_count, len(links))
+        self.assertEqual(recipe.summary.total_calories, sum(link.ingredient.calories for link in links))
+        for link in links:
+            self.assertEqual((link.amount, link.unit), parse_quantity(link.quantity))
+        self.assertIn(recipe.pk, [hit.recipe_id for hit in search.search_recipes(recipe.name.split(' #')[0])])
+
+    def test_same_seed_same_catalog(self):
+        self.seed()
+        first = list(RecipeIngredient.objects.order_by('pk').values_list('recipe__name', 'ingredient__name', 'quantity'))
+        with self.assertRaisesMessage(CommandError, 'already exists'):
+            self.seed()
+        self.seed(clear=True)
+        second = list(RecipeIngredient.objects.order_by('pk').values_list('recipe__name', 'ingredient__name', 'quantity'))
+        self.assertEqual(first, second)
+        self.assertEqual(Recipe.objects.count(), 30)
+        self.assertEqual(RecipeSummary.objects.count(), 30)
+
+    def test_clear_keeps_real_data(self):
+        user = User.objects.create_user(username='cook', password='testpass123')
+        Recipe.objects.create(name="Bread", user=user, description="Test", instructions="Test")
+        self.seed()
+        self.seed(clear=True, recipes=5)
+        self.assertEqual(Recipe.objects.count(), 6)
+        self.assertTrue(Recipe.objects.filter(name="Bread").exists())
+
+    def test_benchmark_views(self):
+        self.seed()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        output = os.path.join(directory, 'bench.json')
+        call_command(
+            'benchmark_views', iterations=3, warmup=0, targets=['home', 'detail', 'chart_data'],
+            output=output, stderr=StringIO(),
+        )
+        with open(output) as report_file:
+            report = json.load(report_file)
+        self.assertEqual(report['meta']['recipes'], 30)
+        self.assertEqual(set(report['results']), {'home', 'detail', 'chart_data'})
+        for result in report['results'].values():
+            self.assertEqual(result['status'], [200])
+            self.assertLessEqual(result['p50_ms'], result['p95_ms'])
+            self.assertLessEqual(result['p95_ms'], result['p99_ms'])
+            self.assertGreater(result['queries'], 0)
+
+
+# ============================================
+# BULK IMPORT TESTS
+# ============================================
+
+class ImportRecipesTest(TestCase):
+
+    csv_text = (
+        'recipe_id,recipe_name,cooking_time,description,instructions,ingredient_name,supplier,calories,price,quantity\n'
+        '1,Bread,60,Crusty loaf,Knead and bake,Flour,Mill,364,1.20,500 g\n'
+        '1,Bread,60,Crusty loaf,Knead and bake,Salt,Store,0,0.10,1 tsp\n'
+        '2,Toast,5,Quick,Toast it,Flour,Mill,364,1.20,2 slices\n'
+        '3,Water,0,Plain,Pour,,,,,\n'
+        '4,Broken,abc,Bad,Bad,Flour,Mill,364,1.20,1 cup\n'
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='importer', password='testpass123')
+        cls.salt = Ingredient.objects.create(name="Salt", calories=0, price=Decimal('0.10'), supplier="Store")
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def write(self, name, text):
+        path = os.path.join(self.directory, name)
+        opener = gzip.open if name.endswith('.gz') else open
+        with opener(path, 'wt', encoding='utf-8') as file:
+            file.write(text)
+        return path
+
+    def run_import(self, path, **options):
+        out, err = StringIO(), StringIO()
+        call_command('import_recipes', path, user='importer', stdout=out, stderr=err, **options)
+        return out.getvalue(), err.getvalue()
+
+    def test_csv_import(self):
+        out, err = self.run_import(self.write('catalog.csv', self.csv_text), batch_size=2)
+        self.assertIn('Imported 3 recipes and 3 ingredient links (1 new ingredients)', out)
+        self.assertIn('rows/s', out)
+        self.assertIn('line 6: cooking_time must be a whole number', err)
+
+        bread = Recipe.objects.get(name='Bread')
+        self.assertEqual(bread.user, self.user)
+        # Salt already existed (same name and supplier) and is reused
+        self.assertEqual(Ingredient.objects.filter(name='Salt').count(), 1)
+        self.assertEqual(Ingredient.objects.filter(name='Flour').count(), 1)
+        link = bread.recipe_ingredients.get(ingredient__name='Flour')
+        self.assertEqual((link.quantity, link.amount, link.unit), ('500 g', 500.0, 'g'))
+        # Derived data is refreshed even though bulk_create skips signals
+        self.assertEqual(bread.ingredient_count, 2)
+        self.assertEqual(bread.summary.total_cost, Decimal('1.30'))
+        self.assertEqual(Recipe.objects.get(name='Water').ingredient_count, 0)
+        self.assertIn(bread.pk, [hit.recipe_id for hit in search.search_recipes('crusty')])
+
+    def test_jsonl_gzip_import(self):
+        lines = [
+            {'name': 'Soup', 'cooking_time': 20, 'ingredients': [
+                {'name': 'Leek', 'supplier': 'Farm', 'calories': 61, 'price': 0.8, 'quantity': '2'},
+                {'name': 'Leek', 'supplier': 'Farm', 'calories': 61, 'price': 0.8, 'quantity': '3'},
+                {'name': 'Leek', 'supplier': 'Market', 'calories': 61, 'price': 0.9, 'quantity': '1'},
+            ]},
+            {'cooking_time': 5},
+        ]
+        text = '\n'.join(json.dumps(line) for line in lines) + '\nnot json\n'
+        out, err = self.run_import(self.write('catalog.jsonl.gz', text))
+        self.assertIn('Imported 1 recipes and 2 ingredient links (2 new ingredients)', out)
+        self.assertIn('Skipped 2 invalid records and 1 repeated ingredients', out)
+        self.assertIn('line 2: name is required', err)
+        self.assertIn('line 3: invalid JSON', err)
+
+    def test_errors(self):
+        path = self.write('catalog.csv', 'name,price\nBread,1\n')
+        with self.assertRaisesMessage(CommandError, 'missing: recipe_name'):
+            self.run_import(path)
+        with self.assertRaisesMessage(CommandError, 'pass --format'):
+            self.run_import(self.write('catalog.txt', ''))
+        with self.assertRaisesMessage(CommandError, 'Stopped after 1 invalid records'):
+            self.run_import(self.write('bad.jsonl', '{}\n{}\n'), max_errors=1)
+
+    def test_invalid_prices_are_bad_records(self):
+        lines = [
+            {'name': f'Soup {number}', 'ingredients': [{'name': 'Leek', 'supplier': 'Farm', 'price': price}]}
+            for number, price in enumerate(['nan', 'sNaN', 'Infinity', -5, 1000, '2.50'])
+        ]
+        out, err = self.run_import(self.write('prices.jsonl', '\n'.join(json.dumps(line) for line in lines)))
+        self.assertIn('Imported 1 recipes', out)
+        self.assertIn("line 1: price must be a number, not 'nan'", err)
+        self.assertIn("line 2: price must be a number, not 'sNaN'", err)
+        self.assertIn("line 3: price must be a number, not 'Infinity'", err)
+        self.assertIn('line 4: price -5.00 is negative', err)
+        self.assertIn('line 5: price 1000.00 does not fit the price column', err)
+        self.assertEqual(Ingredient.objects.get(name='Leek').price, Decimal('2.50'))
+
+
+# ============================================
+# CATALOG EXPORT
+# ============================================
+
+class ExportRecipesTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='cook', password='testpass123')
+        cls.staff = User.objects.create_user(username='staff', password='testpass123', is_staff=True)
+        flour = Ingredient.objects.create(name="Flour", calories=364, price=Decimal('1.20'), supplier="Mill")
+        salt = Ingredient.objects.create(name="Salt", calories=0, price=Decimal('0.10'), supplier="Store, Ltd")
+        for i in range(5):
+            recipe = Recipe.objects.create(
+                name=f"Bread {i}", user=cls.user, cooking_time=60,
+                description="Crusty, \"round\" loaf", instructions="Knead\nBake",
+            )
+            RecipeIngredient.objects.create(recipe=recipe, ingredient=flour, quantity="1 1/2 cups")
+            if i % 2:
+                RecipeIngredient.objects.create(recipe=recipe, ingredient=salt, quantity="1 tsp")
+        Recipe.objects.create(name="Water", user=cls.user, cooking_time=0, description="", instructions="")
+
+    def export(self, fmt='csv', **options):
+        out, err = StringIO(), StringIO()
+        path = os.path.join(tempfile.mkdtemp(), f'catalog.{fmt}')
+        self.addCleanup(shutil.rmtree, os.path.dirname(path), ignore_errors=True)
+        call_command('export_recipes', output=path, stdout=out, stderr=err, **options)
+        return path, err.getvalue()
+
+    def assert_round_trip(self, fmt):
+        path, err = self.export(fmt)
+        self.assertIn('Exported', err)
+        User.objects.create_user(username='copy')
+        call_command('import_recipes', path, user='copy', stdout=StringIO(), stderr=StringIO())
+        copies = Recipe.objects.filter(user__username='copy').order_by('pk')
+        originals = Recipe.objects.filter(user=self.user).order_by('pk')
+        self.assertEqual(
+            [(r.name, r.description, r.instructions, r.ingredient_count) for r in copies],
+            [(r.name, r.description, r.instructions, r.ingredient_count) for r in originals],
+        )
+        # Ingredients are matched, not duplicated
+        self.assertEqual(Ingredient.objects.count(), 2)
+
+    def test_csv_round_trip(self):
+        self.assert_round_trip('csv')
+
+    def test_jsonl_round_trip(self):
+        self.assert_round_trip('jsonl')
+
+    def test_parsed_columns(self):
+        path, _ = self.export('jsonl')
+        with open(path, encoding='utf-8') as file:
+            records = [json.loads(line) for line in file]
+        self.assertEqual(len(records), 6)
+        self.assertEqual(records[0]['user'], 'cook')
+        self.assertEqual(records[0]['ingredients'][0], {
+            'name': 'Flour', 'supplier': 'Mill', 'calories': 364, 'price': '1.20',
+            'quantity': '1 1/2 cups', 'amount': 1.5, 'unit': 'cup',
+        })
+        self.assertEqual(records[-1]['ingredients'], [])
+
+    def test_batched_queries(self):
+        # One streaming query for the recipes plus one prefetch per chunk
+        with CaptureQueriesContext(connection) as captured:
+            lines = list(export_catalog('csv', chunk_size=2))
+        self.assertEqual(len(captured), 1 + 3)
+        self.assertEqual(len(lines), 1 + 5 + 2 + 1)
+
+    def test_endpoint(self):
+        url = reverse('recipes:catalog_export', kwargs={'fmt': 'csv'})
+        self.client.login(username='cook', password='testpass123')
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+        self.client.login(username='staff', password='testpass123')
+        response = self.client.get(url)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertIn('attachment; filename="recipes-', response['Content-Disposition'])
+        # The header line goes out before the catalog is read
+        chunks = iter(response.streaming_content)
+        with CaptureQueriesContext(connection) as captured:
+            header = next(chunks)
+        self.assertEqual(len(captured), 0)
+        self.assertTrue(header.startswith(b'recipe_id,recipe_name,'))
+        self.assertIn(b'"Crusty, ""round"" loaf"', b''.join(chunks))
+
+        self.assertEqual(self.client.get(url.replace('.csv', '.xml')).status_code, 404)
+
+
+# ============================================
+# HOME PAGE CACHE
+# ============================================
+
+class HomePageCacheTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='cook', password='testpass123')
+        cls.staff = User.objects.create_user(username='staff', password='testpass123', is_staff=True)
+        cls.flour = Ingredient.objects.create(name="Flour", calories=364, price=Decimal('1.20'), supplier="Mill")
+        cls.recipes = []
+        for i in range(15):
+            recipe = Recipe.objects.create(name=f"Bread {i}", user=cls.user, description="T", instructions="T")
+            recipe.ingredients.add(cls.flour, through_defaults={'quantity': '1'})
+            cls.recipes.append(recipe)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_warm_page_runs_only_session_and_user_queries(self):
+        first = self.client.get('/')
+        self.assertEqual(first['X-Cache'], 'MISS')
+        with self.assertNumQueries(2):
+            second = self.client.get('/')
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertContains(second, 'Bread 0')
+        self.assertContains(second, 'name="recipe_name"')
+        # Other pages and orderings are cached separately
+        self.assertEqual(self.client.get('/?sort=cost')['X-Cache'], 'MISS')
+        self.assertEqual(self.client.get('/', {'after': self.recipes[11].pk})['X-Cache'], 'MISS')
+
+    def test_changes_invalidate_cached_pages(self):
+        self.client.get('/')
+        recipe = self.recipes[0]
+        recipe.name = "Sourdough"
+        recipe.save()
+        self.assertContains(self.client.get('/'), 'Sourdough')
+
+        self.flour.price = Decimal('2.50')
+        self.flour.save()
+        self.assertContains(self.client.get('/'), '$2.50')
+
+        recipe.recipe_ingredients.all().delete()
+        response = self.client.get('/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertContains(response, '0 kcal')
+
+        recipe.delete()
+        self.assertNotContains(self.client.get('/'), 'Sourdough')
+
+    def test_cards_are_cached_by_version(self):
+        self.client.get('/')
+        card_key = make_template_fragment_key('recipe_card', [self.recipes[0].pk, catalog_version(), ''])
+        self.assertIn('Bread 0', cache.get(card_key))
+
+    def test_stats(self):
+        self.client.get('/')
+        self.client.get('/')
+        self.client.force_login(self.staff)
+        stats = self.client.get(reverse('recipes:page_cache_stats')).json()
+        self.assertEqual(stats['catalog_version'], catalog_version())
+        self.assertGreaterEqual(stats['grid']['hits'], 1)
+        self.assertGreater(stats['grid']['hit_ratio'], 0)
+
+    def test_version_is_shared_between_workers(self):
+        # The test runner keeps it away from the development server's
+        self.assertTrue(settings.CACHES['catalog']['LOCATION'].startswith(tempfile.gettempdir()))
+        version = catalog_version()
+        # The per-process page cache does not hold the version
+        cache.clear()
+        self.assertEqual(catalog_version(), version)
+        self.assertEqual(check_version_cache(), [])
+        locmem = {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'version-test'}
+        with self.settings(CACHES={**settings.CACHES, 'catalog': locmem}):
+            self.assertEqual([error.id for error in check_version_cache()], ['recipes.E002'])
+        with self.settings(CATALOG_VERSION_CACHE='missing'):
+            self.assertEqual([error.id for error in check_version_cache()], ['recipes.E001'])
+
+
+class HomeSearchCacheTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='cook', password='testpass123')
+        cls.other = User.objects.create_user(username='other', password='testpass123')
+        cls.recipe = Recipe.objects.create(name="Banana Bread", user=cls.user, description="T", instructions="T")
+        Recipe.objects.create(name="Apple Pie", user=cls.user, description="T", instructions="T")
+        search.get_backend().rebuild()
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_search_is_a_get_request(self):
+        response = self.client.get('/', {'recipe_name': 'banana'})
+        self.assertContains(response, 'Banana Bread')
+        self.assertNotContains(response, 'Apple Pie')
+        self.assertContains(response, 'value="banana"')
+        self.assertNotContains(response, 'csrfmiddlewaretoken')
+        # Old POST forms are sent to the GET URL
+        response = self.client.post('/', {'recipe_name': 'banana bread'})
+        self.assertRedirects(response, '/?recipe_name=banana+bread#recipes', fetch_redirect_response=False)
+
+    def test_equivalent_queries_share_the_cache(self):
+        self.assertEqual(self.client.get('/', {'recipe_name': 'Banana  BREAD!'})['X-Cache'], 'MISS')
+        with self.assertNumQueries(2):
+            response = self.client.get('/', {'recipe_name': ' banana bread'})
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertContains(response, 'Banana Bread')
+        # The form still shows what this user typed
+        self.assertContains(response, 'value=" banana bread"')
+
+    def test_truncated_results_are_flagged(self):
+        Recipe.objects.create(name="Banana Cake", user=self.user, description="T", instructions="T")
+        response = self.client.get('/', {'recipe_name': 'banana'})
+        self.assertEqual(len(response.context['object_list']), 2)
+        self.assertFalse(response.context['search_truncated'])
+        self.assertNotContains(response, 'best matches')
+        cache.clear()
+        with mock.patch('recipes.views.DEFAULT_LIMIT', 1):
+            response = self.client.get('/', {'recipe_name': 'banana'})
+        self.assertEqual(len(response.context['object_list']), 1)
+        self.assertTrue(response.context['search_truncated'])
+        self.assertContains(response, 'Showing the 1 best matches')
+
+    def test_conditional_requests(self):
+        response = self.client.get('/', {'recipe_name': 'banana'})
+        etag, last_modified = response['ETag'], response['Last-Modified']
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertIn('private', response['Cache-Control'])
+
+        response = self.client.get('/', {'recipe_name': 'banana'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        response = self.client.get('/', {'recipe_name': 'banana'}, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+        # Other queries, other users and catalog changes get another ETag
+        self.assertNotEqual(self.client.get('/', {'recipe_name': 'apple'})['ETag'], etag)
+        self.client.force_login(self.other)
+        self.assertNotEqual(self.client.get('/', {'recipe_name': 'banana'})['ETag'], etag)
+        self.client.force_login(self.user)
+        self.recipe.name = "Banana Loaf"
+        self.recipe.save()
+        response = self.client.get('/', {'recipe_name': 'banana'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Banana Loaf')
+
+
+# ============================================
+# PANTRY INDEX
+# ============================================
+
+class PantryIndexTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='cook', password='testpass123')
+        def ingredient(name, supplier="Store"):
+            return Ingredient.objects.create(name=name, calories=1, price=Decimal('1.00'), supplier=supplier)
+        cls.flour = ingredient("Flour", "Mill")
+        cls.store_flour = ingredient("flour ")
+        cls.egg = ingredient("Egg")
+        cls.milk = ingredient("Milk")
+        cls.sugar = ingredient("Sugar")
+        cls.tomato = ingredient("Cherry Tomatoes")
+
+        def recipe(name, *ingredients):
+            recipe = Recipe.objects.create(name=name, user=cls.user, description="T", instructions="T")
+            recipe.ingredients.add(*ingredients, through_defaults={'quantity': '1'})
+            return recipe
+        cls.pancakes = recipe("Pancakes", cls.flour, cls.egg, cls.milk)
+        cls.cake = recipe("Cake", cls.flour, cls.store_flour, cls.egg, cls.sugar)
+        cls.salad = recipe("Salad", cls.tomato)
+
+    def setUp(self):
+        reset_pantry_index()
+        self.addCleanup(reset_pantry_index)
+
+    def search(self, text):
+        return [(match.recipe_id, match.matched, match.total) for match in get_pantry_index().search(parse_pantry(text))]
+
+    def test_parse_pantry(self):
+        self.assertEqual(parse_pantry(' Eggs,  flour;milk\n\neggs '), ['eggs', 'flour', 'milk'])
+
+    def test_ranked_by_coverage(self):
+        self.assertEqual(self.search('flour, egg, milk'), [(self.pancakes.pk, 3, 3), (self.cake.pk, 2, 3)])
+        # Same coverage and ingredient count: lower id first
+        self.assertEqual(self.search('egg'), [(self.pancakes.pk, 1, 3), (self.cake.pk, 1, 3)])
+        self.assertEqual(self.search('tomato'), [(self.salad.pk, 1, 1)])
+        self.assertEqual(self.search('cherry tom'), [(self.salad.pk, 1, 1)])
+        self.assertEqual(self.search('chocolate'), [])
+
+    def test_updates_without_queries(self):
+        get_pantry_index()
+        self.salad.ingredients.add(self.egg, through_defaults={'quantity': '2'})
+        self.pancakes.delete()
+        self.sugar.name = "Milk"
+        self.sugar.save()
+        with self.assertNumQueries(0):
+            results = self.search('milk, egg')
+        self.assertEqual(results, [(self.cake.pk, 2, 3), (self.salad.pk, 1, 2)])
+
+    def test_view(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('recipes:pantry'), {'have': 'flour, egg, milk'})
+        self.assertEqual([recipe.pk for recipe in response.context['object_list']], [self.pancakes.pk, self.cake.pk])
+        self.assertContains(response, 'You have 3 of 3 ingredients')
+        self.assertContains(response, '(67%)')
+        self.assertIn('pantry;dur=', response['Server-Timing'])
+        self.assertNotContains(self.client.get(reverse('recipes:pantry')), 'No recipe uses')
+
+
+# ============================================
+# TYPEAHEAD
+# ============================================
+
+class TypeaheadTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='cook', password='testpass123')
+        banana = Ingredient.objects.create(name="Banana", calories=89, price=Decimal('0.30'), supplier="Store")
+        bread_flour = Ingredient.objects.create(name="Bread Flour", calories=364, price=Decimal('1.20'), supplier="Mill")
+        cls.loaf = Recipe.objects.create(name="Banana Bread Loaf", user=cls.user, description="T", instructions="T")
+        cls.bread = Recipe.objects.create(name="Banana Bread", user=cls.user, description="T", instructions="T")
+        cls.split = Recipe.objects.create(name="Banana Split", user=cls.user, description="T", instructions="T")
+        cls.loaf.ingredients.add(banana, bread_flour, through_defaults={'quantity': '1'})
+        cls.bread.ingredients.add(banana, through_defaults={'quantity': '1'})
+
+    def setUp(self):
+        cache.clear()
+        reset_pantry_index()
+        reset_typeahead_index()
+        self.addCleanup(reset_pantry_index)
+        self.addCleanup(reset_typeahead_index)
+        self.client.force_login(self.user)
+
+    def names(self, query):
+        return [name for _, name in get_typeahead_index().suggest(query)]
+
+    def test_prefix_matches_any_word(self):
+        # Shortest first, then alphabetical
+        self.assertEqual(self.names('ban'), ['Banana Bread', 'Banana Split', 'Banana Bread Loaf'])
+        self.assertEqual(self.names('bre'), ['Banana Bread', 'Banana Bread Loaf'])
+        self.assertEqual(self.names('loaf BAN'), ['Banana Bread Loaf'])
+        self.assertEqual(self.names('cake'), [])
+
+    def test_updates(self):
+        get_typeahead_index()
+        self.split.name = "Banoffee Pie"
+        self.split.save()
+        self.bread.delete()
+        Recipe.objects.create(name="Bannock", user=self.user, description="T", instructions="T")
+        with self.assertNumQueries(0):
+            self.assertEqual(self.names('bann'), ['Bannock'])
+            self.assertEqual(self.names('ban'), ['Bannock', 'Banoffee Pie', 'Banana Bread Loaf'])
+            self.assertEqual(self.names('split'), [])
+
+    def test_endpoint(self):
+        url = reverse('recipes:suggest')
+        data = self.client.get(url, {'q': 'Bread'}).json()
+        self.assertEqual(data['query'], 'bread')
+        self.assertEqual(data['recipes'][0], {'name': 'Banana Bread', 'url': self.bread.get_absolute_url()})
+        self.assertEqual(data['ingredients'], [{'name': 'Bread Flour', 'recipes': 1}])
+        self.assertEqual(self.client.get(url, {'q': 'ban'}).json()['ingredients'], [{'name': 'Banana', 'recipes': 2}])
+        self.assertEqual(self.client.get(url, {'q': 'b'}).json()['recipes'], [])
+        # Warm: only the session and user are read
+        with self.assertNumQueries(2):
+            response = self.client.get(url, {'q': ' bread! '})
+        self.assertEqual(response.json(), data)
+        self.assertIn('max-age=60', response['Cache-Control'])
+
+
+# ============================================
+# TYPO-TOLERANT SEARCH
+# ============================================
+
+class FuzzySearchTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='cook', password='testpass123')
+        cls.parmesan = Ingredient.objects.create(name="Parmesan Cheese", calories=400, price=Decimal('4.00'), supplier="Deli")
+        cls.spaghetti = Recipe.objects.create(name="Spaghetti Carbonara", user=cls.user, description="T", instructions="T")
+        cls.lasagna = Recipe.objects.create(name="Vegetable Lasagna", user=cls.user, description="T", instructions="T")
+        cls.lasagna.ingredients.add(cls.parmesan, through_defaults={'quantity': '50 g'})
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def words(self):
+        return set(SearchTrigram.objects.values_list('word', flat=True))
+
+    def test_similarity(self):
+        self.assertEqual(fuzzy.trigrams('pie'), {'  p', ' pi', 'pie', 'ie '})
+        self.assertEqual(fuzzy.similarity('lasagna', 'lasagna'), 1)
+        self.assertGreater(fuzzy.similarity('lasagne', 'lasagna'), fuzzy.similarity('lasagne', 'vegetable'))
+        self.assertEqual(fuzzy.words_of(['Pie #12 with 2 eggs']), {'pie', 'with', 'eggs'})
+
+    def test_signals_keep_words_current(self):
+        self.assertTrue({'spaghetti', 'carbonara', 'vegetable', 'lasagna', 'parmesan', 'cheese'} <= self.words())
+        self.spaghetti.name = "Spaghetti Bolognese"
+        self.spaghetti.save()
+        self.assertIn('bolognese', self.words())
+        # Deletes do not look for unused words; a full refresh drops them
+        with CaptureQueriesContext(connection) as queries:
+            self.lasagna.delete()
+            self.parmesan.delete()
+        self.assertFalse([q for q in queries if 'LIKE' in q['sql']])
+        self.assertIn('lasagna', self.words())
+        refresh_recipes()
+        self.assertTrue({'carbonara', 'lasagna', 'parmesan'}.isdisjoint(self.words()))
+        self.assertTrue({'spaghetti', 'bolognese'} <= self.words())
+
+    def test_bulk_changes_through_refresh(self):
+        recipe = Recipe.objects.bulk_create([Recipe(name="Mushroom Risotto", user=self.user)])[0]
+        self.assertNotIn('risotto', self.words())
+        refresh_recipes([recipe.pk])
+        self.assertIn('risotto', self.words())
+        SearchTrigram.objects.all().delete()
+        # A full refresh clears the chart cache, the test run's temporary one
+        chart_cache = get_chart_cache()
+        self.assertFalse(os.path.realpath(chart_cache.directory).startswith(os.path.realpath(settings.MEDIA_ROOT)))
+        chart_cache.set(f'{recipe.pk}-prices', b'png')
+        refresh_recipes()
+        self.assertIn('risotto', self.words())
+        self.assertIsNone(chart_cache.get(f'{recipe.pk}-prices'))
+
+    def test_similar_words(self):
+        self.assertEqual(fuzzy.similar_words('spagetti')[0][0], 'spaghetti')
+        self.assertEqual(fuzzy.similar_words('lasagne')[0][0], 'lasagna')
+        self.assertEqual(fuzzy.similar_words('xylophone'), [])
+
+    def test_correct_query(self):
+        self.assertEqual(fuzzy.correct_query('Spagetti  CARBONARA'), 'spaghetti carbonara')
+        # Known words and prefixes of known words are left alone
+        self.assertIsNone(fuzzy.correct_query('spaghet'))
+        self.assertIsNone(fuzzy.correct_query('xylophone'))
+
+    def test_home_search_corrects_typos(self):
+        for query, recipe, corrected in [('spagetti', self.spaghetti, 'spaghetti'), ('lasagne', self.lasagna, None)]:
+            response = self.client.get('/', {'recipe_name': query})
+            self.assertEqual(list(response.context['object_list']), [recipe])
+            self.assertEqual(response.context['corrected_query'], corrected)
+        self.assertContains(self.client.get('/', {'recipe_name': 'spagetti'}), 'Showing results for')
+        self.assertNotContains(self.client.get('/', {'recipe_name': 'spaghetti'}), 'Showing results for')
+
+    def test_rebuild_command(self):
+        SearchTrigram.objects.all().delete()
+        out = StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn('Indexed trigrams of 6 words', out.getvalue())
+        self.assertEqual(fuzzy.similar_words('carbonarra')[0][0], 'carbonara')
+
+    def test_benchmark_leaves_chart_cache_alone(self):
+        get_chart_cache().set(f'{self.lasagna.pk}-prices', b'png')
+        out = StringIO()
+        call_command('benchmark_fuzzy_search', sizes=[20], iterations=1, queries=['spagetti'], stdout=out, stderr=StringIO())
+        self.assertEqual(json.loads(out.getvalue())['curve'][0]['recipes'], 22)
+        self.assertEqual(get_chart_cache().get(f'{self.lasagna.pk}-prices'), b'png')
+        self.assertEqual(Recipe.objects.count(), 2)
+
+
+# ============================================
+# HOME FACETS
+# ============================================
+
+class HomeFacetTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='cook', password='testpass123')
+        ingredients = [
+            Ingredient.objects.create(name=f"Item {i}", calories=10, price=Decimal('1.00'), supplier="Store")
+            for i in range(12)
+        ]
+
+        def recipe(name, cooking_time, links):
+            recipe = Recipe.objects.create(
+                name=name, user=cls.user, cooking_time=cooking_time, description="T", instructions="T"
+            )
+            recipe.ingredients.add(*ingredients[:links], through_defaults={'quantity': '1'})
+            return recipe
+
+        cls.easy = recipe("Toast", 10, 2)
+        cls.medium = recipe("Quick Stew", 20, 7)
+        cls.intermediate = recipe("Slow Stew", 45, 3)
+        cls.hard = recipe("Roast Dinner", 90, 12)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def counts(self, response, name):
+        facet = next(facet for facet in response.context['facets'] if facet['name'] == name)
+        return {option['key']: option['count'] for option in facet['options']}
+
+    def test_difficulty_column_matches_property(self):
+        for recipe in Recipe.objects.all():
+            self.assertEqual(recipe.difficulty_level, recipe.difficulty)
+        Recipe.objects.filter(pk=self.hard.pk).update(cooking_time=5)
+        self.assertEqual(Recipe.objects.get(pk=self.hard.pk).difficulty_level, 'Medium')
+
+    def test_filtering(self):
+        def names(params):
+            return [recipe.name for recipe in self.client.get('/', params).context['object_list']]
+
+        self.assertEqual(names({'difficulty': 'Easy'}), ['Toast'])
+        self.assertEqual(names({'difficulty': ['Easy', 'Hard']}), ['Toast', 'Roast Dinner'])
+        self.assertEqual(names({'time': '15-30', 'ingredients': 'some'}), ['Quick Stew'])
+        self.assertEqual(names({'time': 'over-60', 'ingredients': 'few'}), [])
+        # Unknown values are ignored
+        self.assertEqual(len(names({'difficulty': 'Impossible'})), 4)
+        self.assertEqual(names({'recipe_name': 'stew', 'ingredients': 'few'}), ['Slow Stew'])
+
+    def test_counts_leave_out_own_facet(self):
+        response = self.client.get('/', {'difficulty': 'Easy'})
+        self.assertEqual(response.context['facet_total'], 1)
+        self.assertEqual(self.counts(response, 'difficulty'), {'Easy': 1, 'Medium': 1, 'Intermediate': 1, 'Hard': 1})
+        self.assertEqual(self.counts(response, 'time'), {'under-15': 1, '15-30': 0, '30-60': 0, 'over-60': 0})
+        self.assertEqual(self.counts(response, 'ingredients'), {'few': 1, 'some': 0, 'many': 0})
+        self.assertContains(response, 'value="Easy" checked')
+
+        response = self.client.get('/', {'recipe_name': 'stew'})
+        self.assertEqual(self.counts(response, 'difficulty'), {'Easy': 0, 'Medium': 1, 'Intermediate': 1, 'Hard': 0})
+
+    def test_counts_come_from_one_cached_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/', {'time': 'over-60'})
+        self.assertEqual(len([q for q in queries if 'GROUP BY' in q['sql']]), 1)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/', {'time': ['over-60', 'under-15'], 'ingredients': 'many'})
+        self.assertFalse([q for q in queries if 'GROUP BY' in q['sql']])
+        self.assertEqual(self.counts(response, 'ingredients'), {'few': 1, 'some': 0, 'many': 1})
+        self.assertEqual(response.context['facet_total'], 1)
+
+    def test_links_keep_selection(self):
+        response = self.client.get('/', {'difficulty': 'Hard', 'sort': 'cost'})
+        self.assertContains(response, 'href="?difficulty=Hard&amp;sort=calories#recipes"')
+        self.assertContains(response, '<input type="hidden" name="sort" value="cost">', html=True)
+
+    def test_queries_use_indexes(self):
+        with CaptureQueriesContext(connection) as queries:
+            facet_groups(Recipe.objects.all())
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + queries[0]['sql'])
+            self.assertIn('COVERING INDEX recipe_time_ingredients_idx', str(cursor.fetchall()))
+        page = Recipe.objects.filter(facet_filter({'difficulty': ('Easy',)})).filter(pk__gt=0).order_by('pk')[:13]
+        self.assertIn('recipe_difficulty_idx', page.explain())
+
+
+# ============================================
+# QUERY PLAN AUDIT
+# ============================================
+
+class QueryPlanAuditTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(username='cook', password='testpass123')
+        tomato = Ingredient.objects.create(name="Tomato", calories=20, price=Decimal('0.50'), supplier="Farm")
+        for i in range(3):
+            recipe = Recipe.objects.create(
+                name=f"Chicken Soup {i}", user=user, cooking_time=10 * (i + 1), description="T", instructions="T"
+            )
+            recipe.ingredients.add(tomato, through_defaults={'quantity': '1'})
+
+    def test_full_scans(self):
+        sql = 'SELECT "recipes_recipe"."id" FROM "recipes_recipe" WHERE "recipes_recipe"."id" IN (SELECT U0."recipe_id" FROM "recipes_recipeingredient" U0)'
+        plan = [
+            (2, 0, 0, 'SCAN recipes_recipe'),
+            (3, 0, 0, 'LIST SUBQUERY 1'),
+            (5, 3, 0, 'SCAN U0 USING INDEX recipes_recipeingredient_recipe_id'),
+            (8, 0, 0, 'SCAN recipes_recipe_fts VIRTUAL TABLE INDEX 0:M1'),
+            (9, 0, 0, 'SCAN recipes_recipe USING COVERING INDEX recipe_time_ingredients_idx'),
+            (10, 0, 0, 'SEARCH recipes_recipe USING INTEGER PRIMARY KEY (rowid=?)'),
+        ]
+        self.assertEqual(full_scans(sql, plan), ['recipes_recipe', 'recipes_recipeingredient'])
+        # Reading stops at the limit unless every row has to be sorted first
+        limited = [(2, 0, 0, 'SCAN recipes_recipe'), (4, 0, 0, 'USE TEMP B-TREE FOR RIGHT PART OF ORDER BY')]
+        self.assertEqual(full_scans(sql + ' LIMIT 13', limited), [])
+        limited.append((5, 0, 0, 'USE TEMP B-TREE FOR ORDER BY'))
+        self.assertEqual(full_scans(sql + ' LIMIT 13', limited), ['recipes_recipe'])
+
+    def test_command_audits_every_page(self):
+        out = StringIO()
+        call_command('audit_query_plans', query='soup', stdout=out, verbosity=2)
+        output = out.getvalue()
+        for page in ('home_sorted', 'search_misspelt', 'detail', 'admin_recipes_filtered', 'admin_ingredients'):
+            self.assertRegex(output, rf'{page} +\d+ queries  ok')
+        self.assertIn('SCAN recipes_recipesummary USING INDEX summary_cost_idx', output)
+        self.assertIn('No full scans of tables with 1000 rows or more', output)
+        self.assertFalse(User.objects.filter(username='query-plan-audit').exists())
+
+    def test_command_reports_full_scans(self):
+        with mock.patch('recipes.management.commands.audit_query_plans.full_scans', return_value=['recipes_recipe']):
+            with self.assertRaisesMessage(CommandError, 'home: full scan of recipes_recipe (3 rows)'):
+                call_command('audit_query_plans', min_rows=1, stdout=StringIO())
+            call_command('audit_query_plans', min_rows=4, stdout=StringIO())
+
@@ -0,0 +1,143 @@
+"""
+Resized variants of recipe photos.
+
+Uploads are kept as they are, and every width in RECIPE_IMAGE_WIDTHS is
+also saved in WebP and JPEG (WebP is skipped when Pillow was built without
+it). Variant names contain a hash of the source image, so they never change
+for the same photo and can be cached forever. A tiny blurred placeholder
+(LQIP) is inlined as a data URI and shown while the real image loads.
+
+The result is stored in Recipe.pic_variants:
+
+    {
+        'source': 'recipe_pics/bread.png',     # pic.name the variants are for
+        'width': 1024, 'height': 1536,         # size of the source image
+        'placeholder': 'data:image/jpeg;base64,...',
+        'webp': [[320, 'recipe_pics/variants/ab12...-320.webp'], ...],
+        'jpeg': [[320, 'recipe_pics/variants/ab12...-320.jpg'], ...],
+    }
+"""
+import base64
+import hashlib
+import logging
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WIDTHS = (320, 640, 1024)
+VARIANT_DIR = 'recipe_pics/variants'
+PLACEHOLDER_WIDTH = 16
+
+# Pillow format name, file extension and save options of each output format
+FORMATS = {
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+
+def image_widths():
+    return tuple(sorted(getattr(settings, 'RECIPE_IMAGE_WIDTHS', DEFAULT_WIDTHS)))
+
+
+def output_formats():
+    """Formats to write, best first; WebP only if this Pillow can encode it"""
+    from PIL import features
+    formats = ['jpeg']
+    if features.check('webp'):
+        formats.insert(0, 'webp')
+    return formats
+
+
+def _encode(image, fmt):
+    pil_format, _, options = FORMATS[fmt]
+    buffer = BytesIO()
+    image.save(buffer, pil_format, **options)
+    return buffer.getvalue()
+
+
+def _resize(image, width):
+    from PIL import Image
+    height = max(1, round(image.height * width / image.width))
+    return image.resize((width, height), Image.Resampling.LANCZOS)
+
+
+def placeholder_data_uri(image):
+    """A PLACEHOLDER_WIDTH px wide JPEG of the image as a data: URI (a few hundred bytes)"""
+    data = _encode(_resize(image, PLACEHOLDER_WIDTH), 'jpeg')
+    return 'data:image/jpeg;base64,' + base64.b64encode(data).decode('ascii')
+
+
+def build_variants(field_file):
+    """
+    Write the resized variants of an ImageField file to its storage and
+    return the description to store in pic_variants. Files that already
+    exist are reused. Raises OSError if the image cannot be read.
+    """
+    from PIL import Image, ImageOps
+
+    storage = field_file.storage
+    with field_file.open('rb') as source:
+        data = source.read()
+    digest = hashlib.sha256(data).hexdigest()[:16]
+
+    with Image.open(BytesIO(data)) as opened:
+        # Apply the camera's EXIF rotation, and flatten transparency for JPEG
+        image = ImageOps.exif_transpose(opened).convert('RGB')
+
+    # Never upscale: widths above the original collapse into one full-size variant
+    widths = sorted({min(width, image.width) for width in image_widths()})
+    variants = {
+        'source': field_file.name,
+        'width': image.width,
+        'height': image.height,
+        'placeholder': placeholder_data_uri(image),
+    }
+    for fmt in output_formats():
+        extension = FORMATS[fmt][1]
+        variants[fmt] = []
+        for width in widths:
+            name = f'{VARIANT_DIR}/{digest}-{width}.{extension}'
+            if not storage.exists(name):
+                resized = image if width == image.width else _resize(image, width)
+                name = storage.save(name, ContentFile(_encode(resized, fmt)))
+            variants[fmt].append([width, name])
+    return variants
+
+
+def safe_build_variants(field_file):
+    """build_variants() that logs unreadable images and returns no variants"""
+    try:
+        return build_variants(field_file)
+    except (OSError, ValueError) as error:
+        # Pillow's UnidentifiedImageError is an OSError
+        logger.warning('Could not build variants of %s: %s', field_file.name, error)
+        return {'source': field_file.name}
+
+
+def picture_context(field_file, variants):
+    """
+    What templates need to render a <picture>: srcset strings per format,
+    the fallback src, the intrinsic size and the placeholder. Falls back to
+    the original upload when no variants exist.
+    """
+    if not field_file:
+        return None
+    if variants.get('source') != field_file.name or not variants.get('jpeg'):
+        return {'src': field_file.url}
+    storage = field_file.storage
+
+    def srcset(fmt):
+        return ', '.join(f'{storage.url(name)} {width}w' for width, name in variants.get(fmt, []))
+
+    smallest = variants['jpeg'][0]
+    return {
+        'src': storage.url(smallest[1]),
+        'webp_srcset': srcset('webp'),
+        'jpeg_srcset': srcset('jpeg'),
+        'width': smallest[0],
+        'height': round(variants['height'] * smallest[0] / variants['width']),
+        'placeholder': variants['placeholder'],
+    }
@@ -0,0 +1,193 @@
+"""
+In-process prefix index for search box suggestions.
+
+Recipe names are split into lowercase words. The distinct words are kept in
+a sorted list, and every word has the recipes containing it sorted by rank:
+shorter names first, since they complete what was typed most closely (the
+catalog has no usage counts for recipes). A prefix is a bisect into the
+sorted words, then a merge of the rank-sorted runs of the words it covers,
+stopping after `limit` recipes.
+
+Ingredient suggestions come from the "cook with what I have" index
+(recipes.pantry), which already knows every ingredient name in use and how
+many recipes use it; the most used come first.
+
+Like the pantry index it lives in each process, is built on first use, is
+kept current by recipes.signals and is rebuilt TYPEAHEAD_INDEX_MAX_AGE
+seconds after it was built, to pick up changes made by other processes.
+"""
+import heapq
+import threading
+import time
+from bisect import bisect_left, insort
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from .models import Recipe
+from .search import search_terms
+
+DEFAULT_MAX_AGE = 600
+DEFAULT_LIMIT = 8
+# Shorter prefixes match too much of the catalog to be useful
+MIN_PREFIX = 2
+
+
+def name_words(name):
+    return sorted({word.lower() for word in search_terms(name)})
+
+
+def _rank(name):
+    return (len(name), name.lower())
+
+
+class TypeaheadIndex:
+    """Sorted word list over recipe names. Safe to share between threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Sorted distinct words, and word -> sorted [(rank, recipe id)]
+        self.words = []
+        self.postings = {}
+        self.names = {}
+        self.built_at = None
+
+    def build(self):
+        postings = {}
+        names = {}
+        for pk, name in Recipe.objects.values_list('pk', 'name').iterator(chunk_size=10000):
+            names[pk] = name
+            rank = _rank(name)
+            for word in name_words(name):
+                postings.setdefault(word, []).append((rank, pk))
+        for run in postings.values():
+            run.sort()
+        with self._lock:
+            self.words = sorted(postings)
+            self.postings = postings
+            self.names = names
+            self.built_at = time.monotonic()
+
+    def _remove(self, pk):
+        # Caller holds the lock
+        name = self.names.pop(pk, None)
+        if name is None:
+            return
+        entry = (_rank(name), pk)
+        for word in name_words(name):
+            run = self.postings[word]
+            del run[bisect_left(run, entry)]
+            if not run:
+                del self.postings[word]
+                del self.words[bisect_left(self.words, word)]
+
+    def _add(self, pk, name):
+        # Caller holds the lock
+        self.names[pk] = name
+        entry = (_rank(name), pk)
+        for word in name_words(name):
+            run = self.postings.get(word)
+            if run is None:
+                self.postings[word] = [entry]
+                insort(self.words, word)
+            else:
+                insort(run, entry)
+
+    def update_recipe(self, pk, name):
+        with self._lock:
+            if self.names.get(pk) != name:
+                self._remove(pk)
+                self._add(pk, name)
+
+    def remove_recipe(self, pk):
+        with self._lock:
+            self._remove(pk)
+
+    def update_recipes(self, recipe_ids):
+        """Re-read the names of the given recipes (dropping deleted ones)"""
+        names = dict(Recipe.objects.filter(pk__in=list(recipe_ids)).values_list('pk', 'name'))
+        with self._lock:
+            for pk in recipe_ids:
+                if self.names.get(pk) != names.get(pk):
+                    self._remove(pk)
+                    if pk in names:
+                        self._add(pk, names[pk])
+
+    def suggest(self, query, limit=DEFAULT_LIMIT):
+        """
+        (recipe id, name) of the best ranked recipes that have a word
+        starting with each word of `query`
+        """
+        terms = name_words(query)
+        if not terms:
+            return []
+        # Walk the most selective word; check the others per recipe
+        terms.sort(key=len, reverse=True)
+        prefix, others = terms[0], terms[1:]
+        results = []
+        with self._lock:
+            start = bisect_left(self.words, prefix)
+            end = bisect_left(self.words, prefix + '\uffff', start)
+            runs = [self.postings[word] for word in self.words[start:end]]
+            seen = set()
+            for _, pk in heapq.merge(*runs):
+                if pk in seen:
+                    continue
+                seen.add(pk)
+                name = self.names[pk]
+                if others:
+                    words = name_words(name)
+                    if not all(any(word.startswith(term) for word in words) for term in others):
+                        continue
+                results.append((pk, name))
+                if len(results) >= limit:
+                    break
+        return results
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_typeahead_index():
+    """Return this process's index, building it on first use or when too old"""
+    global _index
+    max_age = getattr(settings, 'TYPEAHEAD_INDEX_MAX_AGE', DEFAULT_MAX_AGE)
+    index = _index
+    if index is None or (max_age is not None and time.monotonic() - index.built_at > max_age):
+        with _index_lock:
+            if _index is index:
+                index = TypeaheadIndex()
+                index.build()
+                _index = index
+            index = _index
+    return index
+
+
+def update_typeahead_index(recipe):
+    """Index a saved recipe's name, if this process has an index"""
+    if _index is not None and 'name' not in recipe.get_deferred_fields():
+        _index.update_recipe(recipe.pk, recipe.name)
+
+
+def update_typeahead_recipes(recipe_ids):
+    if _index is not None:
+        for start in range(0, len(recipe_ids), 500):
+            _index.update_recipes(recipe_ids[start:start + 500])
+
+
+def remove_from_typeahead_index(recipe_id):
+    if _index is not None:
+        _index.remove_recipe(recipe_id)
+
+
+def reset_typeahead_index():
+    global _index
+    _index = None
+
+
+@receiver(setting_changed)
+def reset_on_setting_change(setting, **kwargs):
+    if setting == 'TYPEAHEAD_INDEX_MAX_AGE':
+        reset_typeahead_index()
@@ -1,9 +1,23 @@
 from django.urls import path
 from .views import Home
 from .views import Details
+from .views import Pantry
+from .views import suggest
+from .views import chart_cache_stats
+from .views import page_cache_stats
+from .views import chart_image
+from .views import chart_data
+from .views import catalog_export
 
 app_name = 'recipes'
 urlpatterns = [
    path('', Home.as_view(), name='home'),
+   path('pantry', Pantry.as_view(), name='pantry'),
+   path('suggest', suggest, name='suggest'),
    path('recipe/<int:id>', Details, name='detail'),
+   path('recipe/<int:id>/chart/<slug:chart>.<str:fmt>', chart_image, name='chart'),
+   path('recipe/<int:id>/chart.json', chart_data, name='chart_data'),
+   path('charts/cache-stats', chart_cache_stats, name='chart_cache_stats'),
+   path('cache-stats', page_cache_stats, name='page_cache_stats'),
+   path('catalog/export.<str:fmt>', catalog_export, name='catalog_export'),
 ]  
\ No newline at end of file
@@ -1,86 +1,175 @@
-from io import BytesIO 
+from io import BytesIO
 import base64
-import matplotlib.pyplot as plt
-from fractions import Fraction
-import re
+from contextlib import contextmanager
+import math
 
-def get_graph():
-   #create a BytesIO buffer for the image
-   buffer = BytesIO()         
+#columns a chart is drawn from, in values_list order. amount is the number
+#parsed from RecipeIngredient.quantity when the row was saved
+CHART_FIELDS = ('ingredient__name', 'ingredient__calories', 'ingredient__price', 'amount')
+
+#pie slice size for quantities without a number, e.g. "a pinch"
+DEFAULT_AMOUNT = 1.0
+
+#one RecipeIngredient (with its ingredient loaded) as a values_list(*CHART_FIELDS)
+#tuple, so chart data can be built from rows already in memory
+def chart_row(link, fields=CHART_FIELDS):
+   row = []
+   for field in fields:
+       value = link
+       for attr in field.split('__'):
+           value = getattr(value, attr)
+       row.append(value)
+   return tuple(row)
+
+#small column-oriented container for chart data. Reading data['column']
+#returns a NumPy array, the same way get_chart used to read a DataFrame,
+#without the cost of building a DataFrame for a handful of rows
+class ChartData:
+   #NumPy dtype of each column; None keeps Python objects (str/Decimal)
+   dtypes = {
+       'ingredient__name': None,
+       'ingredient__calories': 'int64',
+       'ingredient__price': 'float64',
+       'amount': 'float64',
+   }
+
+   def __init__(self, columns):
+       self.columns = columns
+
+   #rows: tuples from values_list(*fields)
+   @classmethod
+   def from_rows(cls, rows, fields=CHART_FIELDS):
+       import numpy as np
+       size = len(rows)
+       columns = {}
+       for index, field in enumerate(fields):
+           dtype = cls.dtypes.get(field)
+           if dtype is None:
+               column = np.empty(size, dtype=object)
+               column[:] = [row[index] for row in rows]
+           elif dtype == 'float64':
+               #NULL becomes NaN so nullable columns like amount still fit
+               column = np.fromiter((np.nan if row[index] is None else row[index] for row in rows), dtype=dtype, count=size)
+           else:
+               column = np.fromiter((row[index] for row in rows), dtype=dtype, count=size)
+           columns[field] = column
+       return cls(columns)
+
+   @classmethod
+   def from_queryset(cls, queryset, fields=CHART_FIELDS):
+       return cls.from_rows(list(queryset.values_list(*fields)), fields)
 
-   #create a plot with a bytesIO object as a file-like object. Set format to png
-   plt.savefig(buffer, format='png')
+   def __getitem__(self, field):
+       return self.columns[field]
 
-   #set cursor to the beginning of the stream
-   buffer.seek(0)
+   def __len__(self):
+       return len(next(iter(self.columns.values()), ()))
+
+   @property
+   def shape(self):
+       return (len(self), len(self.columns))
+
+#create a figure for one chart and release it when the block ends, even if
+#drawing fails. Nothing else keeps a reference to it, so memory is returned
+#right away instead of piling up in a global figure registry
+@contextmanager
+def chart_figure(figsize=(6,3)):
+   #matplotlib takes hundreds of milliseconds to import, so it is only loaded
+   #by the first chart a process draws, not by every worker at startup
+   from matplotlib.figure import Figure
+   #Agg (Anti-Grain Geometry) is the preferred backend to write PNG files.
+   #Figures are attached to an Agg canvas directly instead of going through
+   #pyplot, so no global backend or "current figure" state is shared between threads
+   from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+   fig=Figure(figsize=figsize)
+   FigureCanvasAgg(fig)
+   try:
+       yield fig
+   finally:
+       fig.clear()
+       fig.canvas = None
+
+def get_png(fig, format='png'):
+   #create a BytesIO buffer for the image
+   buffer = BytesIO()
+
+   #save the figure with a bytesIO object as a file-like object. Set format to
+   #png (default) or svg. Leave out the creation date so the same data always
+   #gives the same bytes
+   metadata = {'Date': None} if format == 'svg' else None
+   fig.savefig(buffer, format=format, metadata=metadata)
 
    #retrieve the content of the file
    image_png=buffer.getvalue()
 
-   #encode the bytes-like object
-   graph=base64.b64encode(image_png)
+   #free up the memory of buffer
+   buffer.close()
+
+   return image_png
+
+def get_graph(fig):
+   #encode the png bytes-like object
+   graph=base64.b64encode(get_png(fig))
 
    #decode to get the string as output
    graph=graph.decode('utf-8')
 
-   #free up the memory of buffer
-   buffer.close()
-
    #return the image/graph
    return graph
 
-#chart_type: user input o type of chart,
-#data: pandas dataframe
-def get_chart(chart_type, data, **kwargs):
-   #switch plot backend to AGG (Anti-Grain Geometry) - to write to file
-   #AGG is preferred solution to write PNG files
-   plt.switch_backend('AGG')
+#stored amounts as chart values - missing ones (None/NaN) count as DEFAULT_AMOUNT
+def chart_amounts(values):
+   return [DEFAULT_AMOUNT if value is None or math.isnan(value) else float(value) for value in values]
 
-   #specify figure size
-   fig=plt.figure(figsize=(6,3))
+#fig: figure to draw on (see chart_figure),
+#chart_type: user input o type of chart,
+#data: ChartData (or a pandas DataFrame with the same columns)
+def draw_chart(fig, chart_type, data, **kwargs):
+   ax=fig.add_subplot()
 
    #select chart_type based on user input from the form
    if chart_type == '#1':
-       (print(data))
-       plt.bar(data['ingredient__name'], data['ingredient__price'])
-       plt.xlabel('Ingredient')
-       plt.xticks(rotation=45, ha='right')
-       plt.ylabel('Price ($)')
-       plt.title('Ingredient Prices')
-       
+       ax.bar(data['ingredient__name'], data['ingredient__price'])
+       ax.set_xlabel('Ingredient')
+       ax.tick_params(axis='x', labelrotation=45)
+       for label in ax.get_xticklabels():
+           label.set_horizontalalignment('right')
+       ax.set_ylabel('Price ($)')
+       ax.set_title('Ingredient Prices')
+
    elif chart_type == '#2':
-       plt.plot(data['ingredient__name'], data['ingredient__calories'])
-       plt.xlabel('Ingredient')
-       plt.xticks(rotation=45, ha='right')
-       plt.ylabel('Calories')
-       plt.title('Ingredient Calories')
-       
+       ax.plot(data['ingredient__name'], data['ingredient__calories'])
+       ax.set_xlabel('Ingredient')
+       ax.tick_params(axis='x', labelrotation=45)
+       for label in ax.get_xticklabels():
+           label.set_horizontalalignment('right')
+       ax.set_ylabel('Calories')
+       ax.set_title('Ingredient Calories')
+
    elif chart_type == '#3':
        labels=kwargs.get('labels')
-       # Parse quantities - handles fractions like 1/4, decimals, and whole numbers
-       quantities = []
-       for qty in data['quantity']:
-           # Extract first number or fraction from string
-           match = re.search(r'(\d+/\d+|\d+\.?\d*)', str(qty))
-           if match:
-               num_str = match.group(1)
-               # Convert fraction to float
-               if '/' in num_str:
-                   quantities.append(float(Fraction(num_str)))
-               else:
-                   quantities.append(float(num_str))
-           else:
-               quantities.append(1.0)  # default if no number found
-       
-       plt.pie(quantities, autopct='%1.1f%%')
-       plt.title('Ingredient Quantity Distribution')
-       plt.legend(labels, loc='upper right', bbox_to_anchor=(1.7, 0.9))
+       quantities = chart_amounts(data['amount'])
+
+       ax.pie(quantities, autopct='%1.1f%%')
+       ax.set_title('Ingredient Quantity Distribution')
+       ax.legend(labels, loc='upper right', bbox_to_anchor=(1.7, 0.9))
    else:
        print ('unknown chart type')
 
    #specify layout details
-   plt.tight_layout()
+   fig.tight_layout()
+
+#same arguments as draw_chart without fig, returns the image bytes
+#format: 'png' or 'svg'
+def render_chart(chart_type, data, format='png', **kwargs):
+   with chart_figure() as fig:
+       draw_chart(fig, chart_type, data, **kwargs)
+       return get_png(fig, format=format)
 
-   #render the graph to file
-   chart =get_graph() 
-   return chart
\ No newline at end of file
+#same arguments as draw_chart without fig, returns the PNG as a base64 string
+def get_chart(chart_type, data, **kwargs):
+   with chart_figure() as fig:
+       draw_chart(fig, chart_type, data, **kwargs)
+       chart = get_graph(fig)
+   return chart
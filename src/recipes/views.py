@@ -1,95 +1,452 @@
-from django.shortcuts import render, get_object_or_404
+from django.conf import settings
+from django.shortcuts import get_object_or_404, redirect, reverse
+from django.template.loader import render_to_string
+from django.template.response import TemplateResponse
+from django.utils.safestring import mark_safe
+from django.core.cache import cache
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.http import http_date, urlencode
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.db.models import Case, F, IntegerField, Value, When
 from .models import Recipe
 from .models import Ingredient
+from .models import RecipeIngredient
 from django.views.generic import ListView
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.decorators import login_required
-from .forms import RecipeSearchForm, ChartForm
-import pandas as pd
-from pandas import DataFrame
-from .utils import get_chart
+from django.contrib.admin.views.decorators import staff_member_required
+from .forms import RecipeSearchForm, ChartForm, PantryForm, CHART_SLUGS
+from .utils import CHART_FIELDS, ChartData, chart_amounts, chart_row, render_chart
+from .render_pool import ChartRenderError, get_render_pool
+from .fuzzy import search_with_corrections
+from .search import DEFAULT_LIMIT, normalize_query
+from .facets import facet_counts, facet_filter, facet_groups, facet_querystring, parse_facets
+from .pagination import keyset_paginate
+from .chart_cache import chart_digest, chart_key, get_chart_cache
+from .catalog_io import CONTENT_TYPES, export_catalog
+from .pantry import get_pantry_index, parse_pantry
+from .typeahead import MIN_PREFIX, get_typeahead_index
+from .page_cache import (
+    cache_timeout, catalog_last_modified, catalog_version, facets_key, grid_key, grid_stats, page_etag, suggest_key,
+)
+from jangorecipes.middleware import timing
 
 # Create your views here.
 class Home(LoginRequiredMixin, ListView):
     model = Recipe
     template_name = 'recipes/home.html'
+    paginate_by = 12
+    # The cards only show these fields; skip the large text columns
+    card_fields = (
+        'id', 'name', 'cooking_time', 'ingredient_count', 'pic', 'pic_variants',
+        'summary__total_calories', 'summary__total_cost',
+    )
+    # ?sort= values and the RecipeSummary column each one orders by
+    sort_fields = {
+        'calories': 'total_calories',
+        'cost': 'total_cost',
+    }
+    
+    def get_sort(self):
+        """The requested ?sort= value ('cost', '-calories', ...) or None"""
+        sort = self.request.GET.get('sort', '')
+        return sort if sort.lstrip('-') in self.sort_fields else None
+    
+    def get_search_query(self):
+        """The normalized ?recipe_name= search query, or None when not searching"""
+        recipe_name = self.request.GET.get('recipe_name', '')
+        return normalize_query(recipe_name) if recipe_name.strip() else None
+    
+    def get_facets(self):
+        """The selected facet options, see recipes.facets"""
+        return parse_facets(self.request.GET)
+    
+    def get_form(self):
+        if 'recipe_name' in self.request.GET:
+            return RecipeSearchForm(self.request.GET)
+        return RecipeSearchForm()
     
     def get_queryset(self):
         """
         Override get_queryset to filter recipes based on search input.
-        If there's a POST request with a recipe name, filter the queryset.
-        Otherwise, return all recipes.
+        If there's a ?recipe_name= search query, return the matching
+        recipes in ranked order (see recipes.search); when nothing
+        matches, the misspelt words are corrected (see recipes.fuzzy).
+        Otherwise, return all recipes, sorted by ?sort= if given.
+        Either way only the recipes in the selected facets are kept.
+        The totals shown on the cards come from RecipeSummary in the same query.
         """
-        queryset = super().get_queryset()
+        queryset = super().get_queryset().select_related('summary').only(*self.card_fields)
+        self.search_hits = None
+        self.search_truncated = False
+        self.corrected_query = None
+        self.sort = None
+        self.facets = self.get_facets()
+        # What the facet counts are counted over
+        self.facet_base = Recipe.objects.all()
+        
+        query = self.get_search_query()
+        if query is not None:
+            # One hit more than is shown tells whether there were more matches
+            hits, self.corrected_query = search_with_corrections(query, limit=DEFAULT_LIMIT + 1)
+            self.search_truncated = len(hits) > DEFAULT_LIMIT
+            hits = hits[:DEFAULT_LIMIT]
+            self.search_hits = {hit.recipe_id: hit for hit in hits}
+            ranking = Case(
+                *[When(pk=pk, then=Value(position)) for position, pk in enumerate(self.search_hits)],
+                output_field=IntegerField(),
+            )
+            self.facet_base = Recipe.objects.filter(pk__in=list(self.search_hits))
+            queryset = queryset.filter(pk__in=list(self.search_hits)).filter(facet_filter(self.facets)).order_by(ranking)
+            return queryset
         
-        if self.request.method == 'POST':
-            recipe_name = self.request.POST.get('recipe_name')
-            if recipe_name:
-                queryset = queryset.filter(name__icontains=recipe_name)
+        queryset = queryset.filter(facet_filter(self.facets))
         
+        self.sort = self.get_sort()
+        if self.sort:
+            # Every recipe has a summary row (see recipes.signals). Joining
+            # them as required lets the database walk the summary index in
+            # sort order instead of sorting the whole catalog.
+            field = self.sort_fields[self.sort.lstrip('-')]
+            queryset = queryset.filter(summary__isnull=False).annotate(sort_value=F(f'summary__{field}'))
         return queryset
     
+    def get_paginate_by(self, queryset):
+        # Search results are a single ranked page of at most DEFAULT_LIMIT hits
+        if self.search_hits is not None:
+            return None
+        return self.paginate_by
+    
+    def paginate_queryset(self, queryset, page_size):
+        """
+        Use keyset pagination instead of Django's OFFSET-based Paginator,
+        so deep pages cost the same as the first one.
+        """
+        page = keyset_paginate(
+            queryset,
+            page_size,
+            after=self.request.GET.get('after'),
+            before=self.request.GET.get('before'),
+            order_by=('-sort_value' if self.sort.startswith('-') else 'sort_value') if self.sort else 'pk',
+        )
+        return (None, page, page.object_list, page.has_other_pages())
+    
     def get_context_data(self, **kwargs):
         """
-        Override get_context_data to add the search form and chart data to the context.
+        Override get_context_data to add the search form to the context.
         """
         context = super().get_context_data(**kwargs)  # Gets default context with 'object_list'
         
-        # Add the search form to context - only populate with POST data on POST requests
-        if self.request.method == 'POST':
-            context['form'] = RecipeSearchForm(self.request.POST)
-        else:
-            context['form'] = RecipeSearchForm()
+        # Attach highlighted search snippets to the matching recipes
+        if self.search_hits:
+            for recipe in context['object_list']:
+                recipe.search_snippet = self.search_hits[recipe.pk].snippet
         
-        # Initialize chart and dataframe
-        context['recipes'] = None
+        context['sort'] = self.sort
+        context['corrected_query'] = self.corrected_query
+        context['search_truncated'] = self.search_truncated
+        context['search_limit'] = DEFAULT_LIMIT
+        context['search_query'] = self.get_search_query()
         
-        # If POST request, process the search and generate chart
-        if self.request.method == 'POST':
-            recipe_name = self.request.POST.get('recipe_name')
-            
-            # Get the filtered queryset - keep as queryset to preserve properties like difficulty
-            qs = self.get_queryset().prefetch_related('ingredients')
-            if qs.exists():
-                context['recipes'] = qs
+        # Facet counts for every selection come from the same cached groups
+        key = facets_key(self.catalog_version, context['search_query'])
+        groups = cache.get(key)
+        if groups is None:
+            groups = facet_groups(self.facet_base)
+            cache.set(key, groups, cache_timeout())
+        context['facet_total'], context['facets'] = facet_counts(groups, self.facets)
+        context['facet_query'] = facet_querystring(self.facets)
+        context['catalog_version'] = self.catalog_version
+        context['card_cache_timeout'] = cache_timeout()
+        
+        # Add the search form to context, filled in when searching
+        context['form'] = self.get_form()
         
         return context
     
+    def get(self, request, *args, **kwargs):
+        """
+        Serve the recipe grid (cards and pagination, or search results)
+        from the cache when it is there, so a warm page runs no queries
+        besides the session and user lookups. Only the grid is cached: the
+        rest of the page names the user.
+        The ETag and Last-Modified date follow the catalog version, so
+        browsers revalidating an unchanged page get a 304.
+        """
+        self.catalog_version = catalog_version()
+        query = self.get_search_query()
+        facets = facet_querystring(self.get_facets())
+        if query is not None:
+            key = grid_key(self.catalog_version, 'search', query, facets)
+        else:
+            key = grid_key(
+                self.catalog_version, self.get_sort(), request.GET.get('after'), request.GET.get('before'), facets,
+            )
+        etag = page_etag(key, request.user.pk)
+        last_modified = catalog_last_modified()
+        
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            grid = cache.get(key)
+            hit = grid is not None
+            grid_stats.record(hit)
+            if not hit:
+                self.object_list = self.get_queryset()
+                grid = render_to_string('recipes/home_grid.html', self.get_context_data(), request)
+                cache.set(key, grid, cache_timeout())
+            response = TemplateResponse(request, self.template_name, {
+                'form': self.get_form(),
+                'sort': self.get_sort(),
+                'grid': mark_safe(grid),
+            })
+            response['X-Cache'] = 'HIT' if hit else 'MISS'
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+    
     def post(self, request, *args, **kwargs):
         """
-        Handle POST requests (form submissions).
-        This allows the ListView to handle POST requests for search.
+        Searches are GET requests (?recipe_name=) so that they can be cached
+        and bookmarked; redirect old-style POSTed searches there.
         """
-        # Call get() to render the page with filtered results
-        return self.get(request, *args, **kwargs)
+        query = urlencode({'recipe_name': request.POST.get('recipe_name', '')})
+        return redirect(f"{reverse('recipes:home')}?{query}#recipes")
+
+class Pantry(LoginRequiredMixin, ListView):
+    """
+    "Cook with what I have": the user lists the ingredients they have
+    (?have=eggs, flour, milk) and gets the recipes using them, ranked by the
+    share of each recipe's ingredients they cover. The ranking comes from
+    the in-memory index in recipes.pantry; only the cards of the current
+    page are read from the database.
+    """
+    template_name = 'recipes/pantry.html'
+    paginate_by = 12
+    
+    def get_queryset(self):
+        """The ranked PantryMatch list (recipe ids, not recipes)"""
+        self.form = PantryForm(self.request.GET or None)
+        if not self.form.is_valid():
+            return []
+        with timing('pantry'):
+            return get_pantry_index().search(parse_pantry(self.form.cleaned_data['have']))
+    
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        matches = context['object_list']
+        recipes = (
+            Recipe.objects.select_related('summary')
+            .only(*Home.card_fields)
+            .in_bulk([match.recipe_id for match in matches])
+        )
+        cards = []
+        for match in matches:
+            recipe = recipes.get(match.recipe_id)
+            if recipe is not None:
+                recipe.pantry_match = match
+                cards.append(recipe)
+        context['object_list'] = cards
+        context['form'] = self.form
+        return context
+
+# Suggestions of each kind returned by suggest()
+SUGGESTIONS = 8
+
+@login_required
+def suggest(request):
+    """
+    Search box suggestions for ?q=, as JSON: recipes whose name has words
+    starting with the typed ones (shortest names first) and ingredient
+    names (most used first). Answered from in-memory indexes and cached
+    per normalized prefix, so steady-state requests read no catalog data.
+    """
+    query = normalize_query(request.GET.get('q', ''))[:60]
+    data = {'query': query, 'recipes': [], 'ingredients': []}
+    if len(query) >= MIN_PREFIX:
+        key = suggest_key(catalog_version(), query)
+        cached = cache.get(key)
+        if cached is not None:
+            data = cached
+        else:
+            with timing('typeahead'):
+                recipes = get_typeahead_index().suggest(query, SUGGESTIONS)
+                ingredients = get_pantry_index().popular_names(query, SUGGESTIONS)
+            data['recipes'] = [
+                {'name': name, 'url': reverse('recipes:detail', kwargs={'id': pk})} for pk, name in recipes
+            ]
+            data['ingredients'] = [{'name': name, 'recipes': count} for name, count in ingredients]
+            cache.set(key, data, cache_timeout())
+    response = JsonResponse(data)
+    patch_cache_control(response, private=True, max_age=60)
+    return response
+
+def chart_rows(recipe_id):
+    """Ingredient rows a recipe's charts are drawn from (and hashed for caching)"""
+    return list(
+        RecipeIngredient.objects.filter(recipe_id=recipe_id)
+        .order_by('pk')
+        .values_list(*CHART_FIELDS)
+    )
+
+def chart_url(recipe_id, chart_type, rows, fmt='png'):
+    """
+    URL of a chart image. The data digest in ?v= changes whenever the chart
+    would, so browsers may keep the image for as long as they like.
+    """
+    url = reverse('recipes:chart', kwargs={'id': recipe_id, 'chart': CHART_SLUGS[chart_type], 'fmt': fmt})
+    return f'{url}?v={chart_digest(chart_type, rows, fmt)}'
+
+def load_recipe_detail(recipe_id):
+    """
+    Everything the detail page shows, in two queries: the recipe, then its
+    ingredient links joined with their ingredients. Returns the recipe, the
+    links and the links as chart rows (the same tuples chart_rows() returns,
+    so the chart URL digests match). Raises Http404 for an unknown recipe.
+    """
+    recipe = get_object_or_404(Recipe, pk=recipe_id)
+    ingredient_links = list(
+        RecipeIngredient.objects.filter(recipe=recipe)
+        .select_related('ingredient')
+        .order_by('pk')
+    )
+    return recipe, ingredient_links, [chart_row(link) for link in ingredient_links]
 
 @login_required
 def Details(request, id): 
     chart = None
-    recipe = get_object_or_404(Recipe, pk=id)
-    ingredient_links = recipe.recipe_ingredients.select_related('ingredient')
-
-    # Build dataframe for chart generation if ingredients exist
-    ingredients_df = DataFrame(
-        list(
-            ingredient_links.values(
-                'ingredient__name',
-                'ingredient__calories',
-                'ingredient__price',
-                'quantity'
-            )
-        )
-    ) if ingredient_links.exists() else DataFrame()
+    chart_type = None
+    recipe, ingredient_links, rows = load_recipe_detail(id)
+    # 'client': the browser draws charts from chart_data, 'server': PNG images
+    chart_mode = getattr(settings, 'CHART_RENDERING', 'server')
 
     form = ChartForm(request.POST or None)
-    if request.method == 'POST' and ingredients_df.shape[0] > 0:
-        chart_type = request.POST.get('chart_type')
-        chart = get_chart(chart_type, ingredients_df, labels=ingredients_df['ingredient__name'].values)
+    if request.method == 'POST' and form.is_valid():
+        chart_type = form.cleaned_data['chart_type']
+        if rows:
+            # Also used as the fallback image in client mode
+            chart = chart_url(recipe.pk, chart_type, rows)
 
     context = {
         'recipe': recipe,
         'ingredient_links': ingredient_links,
         'chart': chart,
+        'chart_type': chart_type,
+        'chart_mode': chart_mode,
         'form': form,
     }
-    return render(request, 'recipes/recipe_detail.html', context)
\ No newline at end of file
+    # A TemplateResponse is rendered after the view returns, so the timing
+    # middleware can report template time separately
+    return TemplateResponse(request, 'recipes/recipe_detail.html', context)
+
+@login_required
+def chart_data(request, id):
+    """
+    The series behind every chart of a recipe, as compact JSON, for the
+    browser to draw itself. Cached by the browser with a data-derived ETag.
+    """
+    rows = chart_rows(id)
+    if not rows:
+        raise Http404('Recipe has no ingredients')
+
+    etag = f'"{chart_digest("data", rows, "json")}"'
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        names, calories, prices, amounts = zip(*rows)
+        response = JsonResponse({
+            'names': names,
+            'prices': [float(price) for price in prices],
+            'calories': calories,
+            'quantities': chart_amounts(amounts),
+            'images': {
+                chart_type: reverse('recipes:chart', kwargs={'id': id, 'chart': slug, 'fmt': 'png'})
+                for chart_type, slug in CHART_SLUGS.items()
+            },
+        })
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+CHART_CONTENT_TYPES = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml',
+}
+CHART_TYPES_BY_SLUG = {slug: chart_type for chart_type, slug in CHART_SLUGS.items()}
+
+@login_required
+def chart_image(request, id, chart, fmt):
+    """
+    Serve one chart as a PNG or SVG image.
+    The ETag is derived from the ingredient data, so unchanged charts are
+    answered with 304 Not Modified and neither re-sent nor re-rendered.
+    """
+    chart_type = CHART_TYPES_BY_SLUG.get(chart)
+    if chart_type is None or fmt not in CHART_CONTENT_TYPES:
+        raise Http404('Unknown chart')
+    rows = chart_rows(id)
+    if not rows:
+        raise Http404('Recipe has no ingredients')
+
+    digest = chart_digest(chart_type, rows, fmt)
+    etag = f'"{digest}"'
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        cache = get_chart_cache()
+        key = chart_key(id, chart_type, rows, fmt)
+
+        def render_image():
+            # Only runs on a cache miss
+            data = ChartData.from_rows(rows)
+            with timing('chart'):
+                return get_render_pool().render(
+                    render_chart, chart_type, data, format=fmt,
+                    labels=data['ingredient__name'],
+                    on_late_result=lambda image: cache.set(key, image),
+                )
+
+        try:
+            image = cache.get_or_render(key, render_image)
+        except ChartRenderError:
+            # Don't hold the worker; a late render still fills the cache
+            response = HttpResponse('Chart is still rendering, try again shortly.', status=503, content_type='text/plain')
+            response['Retry-After'] = '2'
+            patch_cache_control(response, no_store=True)
+            return response
+        response = HttpResponse(image, content_type=CHART_CONTENT_TYPES[fmt])
+
+    response['ETag'] = etag
+    if request.GET.get('v') == digest:
+        # Versioned URL: the content behind it can never change
+        patch_cache_control(response, private=True, max_age=365 * 24 * 60 * 60, immutable=True)
+    else:
+        patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+@staff_member_required
+def chart_cache_stats(request):
+    """Hit/miss counters of this worker's chart cache, as JSON"""
+    return JsonResponse(get_chart_cache().stats())
+
+@staff_member_required
+def page_cache_stats(request):
+    """Hit/miss counters of this worker's Home grid cache, as JSON"""
+    return JsonResponse({'catalog_version': catalog_version(), 'grid': grid_stats.stats()})
+
+@staff_member_required
+def catalog_export(request, fmt):
+    """
+    Stream the whole catalog as CSV or JSONL. The rows are generated while
+    the response is sent, reading the recipes in chunks (?chunk_size=), so
+    memory use stays flat however large the catalog is.
+    """
+    if fmt not in CONTENT_TYPES:
+        raise Http404('Unknown export format')
+    try:
+        chunk_size = max(1, min(int(request.GET.get('chunk_size', 500)), 5000))
+    except ValueError:
+        chunk_size = 500
+    response = StreamingHttpResponse(export_catalog(fmt, chunk_size), content_type=CONTENT_TYPES[fmt])
+    filename = f'recipes-{timezone.now():%Y%m%d}.{fmt}'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
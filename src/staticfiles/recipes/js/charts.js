@@ -0,0 +1,196 @@
+// Draws the ingredient charts in the browser from /recipe/<id>/chart.json,
+// so the server only sends a few numbers instead of rendering an image.
+// Chart types match CHART_CHOICES in recipes/forms.py.
+document.addEventListener('DOMContentLoaded', function() {
+    const canvas = document.getElementById('ingredient-chart');
+    if (!canvas || !canvas.getContext) {
+        return; // no canvas support: the form posts and the server renders
+    }
+    const form = document.querySelector('#chart-section form');
+    const COLORS = ['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd',
+                    '#8c564b', '#e377c2', '#7f7f7f', '#bcbd22', '#17becf'];
+    let dataPromise = null;
+
+    function loadData() {
+        // Fetched once per page; the browser revalidates it with its ETag
+        if (!dataPromise) {
+            dataPromise = fetch(canvas.dataset.url, {credentials: 'same-origin'})
+                .then(function(response) {
+                    if (!response.ok) {
+                        throw new Error('Chart data request failed: ' + response.status);
+                    }
+                    return response.json();
+                });
+        }
+        return dataPromise;
+    }
+
+    function setup() {
+        // Scale the drawing for high-DPI screens
+        const ratio = window.devicePixelRatio || 1;
+        const width = 600, height = 300;
+        canvas.width = width * ratio;
+        canvas.height = height * ratio;
+        canvas.style.width = width + 'px';
+        canvas.style.height = height + 'px';
+        const ctx = canvas.getContext('2d');
+        ctx.setTransform(ratio, 0, 0, ratio, 0, 0);
+        ctx.clearRect(0, 0, width, height);
+        ctx.font = '12px sans-serif';
+        ctx.fillStyle = '#111827';
+        return {ctx: ctx, width: width, height: height};
+    }
+
+    function title(ctx, width, text) {
+        ctx.save();
+        ctx.font = '14px sans-serif';
+        ctx.textAlign = 'center';
+        ctx.fillText(text, width / 2, 18);
+        ctx.restore();
+    }
+
+    // Axes, y grid labels and rotated x labels shared by bar and line charts
+    function axes(ctx, area, names, max, yLabel) {
+        ctx.strokeStyle = '#374151';
+        ctx.beginPath();
+        ctx.moveTo(area.left, area.top);
+        ctx.lineTo(area.left, area.bottom);
+        ctx.lineTo(area.right, area.bottom);
+        ctx.stroke();
+
+        ctx.textAlign = 'right';
+        for (let i = 0; i <= 4; i++) {
+            const value = max * i / 4;
+            const y = area.bottom - (area.bottom - area.top) * i / 4;
+            ctx.fillText(value.toFixed(max < 10 ? 1 : 0), area.left - 6, y + 4);
+        }
+        const step = (area.right - area.left) / names.length;
+        names.forEach(function(name, i) {
+            ctx.save();
+            ctx.translate(area.left + step * (i + 0.5), area.bottom + 8);
+            ctx.rotate(-Math.PI / 4);
+            ctx.fillText(name, 0, 0);
+            ctx.restore();
+        });
+        ctx.save();
+        ctx.translate(14, (area.top + area.bottom) / 2);
+        ctx.rotate(-Math.PI / 2);
+        ctx.textAlign = 'center';
+        ctx.fillText(yLabel, 0, 0);
+        ctx.restore();
+        return step;
+    }
+
+    function plotArea(width, height) {
+        return {left: 60, right: width - 20, top: 30, bottom: height - 80};
+    }
+
+    function drawBar(data) {
+        const c = setup();
+        const area = plotArea(c.width, c.height);
+        const max = Math.max.apply(null, data.prices.concat([1]));
+        title(c.ctx, c.width, 'Ingredient Prices');
+        const step = axes(c.ctx, area, data.names, max, 'Price ($)');
+        c.ctx.fillStyle = COLORS[0];
+        data.prices.forEach(function(price, i) {
+            const h = (area.bottom - area.top) * price / max;
+            c.ctx.fillRect(area.left + step * i + step * 0.1, area.bottom - h, step * 0.8, h);
+        });
+    }
+
+    function drawLine(data) {
+        const c = setup();
+        const area = plotArea(c.width, c.height);
+        const max = Math.max.apply(null, data.calories.concat([1]));
+        title(c.ctx, c.width, 'Ingredient Calories');
+        const step = axes(c.ctx, area, data.names, max, 'Calories');
+        c.ctx.strokeStyle = COLORS[0];
+        c.ctx.lineWidth = 2;
+        c.ctx.beginPath();
+        data.calories.forEach(function(calories, i) {
+            const x = area.left + step * (i + 0.5);
+            const y = area.bottom - (area.bottom - area.top) * calories / max;
+            if (i === 0) {
+                c.ctx.moveTo(x, y);
+            } else {
+                c.ctx.lineTo(x, y);
+            }
+        });
+        c.ctx.stroke();
+    }
+
+    function drawPie(data) {
+        const c = setup();
+        const total = data.quantities.reduce(function(a, b) { return a + b; }, 0) || 1;
+        const cx = c.width / 2 - 80, cy = c.height / 2 + 10, r = 110;
+        title(c.ctx, c.width, 'Ingredient Quantity Distribution');
+        let angle = 0;
+        data.quantities.forEach(function(quantity, i) {
+            const slice = 2 * Math.PI * quantity / total;
+            c.ctx.fillStyle = COLORS[i % COLORS.length];
+            c.ctx.beginPath();
+            c.ctx.moveTo(cx, cy);
+            c.ctx.arc(cx, cy, r, angle, angle + slice);
+            c.ctx.closePath();
+            c.ctx.fill();
+            // Percentage label in the middle of the slice
+            const mid = angle + slice / 2;
+            c.ctx.fillStyle = '#111827';
+            c.ctx.textAlign = 'center';
+            c.ctx.fillText((100 * quantity / total).toFixed(1) + '%',
+                           cx + Math.cos(mid) * r * 0.6, cy + Math.sin(mid) * r * 0.6);
+            angle += slice;
+        });
+        // Legend
+        c.ctx.textAlign = 'left';
+        data.names.forEach(function(name, i) {
+            const y = 40 + i * 18;
+            c.ctx.fillStyle = COLORS[i % COLORS.length];
+            c.ctx.fillRect(c.width - 150, y - 10, 12, 12);
+            c.ctx.fillStyle = '#111827';
+            c.ctx.fillText(name, c.width - 132, y);
+        });
+    }
+
+    const DRAW = {'#1': drawBar, '#2': drawLine, '#3': drawPie};
+
+    function showFallback() {
+        // Fall back to the server-rendered image when there is one
+        if (canvas.dataset.fallback) {
+            const img = document.createElement('img');
+            img.src = canvas.dataset.fallback;
+            img.alt = 'Ingredient Chart';
+            img.width = 600;
+            img.height = 300;
+            canvas.replaceWith(img);
+        }
+    }
+
+    function draw(chartType) {
+        if (!DRAW[chartType]) {
+            return Promise.resolve();
+        }
+        return loadData().then(function(data) {
+            DRAW[chartType](data);
+            canvas.hidden = false;
+        });
+    }
+
+    if (canvas.dataset.chartType) {
+        draw(canvas.dataset.chartType).catch(showFallback);
+    }
+
+    if (form) {
+        form.addEventListener('submit', function(event) {
+            const select = form.querySelector('[name="chart_type"]');
+            if (!select || !DRAW[select.value]) {
+                return;
+            }
+            // Draw in place; if the data cannot be loaded, post the form after all
+            event.preventDefault();
+            draw(select.value).catch(function() {
+                form.submit();
+            });
+        });
+    }
+});
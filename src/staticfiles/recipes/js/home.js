@@ -1,12 +1,49 @@
 document.addEventListener('DOMContentLoaded', function() { // Ensure the DOM is fully loaded
     clear_filters_btn = document.getElementById('clear-filters-btn');
-    
+    recipes_section = document.getElementById('recipes');   
     if (clear_filters_btn) {
         clear_filters_btn.addEventListener('click', function(event) {
             console.log('Clear Filters button clicked');
             event.preventDefault();
-            // Redirect to home page with #recipes anchor
-            window.location.href = window.location.pathname + '#recipes';
+            window.location.href = window.location.pathname;
+            window.scrollTo(0, recipes_section.offsetTop);
         });
     }
-});   
\ No newline at end of file
+});
+
+// Search box suggestions from recipes:suggest, shown through the <datalist>
+document.addEventListener('DOMContentLoaded', function() {
+    const datalist = document.getElementById('recipe-suggestions');
+    const input = datalist && document.querySelector('input[list="recipe-suggestions"]');
+    if (!input) {
+        return;
+    }
+    let timer = null;
+    let pending = null;
+    input.addEventListener('input', function() {
+        clearTimeout(timer);
+        timer = setTimeout(function() {
+            const query = input.value.trim();
+            if (query.length < 2) {
+                datalist.replaceChildren();
+                return;
+            }
+            if (pending) {
+                pending.abort();
+            }
+            pending = new AbortController();
+            fetch(datalist.dataset.url + '?q=' + encodeURIComponent(query), {signal: pending.signal})
+                .then(function(response) { return response.json(); })
+                .then(function(data) {
+                    const names = data.recipes.map(function(recipe) { return recipe.name; })
+                        .concat(data.ingredients.map(function(ingredient) { return ingredient.name; }));
+                    datalist.replaceChildren(...names.map(function(name) {
+                        const option = document.createElement('option');
+                        option.value = name;
+                        return option;
+                    }));
+                })
+                .catch(function() {});
+        }, 150);
+    });
+});